@@ -0,0 +1,303 @@
+"""
+Service throughput/latency benchmark
+
+Runs the producer and consumer FastAPI apps in-process against the in-memory
+Kafka stand-in (benchmarks/inmemory_kafka.py), so tuning can be measured
+without Minikube or a Kafka install. The apps run unmodified: only their
+KafkaProducer/KafkaConsumer classes are swapped, and requests go through the
+ASGI stack via httpx.
+
+Scenarios:
+- single:  POST /events, one event per request (--concurrency clients)
+- batch:   POST /events/batch with --batch-size events per request
+- stream:  POST /events/stream with --stream-lines NDJSON lines per request
+- catchup: the consumer drains a backlog of events already on the topic
+
+Each scenario reports events/sec, p50/p99 latency (per request for the
+producer scenarios, per processed batch for catchup), allocated bytes per
+event (net and peak, from a separate tracemalloc pass) and gen-0 garbage
+collections per 1000 events. Results are written as JSON; --compare prints
+the change against an earlier results file.
+
+Usage:
+    python benchmarks/app_benchmark.py [--scenarios single,batch,stream,catchup]
+        [--events 20000] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib.util
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PRODUCER_DIR = os.path.join(ROOT, "producer-service")
+CONSUMER_DIR = os.path.join(ROOT, "consumer-service")
+sys.path[:0] = [os.path.dirname(os.path.abspath(__file__)), PRODUCER_DIR, CONSUMER_DIR]
+
+import httpx  # noqa: E402
+from kafka.structs import TopicPartition  # noqa: E402
+from prometheus_client import REGISTRY  # noqa: E402
+
+from inmemory_kafka import InMemoryBroker  # noqa: E402
+
+SCENARIOS = ("single", "batch", "stream", "catchup")
+TRACE_EVENTS = 2000  # events per tracemalloc pass
+
+
+def load_app(name: str, directory: str):
+    """Import a service's app.py under its own module name."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _unregister_metrics():
+    # Both apps define some metrics with the same names; the benchmark does not
+    # scrape them, so the first app's collectors are dropped from the registry
+    for collector in list(REGISTRY._collector_to_names):
+        REGISTRY.unregister(collector)
+
+
+producer_app = load_app("producer_app", PRODUCER_DIR)
+_unregister_metrics()
+consumer_app = load_app("consumer_app", CONSUMER_DIR)
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def _with_producer(run: Callable) -> List[float]:
+    broker = InMemoryBroker()
+    producer_app.KafkaProducer = broker.producer_class()
+    await producer_app.app.router.startup()
+    try:
+        async with _client(producer_app.app) as client:
+            return await run(client)
+    finally:
+        await producer_app.app.router.shutdown()
+
+
+async def run_single(n: int, args) -> List[float]:
+    events = producer_app.generate_sample_events(n)
+
+    async def run(client):
+        latencies = []
+        pending = iter(events)
+
+        async def worker():
+            for event in pending:
+                start = time.perf_counter()
+                response = await client.post("/events", json=event)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return latencies
+
+    return await _with_producer(run)
+
+
+async def run_batch(n: int, args) -> List[float]:
+    events = producer_app.generate_sample_events(n)
+    batches = [events[i:i + args.batch_size] for i in range(0, n, args.batch_size)]
+
+    async def run(client):
+        latencies = []
+        for batch in batches:
+            start = time.perf_counter()
+            response = await client.post("/events/batch", json=batch)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+            assert response.json()["successful_events"] == len(batch)
+        return latencies
+
+    return await _with_producer(run)
+
+
+async def run_stream(n: int, args) -> List[float]:
+    events = producer_app.generate_sample_events(n)
+    bodies = [
+        b"\n".join(json.dumps(e).encode() for e in events[i:i + args.stream_lines]) + b"\n"
+        for i in range(0, n, args.stream_lines)
+    ]
+
+    async def run(client):
+        latencies = []
+        for body in bodies:
+            start = time.perf_counter()
+            response = await client.post("/events/stream", content=body)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+        return latencies
+
+    return await _with_producer(run)
+
+
+async def run_catchup(n: int, args) -> List[float]:
+    broker = InMemoryBroker()
+    serializer = producer_app.serializer
+    for event in producer_app.generate_sample_events(n):
+        broker.append(
+            consumer_app.KAFKA_TOPIC, event["event_id"].encode(), serializer.dumps(event), [serializer.header]
+        )
+    end_offsets = {
+        tp: broker.end_offset(tp)
+        for tp in (TopicPartition(consumer_app.KAFKA_TOPIC, p) for p in broker.partitions_for(consumer_app.KAFKA_TOPIC))
+    }
+
+    consumer_app.KafkaConsumer = broker.consumer_class()
+    consumer_app.KafkaProducer = broker.producer_class()
+    consumer_app.tracker = consumer_app.OffsetTracker()
+    latencies = []
+    process_batch = consumer_app.process_event_batch
+
+    # The executor binds process_event_batch at startup, so wrap it before then
+    def timed_process_batch(events, *a, **kw):
+        start = time.perf_counter()
+        try:
+            return process_batch(events, *a, **kw)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    consumer_app.process_event_batch = timed_process_batch
+    with tempfile.TemporaryDirectory() as directory:
+        consumer_app.PERSISTENCE_DB_PATH = os.path.join(directory, "events.db")
+        consumer_app.DEDUP_SNAPSHOT_PATH = None
+        await consumer_app.app.router.startup()
+        try:
+            async with _client(consumer_app.app) as client:
+                (await client.post("/start")).raise_for_status()
+                group = consumer_app.KAFKA_GROUP_ID
+                while any((broker.committed(group, tp) or 0) < end for tp, end in end_offsets.items()):
+                    await asyncio.sleep(0.01)
+                (await client.post("/stop")).raise_for_status()
+        finally:
+            await consumer_app.app.router.shutdown()
+            consumer_app.process_event_batch = process_batch
+    return latencies
+
+
+RUNNERS = {"single": run_single, "batch": run_batch, "stream": run_stream, "catchup": run_catchup}
+
+
+def measure(name: str, n: int, args) -> Dict[str, Any]:
+    runner = RUNNERS[name]
+    gen0 = gc.get_stats()[0]["collections"]
+    start = time.perf_counter()
+    latencies = asyncio.run(runner(n, args))
+    elapsed = time.perf_counter() - start
+    collections = gc.get_stats()[0]["collections"] - gen0
+
+    traced = min(n, TRACE_EVENTS)
+    gc.collect()
+    tracemalloc.start()
+    asyncio.run(runner(traced, args))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "events": n,
+        "seconds": round(elapsed, 4),
+        "events_per_sec": round(n / elapsed, 1),
+        "latency_unit": "process_batch" if name == "catchup" else "request",
+        "latency_samples": len(latencies),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "alloc_net_bytes_per_event": round(current / traced, 1),
+        "alloc_peak_bytes_per_event": round(peak / traced, 1),
+        "gc_gen0_per_1k_events": round(collections * 1000 / n, 2),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: Dict[str, Any], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta']['commit']}):")
+    print(f"{'scenario':<10} {'events/s':>10} {'p99':>10} {'bytes/event':>12}")
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+
+        def change(key: str) -> str:
+            if not before[key]:
+                return "n/a"
+            return f"{(current[key] - before[key]) / before[key] * 100:+.1f}%"
+
+        print(f"{name:<10} {change('events_per_sec'):>10} {change('latency_p99_ms'):>10} "
+              f"{change('alloc_peak_bytes_per_event'):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios")
+    parser.add_argument("--events", type=int, default=20000, help="events per scenario")
+    parser.add_argument("--single-events", type=int, default=2000, help="events for the single scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients for single")
+    parser.add_argument("--batch-size", type=int, default=500, help="events per /events/batch request")
+    parser.add_argument("--stream-lines", type=int, default=5000, help="lines per /events/stream request")
+    parser.add_argument("--output", default="app_benchmark.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+    print(f"{'scenario':<10} {'events/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'bytes/event':>12} {'gc0/1k':>7}")
+    for name in names:
+        n = args.single_events if name == "single" else args.events
+        result = results["scenarios"][name] = measure(name, n, args)
+        print(f"{name:<10} {result['events_per_sec']:>10,.0f} {result['latency_p50_ms']:>9.2f} "
+              f"{result['latency_p99_ms']:>9.2f} {result['alloc_peak_bytes_per_event']:>12,.0f} "
+              f"{result['gc_gen0_per_1k_events']:>7.2f}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
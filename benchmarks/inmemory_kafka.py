@@ -0,0 +1,314 @@
+"""
+In-memory Kafka stand-in for benchmarks
+
+Implements the parts of kafka-python's KafkaProducer and KafkaConsumer that
+the producer and consumer services call (send/flush/close; subscribe, assign,
+poll, seek, pause/resume, position, commit/commit_async, end_offsets, ...)
+on top of one in-process broker, so both apps can run unmodified with their
+own client configuration.
+
+    broker = InMemoryBroker(partitions=4)
+    app_module.KafkaProducer = broker.producer_class()
+    app_module.KafkaConsumer = broker.consumer_class()
+
+Semantics kept: per-partition offsets, key-hash partitioning, record headers
+and timestamps, one committed offset per group and partition, max_poll_records.
+A subscribing consumer is the only member of its group and owns every
+partition of its topics. Sends are acked as soon as they are appended.
+"""
+
+import threading
+import time
+import zlib
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+# Field names match kafka-python's, for the attributes the services read
+ConsumerRecord = namedtuple(
+    "ConsumerRecord",
+    ["topic", "partition", "offset", "timestamp", "timestamp_type", "key", "value", "headers",
+     "checksum", "serialized_key_size", "serialized_value_size", "serialized_header_size"]
+)
+
+RecordMetadata = namedtuple(
+    "RecordMetadata",
+    ["topic", "partition", "topic_partition", "offset", "timestamp", "checksum",
+     "serialized_key_size", "serialized_value_size", "serialized_header_size"]
+)
+
+
+class InMemoryBroker:
+    """Topics as per-partition record lists, plus committed offsets per group."""
+
+    def __init__(self, partitions: int = 4):
+        self.partitions = partitions
+        self._logs: Dict[TopicPartition, List[ConsumerRecord]] = {}
+        self._topics: Dict[str, int] = {}
+        self._committed: Dict[str, Dict[TopicPartition, int]] = {}
+        self._round_robin = 0
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+
+    def create_topic(self, topic: str, partitions: Optional[int] = None):
+        with self._lock:
+            self._create(topic, partitions)
+
+    def _create(self, topic: str, partitions: Optional[int] = None):
+        if topic not in self._topics:
+            self._topics[topic] = partitions or self.partitions
+            for p in range(self._topics[topic]):
+                self._logs[TopicPartition(topic, p)] = []
+
+    def partitions_for(self, topic: str) -> Set[int]:
+        with self._lock:
+            self._create(topic)
+            return set(range(self._topics[topic]))
+
+    def append(
+        self,
+        topic: str,
+        key: Optional[bytes],
+        value: Optional[bytes],
+        headers: Optional[List] = None,
+        partition: Optional[int] = None,
+        timestamp_ms: Optional[int] = None
+    ) -> RecordMetadata:
+        timestamp_ms = timestamp_ms or int(time.time() * 1000)
+        with self._lock:
+            self._create(topic)
+            if partition is None:
+                if key:
+                    partition = zlib.crc32(key) % self._topics[topic]
+                else:
+                    partition = self._round_robin % self._topics[topic]
+                    self._round_robin += 1
+            tp = TopicPartition(topic, partition)
+            log = self._logs[tp]
+            offset = len(log)
+            log.append(ConsumerRecord(
+                topic, partition, offset, timestamp_ms, 0, key, value, list(headers or ()),
+                None, len(key) if key else -1, len(value) if value else -1, -1
+            ))
+            self._appended.notify_all()
+        return RecordMetadata(topic, partition, tp, offset, timestamp_ms, None,
+                              len(key) if key else -1, len(value) if value else -1, -1)
+
+    def end_offset(self, tp: TopicPartition) -> int:
+        with self._lock:
+            return len(self._logs.get(tp, ()))
+
+    def fetch(self, tp: TopicPartition, offset: int, max_records: int) -> List[ConsumerRecord]:
+        with self._lock:
+            return self._logs.get(tp, [])[offset:offset + max_records]
+
+    def wait_for_data(self, timeout: float):
+        with self._appended:
+            self._appended.wait(timeout)
+
+    def commit(self, group: str, offsets: Dict[TopicPartition, int]):
+        with self._lock:
+            self._committed.setdefault(group, {}).update(offsets)
+
+    def committed(self, group: str, tp: TopicPartition) -> Optional[int]:
+        with self._lock:
+            return self._committed.get(group, {}).get(tp)
+
+    def producer_class(self) -> Callable[..., "InMemoryProducer"]:
+        return lambda **config: InMemoryProducer(self, **config)
+
+    def consumer_class(self) -> Callable[..., "InMemoryConsumer"]:
+        return lambda *topics, **config: InMemoryConsumer(self, *topics, **config)
+
+
+class _SendFuture:
+    """The subset of kafka-python's FutureRecordMetadata the services use."""
+
+    def __init__(self, metadata: Optional[RecordMetadata] = None, error: Optional[BaseException] = None):
+        self.metadata = metadata
+        self.error = error
+
+    def add_callback(self, fn, *args):
+        if self.error is None:
+            fn(*args, self.metadata)
+        return self
+
+    def add_errback(self, fn, *args):
+        if self.error is not None:
+            fn(*args, self.error)
+        return self
+
+    def get(self, timeout: Optional[float] = None) -> RecordMetadata:
+        if self.error is not None:
+            raise self.error
+        return self.metadata
+
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def is_done(self) -> bool:
+        return True
+
+
+class InMemoryProducer:
+    def __init__(
+        self,
+        broker: InMemoryBroker,
+        key_serializer: Optional[Callable] = None,
+        value_serializer: Optional[Callable] = None,
+        **config: Any
+    ):
+        self.broker = broker
+        self.key_serializer = key_serializer
+        self.value_serializer = value_serializer
+        self.config = config
+
+    def send(self, topic: str, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
+        key_bytes = self.key_serializer(key) if self.key_serializer and key is not None else key
+        value_bytes = self.value_serializer(value) if self.value_serializer else value
+        try:
+            metadata = self.broker.append(topic, key_bytes, value_bytes, headers, partition, timestamp_ms)
+        except Exception as e:
+            return _SendFuture(error=e)
+        return _SendFuture(metadata)
+
+    def flush(self, timeout: Optional[float] = None):
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+
+class InMemoryConsumer:
+    def __init__(
+        self,
+        broker: InMemoryBroker,
+        *topics: str,
+        group_id: Optional[str] = None,
+        key_deserializer: Optional[Callable] = None,
+        value_deserializer: Optional[Callable] = None,
+        auto_offset_reset: str = "latest",
+        max_poll_records: int = 500,
+        **config: Any
+    ):
+        self.broker = broker
+        self.group_id = group_id
+        self.key_deserializer = key_deserializer
+        self.value_deserializer = value_deserializer
+        self.auto_offset_reset = auto_offset_reset
+        self.max_poll_records = max_poll_records
+        self.config = config
+
+        self._assignment: List[TopicPartition] = []
+        self._positions: Dict[TopicPartition, int] = {}
+        self._paused: Set[TopicPartition] = set()
+        self._listener = None
+        self._announced = False
+        self._next = 0  # round-robin start, so one partition cannot starve the rest
+        if topics:
+            self.subscribe(list(topics))
+
+    def subscribe(self, topics: Iterable[str], listener=None):
+        self._assignment = [
+            TopicPartition(topic, p) for topic in topics for p in sorted(self.broker.partitions_for(topic))
+        ]
+        self._listener = listener
+        self._announced = False
+
+    def assign(self, partitions: Iterable[TopicPartition]):
+        self._assignment = list(partitions)
+        self._announced = True
+
+    def assignment(self) -> Set[TopicPartition]:
+        return set(self._assignment)
+
+    def partitions_for_topic(self, topic: str) -> Set[int]:
+        return self.broker.partitions_for(topic)
+
+    def position(self, tp: TopicPartition) -> int:
+        if tp not in self._positions:
+            committed = self.broker.committed(self.group_id, tp) if self.group_id else None
+            if committed is not None:
+                self._positions[tp] = committed
+            elif self.auto_offset_reset == "earliest":
+                self._positions[tp] = 0
+            else:
+                self._positions[tp] = self.broker.end_offset(tp)
+        return self._positions[tp]
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self._positions[tp] = offset
+
+    def pause(self, *partitions: TopicPartition):
+        self._paused.update(partitions)
+
+    def resume(self, *partitions: TopicPartition):
+        self._paused.difference_update(partitions)
+
+    def paused(self) -> Set[TopicPartition]:
+        return set(self._paused)
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None, update_offsets: bool = True):
+        if not self._announced:
+            self._announced = True
+            if self._listener is not None:
+                self._listener.on_partitions_assigned(self.assignment())
+        max_records = max_records or self.max_poll_records
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            polled = self._fetch(max_records)
+            remaining = deadline - time.monotonic()
+            if polled or remaining <= 0:
+                return polled
+            self.broker.wait_for_data(min(remaining, 0.05))
+
+    def _fetch(self, max_records: int) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        polled: Dict[TopicPartition, List[ConsumerRecord]] = {}
+        partitions = self._assignment[self._next:] + self._assignment[:self._next]
+        self._next = (self._next + 1) % max(1, len(self._assignment))
+        for tp in partitions:
+            if max_records <= 0:
+                break
+            if tp in self._paused:
+                continue
+            records = self.broker.fetch(tp, self.position(tp), max_records)
+            if not records:
+                continue
+            self._positions[tp] = records[-1].offset + 1
+            max_records -= len(records)
+            if self.key_deserializer or self.value_deserializer:
+                records = [
+                    r._replace(
+                        key=self.key_deserializer(r.key) if self.key_deserializer else r.key,
+                        value=self.value_deserializer(r.value) if self.value_deserializer else r.value
+                    )
+                    for r in records
+                ]
+            polled[tp] = records
+        return polled
+
+    def commit(self, offsets: Optional[Dict[TopicPartition, OffsetAndMetadata]] = None):
+        if offsets is None:
+            offsets = {tp: OffsetAndMetadata(self.position(tp), None) for tp in self._assignment}
+        self.broker.commit(self.group_id, {tp: meta.offset for tp, meta in offsets.items()})
+
+    def commit_async(self, offsets: Optional[Dict[TopicPartition, OffsetAndMetadata]] = None, callback=None):
+        if offsets is None:
+            offsets = {tp: OffsetAndMetadata(self.position(tp), None) for tp in self._assignment}
+        self.commit(offsets)
+        if callback is not None:
+            callback(offsets, None)
+
+    def committed(self, tp: TopicPartition) -> Optional[int]:
+        return self.broker.committed(self.group_id, tp)
+
+    def end_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {tp: self.broker.end_offset(tp) for tp in partitions}
+
+    def beginning_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {tp: 0 for tp in partitions}
+
+    def close(self, autocommit: bool = True):
+        if autocommit and self.group_id:
+            self.commit()
@@ -0,0 +1,97 @@
+"""
+Lazy record benchmark
+
+Per-record cost of filtering consumed records by event_type when every record
+is decoded up front, against LazyEvent routing from the kt-event-type header,
+for a filter that keeps --keep of the records; --padding grows each event's data to show how the gap widens
+with payload size. Also compares re-emitting an unmodified event's original bytes
+(encode_event) with serializing it again.
+
+Usage:
+    python benchmarks/lazy_record_benchmark.py [--events 20000] [--keep 0.1] [--padding 0]
+        [--rounds 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "producer-service"))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "consumer-service"))
+
+from app import SAMPLE_EVENT_TYPES, generate_sample_events  # noqa: E402
+from lazy_record import LazyEvent, encode_event  # noqa: E402
+from serialization import DEFAULT_SERIALIZER, decode_value, routing_headers  # noqa: E402
+
+
+def bench(fn, rounds: int) -> float:
+    """Return the best-of-N duration of fn(), in seconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000, help="records per round")
+    parser.add_argument("--keep", type=float, default=0.1, help="share of records the filter keeps")
+    parser.add_argument("--padding", type=int, default=0, help="extra bytes in each event's data")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per variant (best is kept)")
+    args = parser.parse_args()
+
+    events = generate_sample_events(args.events, seed=1)
+    # The filter keeps user_action; --keep of the records are relabelled to it
+    keep_types = frozenset({"user_action"})
+    others = [t for t in SAMPLE_EVENT_TYPES if t not in keep_types]
+    for i, event in enumerate(events):
+        event["event_type"] = "user_action" if i % 1000 < args.keep * 1000 else others[i % len(others)]
+        if args.padding:
+            event["data"]["notes"] = "x" * args.padding
+
+    format_header = [DEFAULT_SERIALIZER.header]
+    plain = [(DEFAULT_SERIALIZER.dumps(e), format_header) for e in events]
+    with_routing = [(raw, format_header + routing_headers(e)) for (raw, _), e in zip(plain, events)]
+    kept = sum(1 for e in events if e["event_type"] in keep_types)
+
+    def eager():
+        for raw, headers in plain:
+            event = decode_value(raw, headers)
+            if event.get("event_type") in keep_types:
+                event.get("data")
+
+    def lazy(records):
+        def run():
+            for raw, headers in records:
+                event = LazyEvent(raw, headers)
+                if event.routing("event_type") in keep_types:
+                    event.get("data")
+        return run
+
+    runs = [
+        ("eager decode", eager),
+        ("lazy/header", lazy(with_routing)),
+    ]
+    print(f"{args.events} records, filter keeps {kept} ({kept / args.events:.0%})")
+    print(f"{'variant':<14} {'us/record':>10} {'records/s':>12} {'relative':>9}")
+    baseline = None
+    for name, fn in runs:
+        per_record = bench(fn, args.rounds) / len(plain)
+        baseline = baseline or per_record
+        print(f"{name:<14} {per_record * 1e6:>10.2f} {1 / per_record:>12,.0f} {per_record / baseline:>8.2f}x")
+
+    decoded = []
+    for raw, headers in with_routing:
+        event = LazyEvent(raw, headers)
+        event.body
+        decoded.append(event)
+    reencode = bench(lambda: [DEFAULT_SERIALIZER.dumps(e.body) for e in decoded], args.rounds) / len(decoded)
+    passthrough = bench(lambda: [encode_event(e, DEFAULT_SERIALIZER) for e in decoded], args.rounds) / len(decoded)
+    print(f"\nre-emit unmodified event: serialize {reencode * 1e6:.2f} us, original bytes {passthrough * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
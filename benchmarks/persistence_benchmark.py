@@ -0,0 +1,86 @@
+"""
+Persistence write-throughput benchmark
+
+Compares writing processed events to SQLite one transaction per event with
+group commits through GroupCommitWriter, where concurrent writers (like the
+consumer's worker lanes) share one transaction and one fsync per group.
+
+Usage:
+    python benchmarks/persistence_benchmark.py [--events 5000] [--writers 16] [--chunk 1]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "producer-service"))
+from app import generate_sample_event  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "consumer-service"))
+from persistence import GroupCommitWriter, SqliteEventStore, event_row  # noqa: E402
+
+
+def per_event(path: str, rows) -> float:
+    """One transaction (and fsync) per event, on a single thread."""
+    store = SqliteEventStore(path)
+    store.open()
+    start = time.perf_counter()
+    for row in rows:
+        store.write([row])
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def group_commit(path: str, rows, writers: int, chunk: int, max_rows: int, max_wait_ms: int) -> float:
+    """`writers` threads each writing `chunk` rows at a time through one GroupCommitWriter."""
+    writer = GroupCommitWriter(SqliteEventStore(path), max_rows=max_rows, max_wait_ms=max_wait_ms)
+    writer.start()
+    shares = [rows[i::writers] for i in range(writers)]
+
+    def run(share):
+        for i in range(0, len(share), chunk):
+            writer.write(share[i:i + chunk])
+
+    threads = [threading.Thread(target=run, args=(share,)) for share in shares]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    writer.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000, help="events written per mode")
+    parser.add_argument("--writers", type=int, default=16, help="concurrent writers for group commit")
+    parser.add_argument("--chunk", type=int, default=1, help="rows per write() call for group commit")
+    parser.add_argument("--max-rows", type=int, default=2000, help="group commit size bound")
+    parser.add_argument("--max-wait-ms", type=int, default=0, help="group commit time bound")
+    args = parser.parse_args()
+
+    now = time.time()
+    rows = [event_row(generate_sample_event(), "success", now) for _ in range(args.events)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = per_event(os.path.join(directory, "per_event.db"), rows)
+        grouped = group_commit(
+            os.path.join(directory, "group_commit.db"), rows,
+            args.writers, args.chunk, args.max_rows, args.max_wait_ms
+        )
+
+    print(f"{'mode':<28} {'events/s':>12} {'seconds':>10}")
+    print(f"{'per-event commit':<28} {len(rows) / single:>12,.0f} {single:>10.3f}")
+    label = f"group commit ({args.writers}x{args.chunk})"
+    print(f"{label:<28} {len(rows) / grouped:>12,.0f} {grouped:>10.3f}")
+    print(f"speedup: {single / grouped:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
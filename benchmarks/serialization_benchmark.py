@@ -0,0 +1,51 @@
+"""
+Serializer micro-benchmark
+
+Compares encode and decode throughput of every registered serializer backend
+for the event schema produced by generate_sample_event.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [--events 10000] [--rounds 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "producer-service"))
+
+from app import generate_sample_event  # noqa: E402
+from serialization import SERIALIZERS  # noqa: E402
+
+
+def bench(fn, items, rounds: int) -> float:
+    """Return the best-of-N throughput of fn over items, in items/second."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=10000, help="events per round")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per backend (best is kept)")
+    args = parser.parse_args()
+
+    events = [generate_sample_event() for _ in range(args.events)]
+
+    print(f"{'backend':<10} {'encode/s':>12} {'decode/s':>12} {'avg bytes':>10}")
+    for name, serializer in SERIALIZERS.items():
+        payloads = [serializer.dumps(event) for event in events]
+        encode_rate = bench(serializer.dumps, events, args.rounds)
+        decode_rate = bench(serializer.loads, payloads, args.rounds)
+        avg_size = sum(len(p) for p in payloads) / len(payloads)
+        print(f"{name:<10} {encode_rate:>12,.0f} {decode_rate:>12,.0f} {avg_size:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app_benchmark.py")
+SCENARIOS = ("single", "batch", "stream", "catchup")
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_scenario_runs(scenario, tmp_path):
+    # Each run gets its own interpreter: the harness imports both apps, whose
+    # metrics share prometheus_client's default registry with other tests
+    output = tmp_path / "results.json"
+    completed = subprocess.run(
+        [sys.executable, HARNESS, "--scenarios", scenario, "--events", "200", "--single-events", "50",
+         "--batch-size", "50", "--stream-lines", "50", "--output", str(output)],
+        cwd=tmp_path, capture_output=True, text=True, timeout=300
+    )
+    assert completed.returncode == 0, completed.stderr
+
+    result = json.loads(output.read_text())["scenarios"][scenario]
+    assert result["events"] == (50 if scenario == "single" else 200)
+    assert result["events_per_sec"] > 0
+    assert result["latency_samples"] > 0
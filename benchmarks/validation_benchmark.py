@@ -0,0 +1,81 @@
+"""
+Event validation benchmark
+
+Compares the per-event cost of the compiled validators with walking the same
+schemas per event (validation.interpret) and, when installed, the jsonschema
+package, for the event schema produced by generate_sample_events.
+
+Usage:
+    python benchmarks/validation_benchmark.py [--events 20000] [--rounds 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "producer-service"))
+
+from app import generate_sample_events  # noqa: E402
+from validation import EVENT_SCHEMAS, ValidatorCache, interpret  # noqa: E402
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+
+def bench(fn, rounds: int) -> float:
+    """Return the best-of-N duration of fn(), in seconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000, help="events per round")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per validator (best is kept)")
+    args = parser.parse_args()
+
+    events = generate_sample_events(args.events, seed=1)
+    cache = ValidatorCache(EVENT_SCHEMAS)
+    start = time.perf_counter()
+    compiled = cache.compile_all()
+    compile_ms = (time.perf_counter() - start) * 1000
+    assert all(error is None for error in cache.validate_batch(events))
+
+    def interpreted():
+        for event in events:
+            interpret(EVENT_SCHEMAS[(event["event_type"], event["version"])], event)
+
+    runs = [
+        ("compiled", lambda: cache.validate_batch(events)),
+        ("interpreted", interpreted),
+    ]
+    if jsonschema is not None:
+        checkers = {
+            key: jsonschema.validators.validator_for(schema)(schema)
+            for key, schema in EVENT_SCHEMAS.items()
+        }
+
+        def with_jsonschema():
+            for event in events:
+                checkers[(event["event_type"], event["version"])].is_valid(event)
+
+        runs.append(("jsonschema", with_jsonschema))
+
+    print(f"compiled {compiled} schemas in {compile_ms:.1f} ms")
+    print(f"{'validator':<12} {'us/event':>10} {'events/s':>12} {'relative':>9}")
+    baseline = None
+    for name, fn in runs:
+        per_event = bench(fn, args.rounds) / len(events)
+        baseline = baseline or per_event
+        print(f"{name:<12} {per_event * 1e6:>10.2f} {1 / per_event:>12,.0f} {per_event / baseline:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+KafkaTrace windowed aggregation
+
+Streaming counts per key (event_type, event_type/action, ...) kept inside the
+consumer so per-minute dashboards do not need every event exported first.
+
+Each key owns fixed-size ring buffers backed by `array`:
+- a per-second ring of counts, for sliding windows and rates;
+- a per-minute ring of counts plus a HyperLogLog sketch per minute, for
+  tumbling windows and distinct user estimates.
+
+A ring slot remembers which bucket it holds and is reset when a newer bucket
+reuses it, so old windows are evicted as time moves on and memory per key is
+fixed. Keys idle for longer than the minute ring are swept, and each dimension
+holds at most max_keys keys. Updating is O(1) per event.
+
+Buckets use the record timestamp (producer create time), so a backlog replays
+into the minutes it was produced in; records older than a ring are dropped.
+The aggregator is not thread-safe: feed and query it from the event loop.
+"""
+
+import math
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+from metrics_buffer import LabelCache
+
+AGGREGATION_KEYS = Gauge(
+    'aggregation_keys',
+    'Keys tracked by the windowed aggregator',
+    ['dimension']
+)
+
+AGGREGATION_DROPPED = Counter(
+    'aggregation_dropped_total',
+    'Events not aggregated (too late for the window rings, or key limit reached)',
+    ['dimension', 'reason']
+)
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(value: int) -> int:
+    """splitmix64 finalizer: spreads sequential ids across all 64 bits."""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def _hash64(value: Any) -> int:
+    if isinstance(value, int):
+        return _mix64(value & _MASK64)
+    return _mix64(hash(str(value)) & _MASK64)
+
+
+class _CountRing:
+    """Counts per bucket for the last `size` buckets."""
+
+    __slots__ = ("size", "counts", "buckets")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.counts = array('q', bytes(8 * size))
+        self.buckets = array('q', [-1]) * size
+
+    def add(self, bucket: int, n: int = 1) -> bool:
+        i = bucket % self.size
+        held = self.buckets[i]
+        if held != bucket:
+            if held > bucket:
+                return False  # the slot already holds a newer bucket: too late
+            self.buckets[i] = bucket
+            self.counts[i] = 0
+        self.counts[i] += n
+        return True
+
+    def get(self, bucket: int) -> int:
+        i = bucket % self.size
+        return self.counts[i] if self.buckets[i] == bucket else 0
+
+    def total(self, first: int, last: int) -> int:
+        return sum(self.get(b) for b in range(max(first, last - self.size + 1), last + 1))
+
+
+class _SketchRing:
+    """A HyperLogLog sketch per bucket for the last `size` buckets."""
+
+    __slots__ = ("size", "precision", "registers", "buckets")
+
+    def __init__(self, size: int, precision: int):
+        self.size = size
+        self.precision = precision
+        self.registers = [bytearray(1 << precision) for _ in range(size)]
+        self.buckets = array('q', [-1]) * size
+
+    def add(self, bucket: int, hashed: int):
+        i = bucket % self.size
+        held = self.buckets[i]
+        if held != bucket:
+            if held > bucket:
+                return
+            self.buckets[i] = bucket
+            self.registers[i][:] = bytes(1 << self.precision)
+        p = self.precision
+        index = hashed & ((1 << p) - 1)
+        rank = (64 - p) - (hashed >> p).bit_length() + 1
+        registers = self.registers[i]
+        if rank > registers[index]:
+            registers[index] = rank
+
+    def estimate(self, first: int, last: int) -> int:
+        """Distinct count over buckets first..last (register-wise max merge)."""
+        merged = None
+        for bucket in range(max(first, last - self.size + 1), last + 1):
+            i = bucket % self.size
+            if self.buckets[i] != bucket:
+                continue
+            if merged is None:
+                merged = bytearray(self.registers[i])
+            else:
+                merged = bytearray(map(max, merged, self.registers[i]))
+        if merged is None:
+            return 0
+        m = len(merged)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in merged)
+        zeros = merged.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # linear counting for small sets
+        return round(raw)
+
+
+class _Series:
+    __slots__ = ("seconds", "minutes", "sketches", "last_seen")
+
+    def __init__(self, second_buckets: int, minute_buckets: int, precision: int):
+        self.seconds = _CountRing(second_buckets)
+        self.minutes = _CountRing(minute_buckets)
+        self.sketches = _SketchRing(minute_buckets, precision)
+        self.last_seen = 0.0
+
+
+class WindowAggregator:
+    """
+    Tumbling (per-minute) and sliding (per-second) windows per dimension key.
+
+    dimensions maps a dimension name to a function returning the event's key
+    (None skips the event for that dimension); distinct_field returns the
+    value whose distinct count is estimated (data.user_id).
+    """
+
+    def __init__(
+        self,
+        dimensions: Dict[str, Callable[[Dict[str, Any]], Optional[str]]],
+        distinct_field: Callable[[Dict[str, Any]], Any],
+        second_buckets: int = 900,
+        minute_buckets: int = 60,
+        hll_precision: int = 8,
+        max_keys: int = 200
+    ):
+        self.dimensions = dimensions
+        self.distinct_field = distinct_field
+        self.second_buckets = second_buckets
+        self.minute_buckets = minute_buckets
+        self.hll_precision = hll_precision
+        self.max_keys = max_keys
+
+        self._series: Dict[str, Dict[str, _Series]] = {name: {} for name in dimensions}
+        # Label children bound once here rather than per event
+        self._dropped = LabelCache(
+            AGGREGATION_DROPPED, [(name, reason) for name in dimensions for reason in ("key_limit", "late")]
+        )
+        self._key_counts = LabelCache(AGGREGATION_KEYS, [(name,) for name in dimensions])
+        self._next_sweep = time.time() + 60
+        self.observed = 0
+
+    def observe(self, event: Dict[str, Any], timestamp_ms: Optional[int] = None):
+        now = time.time()
+        ts = timestamp_ms / 1000 if timestamp_ms and timestamp_ms > 0 else now
+        second = int(ts)
+        minute = second // 60
+        distinct = self.distinct_field(event)
+        hashed = _hash64(distinct) if distinct is not None else None
+
+        for name, key_of in self.dimensions.items():
+            key = key_of(event)
+            if key is None:
+                continue
+            series = self._series[name].get(key)
+            if series is None:
+                if len(self._series[name]) >= self.max_keys:
+                    self._dropped.get((name, "key_limit")).inc()
+                    continue
+                series = self._series[name][key] = _Series(
+                    self.second_buckets, self.minute_buckets, self.hll_precision
+                )
+                self._key_counts.get((name,)).set(len(self._series[name]))
+            series.last_seen = now
+            series.seconds.add(second)
+            if not series.minutes.add(minute):
+                self._dropped.get((name, "late")).inc()
+                continue
+            if hashed is not None:
+                series.sketches.add(minute, hashed)
+
+        self.observed += 1
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+    def sliding(self, dimension: str, window_seconds: int) -> Dict[str, Dict[str, Any]]:
+        """Count, rate and distinct estimate per key over the last window_seconds."""
+        window_seconds = max(1, min(window_seconds, self.second_buckets))
+        last = int(time.time())
+        first = last - window_seconds + 1
+        minutes = (first // 60, last // 60)
+        result = {}
+        for key, series in self._keys(dimension).items():
+            count = series.seconds.total(first, last)
+            result[key] = {
+                "count": count,
+                "rate": count / window_seconds,
+                # Sketches are per minute: covers the whole minutes the window touches
+                "distinct_users": series.sketches.estimate(*minutes)
+            }
+        return result
+
+    def tumbling(self, dimension: str, minutes: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Per-minute count and distinct estimate per key for the last `minutes` minutes."""
+        minutes = max(1, min(minutes, self.minute_buckets))
+        current = int(time.time()) // 60
+        result = {}
+        for key, series in self._keys(dimension).items():
+            result[key] = [
+                {
+                    "minute": time.strftime("%Y-%m-%dT%H:%M:00Z", time.gmtime(m * 60)),
+                    "count": series.minutes.get(m),
+                    "distinct_users": series.sketches.estimate(m, m)
+                }
+                for m in range(current - minutes + 1, current + 1)
+            ]
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        per_key = (
+            16 * (self.second_buckets + self.minute_buckets)
+            + self.minute_buckets * (8 + (1 << self.hll_precision))
+        )
+        return {
+            "observed": self.observed,
+            "dimensions": {name: sorted(series) for name, series in self._series.items()},
+            "second_buckets": self.second_buckets,
+            "minute_buckets": self.minute_buckets,
+            "max_keys": self.max_keys,
+            "approx_memory_bytes": per_key * sum(len(s) for s in self._series.values())
+        }
+
+    def _keys(self, dimension: str) -> Dict[str, _Series]:
+        if dimension not in self._series:
+            raise KeyError(dimension)
+        return self._series[dimension]
+
+    def _sweep(self, now: float):
+        """Drop keys not seen for longer than the minute ring covers."""
+        horizon = now - self.minute_buckets * 60
+        for name, series in self._series.items():
+            for key in [k for k, s in series.items() if s.last_seen < horizon]:
+                del series[key]
+            self._key_counts.get((name,)).set(len(series))
+        self._next_sweep = now + 60
@@ -14,28 +14,48 @@ Learning Objectives:
 """
 
 import asyncio
-import json
 import logging
 import time
 import uuid
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, KafkaProducer
 from kafka.errors import KafkaError
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import Response
 from starlette.requests import Request
 
-# Configure structured logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from aggregation import WindowAggregator
+from commit_manager import CommitManager
+from consumer_engine import PollingEngine
+from dedup import DUPLICATE_EVENTS, DedupFilter
+from enrichment import Enricher, HttpLookupBackend
+from event_store import RecentEventStore
+from handler_registry import HandlerRegistry, Outcome
+from lag_sampler import LagSampler
+from metrics_buffer import LabelCache, MetricBatch
+from parallel import KeyOrderedExecutor, OffsetTracker
+from persistence import GroupCommitWriter, SqliteEventStore, event_row
+from redrive import DlqRedriver
+from retry import FailureRouter, InvalidEvent, RetryGate, RetryTier
+from lazy_record import LazyEvent
+from structured_logging import EventLog, configure_logging, dropped_records
+from tracing import extract
+from validation import validators
+
+# Configure structured logging: JSON lines written by a background thread
+LOG_LEVEL = "INFO"
+LOG_JSON = True  # False for the plain text format
+LOG_SUCCESS_SAMPLE_RATE = 0.01  # fraction of per-event success lines emitted
+LOG_ERROR_INTERVAL_SECONDS = 10  # repeated per-event errors: one line per key per window
+
+configure_logging(level=LOG_LEVEL, json_format=LOG_JSON, service="consumer")
 logger = logging.getLogger(__name__)
+event_log = EventLog(logger, LOG_SUCCESS_SAMPLE_RATE, LOG_ERROR_INTERVAL_SECONDS)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -62,12 +82,27 @@ EVENTS_CONSUMED = Counter(
     ['topic', 'event_type', 'status']
 )
 
+# Kept apart from events_consumed_total, whose rate is the throughput and whose
+# error share drives the alerts
+EVENTS_SKIPPED = Counter(
+    'events_skipped_total',
+    'Consumed events that were not processed',
+    ['topic', 'event_type', 'reason']  # no_handler, filtered (CONSUMER_EVENT_TYPES)
+)
+
 EVENT_PROCESSING_DURATION = Histogram(
     'event_processing_duration_seconds',
     'Time spent processing events',
     ['event_type']
 )
 
+END_TO_END_LATENCY = Histogram(
+    'event_end_to_end_latency_seconds',
+    'Time from the producer handing an event to Kafka until it was processed (kt-produced-at header)',
+    ['topic', 'event_type'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+
 KAFKA_CONNECTION_STATUS = Gauge(
     'kafka_connection_status',
     'Kafka connection status (1=connected, 0=disconnected)'
@@ -79,6 +114,26 @@ CONSUMER_LAG = Gauge(
     ['topic', 'partition']
 )
 
+# Kept apart from consumer_lag: retry partitions stay paused until their records are due
+CONSUMER_RETRY_LAG = Gauge(
+    'consumer_retry_lag',
+    'Records waiting in retry topics per partition',
+    ['topic', 'partition']
+)
+
+EVENT_PAYLOAD_SIZE = Histogram(
+    'event_payload_size_bytes',
+    'Size of consumed record values',
+    ['topic'],
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144, 1048576)
+)
+
+CONSUME_BATCH_SIZE = Histogram(
+    'consume_batch_size',
+    'Records per polled batch handed to processing',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+
 # Kafka configuration
 # TODO: Move these to environment variables for different environments
 # This helps you learn configuration management best practices
@@ -87,8 +142,124 @@ KAFKA_TOPIC = "events"
 KAFKA_GROUP_ID = "kafkatrace-consumer-group"
 KAFKA_AUTO_OFFSET_RESET = "earliest"
 
+# Polling engine: records handed from the poll thread to the event loop
+CONSUMER_POLL_TIMEOUT_MS = 200  # bounds how long stop() waits on an idle poll
+CONSUMER_QUEUE_MAX_BATCHES = 8  # polled batches buffered ahead of processing
+CONSUMER_BATCH_SIZE = 500  # max records per processed batch (also max_poll_records)
+CONSUMER_BATCH_MAX_WAIT_MS = 100  # hand off a partial batch after this long
+# Process only these event types (a set); others are committed past without
+# being decoded. None processes every event type.
+CONSUMER_EVENT_TYPES = None
+
+# Offset commits: coalesced into commit_async, whichever bound is hit first
+CONSUMER_COMMIT_INTERVAL_MS = 1000
+CONSUMER_COMMIT_MAX_RECORDS = 5000
+
+# Parallel processing: lanes keep records with the same key in order
+CONSUMER_CONCURRENCY = 4
+CONSUMER_ORDERING_KEY = "partition"  # "partition", "event_id" or "user_id"
+
+# Lag sampling: end offsets fetched off the poll thread on their own client
+CONSUMER_POSITIONS_INTERVAL_MS = 1000  # how often the poll thread snapshots positions
+LAG_SAMPLE_INTERVAL_SECONDS = 10
+
+# Retry pipeline: failed records move through delayed retry topics, then the DLQ
+RETRY_TIERS = [
+    RetryTier("events.retry.5s", 5),
+    RetryTier("events.retry.1m", 60),
+    RetryTier("events.retry.10m", 600),
+]
+DLQ_TOPIC = "events.dlq"
+QUARANTINE_TOPIC = "events.quarantine"  # events that fail schema validation
+FAILURE_ROUTING_TIMEOUT = 10  # seconds to wait for a retry/DLQ ack
+DLQ_REDRIVE_DEFAULT_RATE = 10.0  # records/sec
+
+# Windowed aggregates: per-second and per-minute rings per key, bounded memory
+AGGREGATION_SECOND_BUCKETS = 900  # sliding windows up to 15 minutes
+AGGREGATION_MINUTE_BUCKETS = 60  # tumbling per-minute history
+AGGREGATION_MAX_KEYS = 200  # per dimension
+
+# Deduplication: recently seen event_ids in a fixed-size, time-bucketed Bloom filter
+DEDUP_ENABLED = True
+DEDUP_WINDOW_SECONDS = 600
+DEDUP_MEMORY_BYTES = 16 * 1024 * 1024
+DEDUP_GENERATION_CAPACITY = 1_000_000  # ids per generation before it rotates early
+DEDUP_SNAPSHOT_PATH: Optional[str] = "/tmp/kafkatrace-dedup.snapshot"  # None disables
+
+# Persistence: processed events group-committed to SQLite before offsets complete.
+# Opt-in: point PERSISTENCE_DB_PATH at a file on a persistent volume
+PERSISTENCE_DB_PATH: Optional[str] = None  # None disables
+PERSISTENCE_RETENTION_SECONDS: Optional[float] = 7 * 24 * 3600  # older rows are pruned; None keeps all
+PERSISTENCE_GROUP_MAX_ROWS = 2000  # commit once this many rows are waiting...
+PERSISTENCE_GROUP_MAX_WAIT_MS = 10  # ...or this long after the first of them
+
+# Recent-event store: last N events (and none older than T) indexed for /events/search.
+# An entry costs about its payload plus ~170 bytes (~55 MB per 100k sample
+# events), so 50k keeps the store a small share of the chart's 512Mi limit
+RECENT_EVENTS_MAX = 50_000
+RECENT_EVENTS_MAX_AGE_SECONDS = 900
+SEARCH_MAX_LIMIT = 1000
+
+# Enrichment: user profiles by data.user_id, cached and fetched in bulk. Only
+# enabled when USER_SERVICE_URL names a bulk lookup endpoint
+USER_SERVICE_URL: Optional[str] = None
+ENRICHMENT_CACHE_TTL_SECONDS = 300
+ENRICHMENT_NEGATIVE_TTL_SECONDS = 30
+ENRICHMENT_CACHE_MAX_ENTRIES = 100_000
+ENRICHMENT_MAX_BATCH_SIZE = 100  # keys per bulk lookup
+ENRICHMENT_TIMEOUT_SECONDS = 0.5  # events continue unenriched after this
+
+# Label children bound up front; per-batch updates go through a MetricBatch
+KNOWN_EVENT_TYPES = ("user_action", "system_metric", "business_event", "error_log")
+
+consumed_counts = LabelCache(EVENTS_CONSUMED, [
+    (KAFKA_TOPIC, event_type, status)
+    for event_type in KNOWN_EVENT_TYPES for status in ("success", "error")
+])
+skipped_counts = LabelCache(EVENTS_SKIPPED)
+processing_durations = LabelCache(EVENT_PROCESSING_DURATION, [(t,) for t in KNOWN_EVENT_TYPES])
+end_to_end_latencies = LabelCache(END_TO_END_LATENCY, [(KAFKA_TOPIC, t) for t in KNOWN_EVENT_TYPES])
+payload_sizes = LabelCache(EVENT_PAYLOAD_SIZE, [(KAFKA_TOPIC,)])
+duplicate_counts = LabelCache(DUPLICATE_EVENTS, [(KAFKA_TOPIC,)])
+
 # Global consumer instance
 consumer: KafkaConsumer = None
+engine: Optional[PollingEngine] = None
+executor: Optional[KeyOrderedExecutor] = None
+commit_manager: Optional[CommitManager] = None
+lag_sampler: Optional[LagSampler] = None
+failure_producer: Optional[KafkaProducer] = None
+failure_router: Optional[FailureRouter] = None
+retry_gate: Optional[RetryGate] = None
+redriver: Optional[DlqRedriver] = None
+dedup: Optional[DedupFilter] = None
+event_sink: Optional[GroupCommitWriter] = None
+user_enricher: Optional[Enricher] = None
+tracker = OffsetTracker()
+
+def _action_key(event: Dict[str, Any]) -> Optional[str]:
+    data = event.get("data")
+    action = data.get("action") if isinstance(data, dict) else None
+    return f"{event.get('event_type')}/{action}" if action is not None else None
+
+def _user_id(event: Dict[str, Any]) -> Any:
+    data = event.get("data")
+    return data.get("user_id") if isinstance(data, dict) else None
+
+aggregator = WindowAggregator(
+    dimensions={
+        "event_type": lambda event: event.get("event_type"),
+        "action": _action_key,
+    },
+    distinct_field=_user_id,
+    second_buckets=AGGREGATION_SECOND_BUCKETS,
+    minute_buckets=AGGREGATION_MINUTE_BUCKETS,
+    max_keys=AGGREGATION_MAX_KEYS
+)
+recent_events = RecentEventStore(
+    max_events=RECENT_EVENTS_MAX,
+    max_age_seconds=RECENT_EVENTS_MAX_AGE_SECONDS
+)
 consumer_task: Optional[asyncio.Task] = None
 
 def create_kafka_consumer() -> KafkaConsumer:
@@ -99,20 +270,22 @@ def create_kafka_consumer() -> KafkaConsumer:
     This helps you learn Kafka security configurations.
     """
     try:
+        # Subscribed in startup_event, once the commit manager's rebalance
+        # listener exists
         consumer = KafkaConsumer(
-            KAFKA_TOPIC,
             bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
             group_id=KAFKA_GROUP_ID,
             auto_offset_reset=KAFKA_AUTO_OFFSET_RESET,
-            enable_auto_commit=True,
-            auto_commit_interval_ms=1000,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+            # Offsets are committed by the CommitManager, only up to the
+            # last record that finished processing on every lane
+            enable_auto_commit=False,
+            # Values stay raw bytes and are wrapped in LazyEvent, which decodes
+            # them (by the record's format header) only when the body is read
             key_deserializer=lambda k: k.decode('utf-8') if k else None,
             # TODO: Add consumer timeout and session timeout configurations
             # session_timeout_ms=30000,
             # heartbeat_interval_ms=3000,
-            # TODO: Add max poll records for batch processing
-            # max_poll_records=500,
+            max_poll_records=CONSUMER_BATCH_SIZE,
         )
         KAFKA_CONNECTION_STATUS.set(1)
         logger.info("Kafka consumer created successfully")
@@ -122,170 +295,496 @@ def create_kafka_consumer() -> KafkaConsumer:
         logger.error(f"Failed to create Kafka consumer: {e}")
         raise
 
+def create_lag_client() -> KafkaConsumer:
+    """
+    Create the group-less client the lag sampler uses for end-offset lookups.
+
+    It never joins the consumer group, so sampling cannot trigger a rebalance.
+    """
+    return KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=None,
+        enable_auto_commit=False
+    )
+
+def create_failure_producer() -> KafkaProducer:
+    """
+    Create the producer that republishes failed records to retry topics and the DLQ.
+
+    Values and headers are forwarded exactly as consumed; only keys need encoding.
+    """
+    return KafkaProducer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        key_serializer=lambda k: k.encode('utf-8') if isinstance(k, str) else k,
+        acks="all",
+        retries=3,
+        linger_ms=5
+    )
+
+def create_redrive_consumer() -> KafkaConsumer:
+    """Create the consumer a DLQ redrive reads with (its own group, manual commits)."""
+    return KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=f"{KAFKA_GROUP_ID}-dlq-redrive",
+        auto_offset_reset="earliest",
+        enable_auto_commit=False
+    )
+
+# Event handlers: registered per event_type (optionally narrowed with
+# where={"data.action": ...} or a predicate) and compiled into a dispatch table.
+# Events without a handler are counted as skipped.
+#
+# Events are validated against their (event_type, version) schema before
+# dispatch (see validation.py); invalid ones go to the quarantine topic.
+#
+# Events are enriched with the user profile (see enrichment.py) before dispatch.
+#
+# TODO: Add geolocation enrichment from data.metadata.ip_address
+# This helps you learn data enrichment patterns
+#
+# TODO: Add event transformation (e.g., format conversion, aggregation)
+# This helps you learn data transformation patterns
+#
+# Processed events are persisted by process_event_batch (see persistence.py).
+#
+# TODO: Add event routing to other systems
+# This helps you learn event routing and integration patterns
+handlers = HandlerRegistry()
+
+@handlers.handler("user_action")
+def handle_user_action(event: Dict[str, Any]):
+    # TODO: Process user actions (e.g., analytics, notifications)
+    pass
+
+@handlers.handler("system_metric")
+def handle_system_metric(event: Dict[str, Any]):
+    # TODO: Process system metrics (e.g., alerting, monitoring)
+    pass
+
+@handlers.handler("business_event")
+def handle_business_event(event: Dict[str, Any]):
+    # TODO: Process business events (e.g., reporting, workflows)
+    pass
+
+@handlers.handler("error_log")
+def handle_error_log(event: Dict[str, Any]):
+    # TODO: Process error logs (e.g., alerting, debugging)
+    pass
+
 def process_event(event: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Process a single event with business logic.
-    
-    TODO: Implement your actual event processing logic here.
-    This helps you learn event processing patterns and data transformation.
+    Process a single event through the handler registry.
+
+    Used by the manual /process-event endpoint, so it also builds the
+    processed_event wrapper returned to the caller; the consume loop uses
+    process_event_batch and never builds it. Like the batch path, it persists
+    the event (blocking) before counting it.
     """
     start_time = time.time()
     event_type = event.get("event_type", "unknown")
     
     try:
-        # TODO: Add event validation and schema checking
-        # This helps you learn data quality and validation patterns
-        
-        # TODO: Add event enrichment (e.g., user lookup, geolocation)
-        # This helps you learn data enrichment patterns
-        
-        # TODO: Add event filtering based on business rules
-        # This helps you learn event filtering and routing patterns
+        outcome = handlers.dispatch(event)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        status = "skipped" if outcome is None else "success"
+        if event_sink is not None:
+            event_sink.write([event_row(event, status, time.time())])
         
-        # TODO: Add event transformation (e.g., format conversion, aggregation)
-        # This helps you learn data transformation patterns
-        
-        # TODO: Add event persistence to database
-        # This helps you learn data persistence patterns
+        duration = time.time() - start_time
+        processing_durations.get((event_type,)).observe(duration)
+        if outcome is None:
+            skipped_counts.get((KAFKA_TOPIC, event_type, "no_handler")).inc()
+        else:
+            consumed_counts.get((KAFKA_TOPIC, event_type, status)).inc()
         
-        # TODO: Add event routing to other systems
-        # This helps you learn event routing and integration patterns
+        event_log.success(
+            "Event processed successfully: event_id=%s, event_type=%s, duration=%.3fs",
+            event.get('event_id'), event_type, duration
+        )
         
-        # Example processing logic (replace with your actual logic)
-        processed_event = {
+        return {
             "processed_at": datetime.utcnow().isoformat(),
             "original_event": event,
             "processing_metadata": {
                 "processor": "kafkatrace-consumer",
                 "version": "1.0",
-                "processing_time_ms": (time.time() - start_time) * 1000
+                "status": status,
+                "handlers": [r.name for r in handlers.route(event)],
+                "processing_time_ms": duration * 1000
             }
         }
         
-        # TODO: Add business logic based on event type
-        if event_type == "user_action":
-            # TODO: Process user actions (e.g., analytics, notifications)
-            pass
-        elif event_type == "system_metric":
-            # TODO: Process system metrics (e.g., alerting, monitoring)
-            pass
-        elif event_type == "business_event":
-            # TODO: Process business events (e.g., reporting, workflows)
-            pass
-        elif event_type == "error_log":
-            # TODO: Process error logs (e.g., alerting, debugging)
-            pass
-        
-        duration = time.time() - start_time
-        EVENT_PROCESSING_DURATION.observe(duration)
-        EVENTS_CONSUMED.labels(
-            topic=KAFKA_TOPIC,
-            event_type=event_type,
-            status="success"
-        ).inc()
-        
-        logger.info(
-            f"Event processed successfully: event_id={event.get('event_id')}, "
-            f"event_type={event_type}, duration={duration:.3f}s"
-        )
-        
-        return processed_event
-        
     except Exception as e:
         duration = time.time() - start_time
-        EVENT_PROCESSING_DURATION.observe(duration)
-        EVENTS_CONSUMED.labels(
-            topic=KAFKA_TOPIC,
-            event_type=event_type,
-            status="error"
-        ).inc()
+        processing_durations.get((event_type,)).observe(duration)
+        consumed_counts.get((KAFKA_TOPIC, event_type, "error")).inc()
         
-        logger.error(f"Failed to process event {event.get('event_id')}: {e}")
+        event_log.error(
+            (event_type, type(e).__name__), "Failed to process event %s: %s", event.get('event_id'), e
+        )
         
-        # TODO: Add dead letter queue (DLQ) for failed events
-        # This helps you learn error handling patterns in event streaming
+        # Consumed records that fail are routed to the retry topics and DLQ by
+        # the executor; this manual path reports the error to the caller
         
         raise
 
+def process_event_batch(
+    events: List[Dict[str, Any]],
+    topic: str = KAFKA_TOPIC
+) -> List[Outcome]:
+    """
+    Process a batch of events with per-event semantics and per-batch metrics.
+
+    Every event is processed independently: a failing event yields its exception
+    at its position in the result (for the retry pipeline), an event no handler
+    wants yields None, and the rest of the batch continues. Batch-capable
+    handlers get their events in one call. Metric updates are accumulated in a
+    MetricBatch and applied once per batch, and one summary line is logged per
+    batch instead of one per event.
+
+    With persistence on, the rows of the processed events are written before
+    anything is counted: if the write fails, every one of them yields the error
+    instead (and goes to the retry pipeline), so it is never counted as a success.
+    """
+    batch_start = time.time()
+    durations = [0.0] * len(events)
+    results = handlers.dispatch_batch(events, durations)
+    
+    if event_sink is not None:
+        # Blocks until the rows are durable, so their offsets complete only afterwards
+        processed_at = time.time()
+        try:
+            event_sink.write([
+                event_row(event, "skipped" if outcome is None else "success", processed_at)
+                for event, outcome in zip(events, results)
+                if not isinstance(outcome, BaseException)
+            ])
+        except Exception as e:
+            results = [outcome if isinstance(outcome, BaseException) else e for outcome in results]
+    
+    batch_metrics = MetricBatch()
+    failed = 0
+    
+    for event, outcome, duration in zip(events, results, durations):
+        event_type = event.get("event_type", "unknown")
+        if outcome is None:
+            batch_metrics.inc(skipped_counts, (topic, event_type, "no_handler"))
+        elif isinstance(outcome, BaseException):
+            failed += 1
+            event_log.error(
+                (event_type, type(outcome).__name__), "Failed to process event %s: %s",
+                event.get('event_id'), outcome
+            )
+            batch_metrics.inc(consumed_counts, (topic, event_type, "error"))
+        else:
+            batch_metrics.inc(consumed_counts, (topic, event_type, "success"))
+        batch_metrics.observe(processing_durations, (event_type,), duration)
+    batch_metrics.flush()
+    
+    logger.info(
+        f"Batch processed: events={len(events)}, failed={failed}, "
+        f"duration={time.time() - batch_start:.3f}s"
+    )
+    
+    return results
+
+def observe_end_to_end(items: List[Tuple[Any, Dict[str, Any]]]):
+    """
+    Record produce-to-processed latency for records the executor finished.
+
+    The produce time comes from the record's trace headers, so the payload is
+    not touched; records without them (other producers) are not observed.
+    Retried records keep their original produce time. Clock skew between
+    hosts can make a latency negative, which is clamped to zero.
+    """
+    now_ms = time.time() * 1000
+    batch_metrics = MetricBatch()
+    for record, event in items:
+        produced_at_ms = extract(record.headers).produced_at_ms
+        if produced_at_ms is not None:
+            batch_metrics.observe(
+                end_to_end_latencies,
+                (record.topic, event.get("event_type", "unknown")),
+                max(0.0, now_ms - produced_at_ms) / 1000
+            )
+    batch_metrics.flush()
+
+def on_events_processed(items: List[Tuple[Any, Dict[str, Any]]]):
+    """Executor on_processed: observe latency and let dedup remember the processed event ids."""
+    observe_end_to_end(items)
+    if dedup is not None:
+        for _, event in items:
+            event_id = event.get("event_id")
+            if event_id is not None:
+                dedup.add(event_id)
+
+def on_events_completed(items: List[Tuple[Any, Dict[str, Any]]]):
+    """Executor on_completed: drop the dedup reservations of every finished record."""
+    if dedup is not None:
+        for record, event in items:
+            if record.topic != KAFKA_TOPIC:
+                continue  # only first deliveries reserve their id
+            event_id = event.get("event_id")
+            if event_id is not None:
+                dedup.release(event_id)
+
 async def consume_events():
     """
     Main event consumption loop with error handling and metrics.
+
+    Polling happens on the engine's dedicated thread; this task only processes
+    the batches it hands over, so the event loop is never blocked on the broker.
     
     TODO: Add rate limiting and backpressure handling.
     This helps you learn flow control in event streaming systems.
     """
-    global consumer
-    
-    if not consumer:
+    if not engine:
         logger.error("Kafka consumer not initialized")
         return
     
     logger.info("Starting event consumption loop")
     
+    if dedup is not None:
+        # Reservations left by a previous run belong to records that will be redelivered
+        dedup.release_all()
+    executor.start()
     try:
-        for message in consumer:
-            try:
-                # TODO: Add message validation before processing
-                # This helps you learn message validation patterns
-                
-                event = message.value
-                if not event:
-                    logger.warning("Received empty message, skipping")
+        while True:
+            batch = await engine.next_batch()
+            if batch is None:
+                break
+            
+            tracker.track(batch)
+            CONSUME_BATCH_SIZE.observe(len(batch))
+            batch_metrics = MetricBatch()
+            decoded = []
+            undecodable = []
+            for message in batch:
+                if not message.value:
+                    event_log.warning("empty", "Received empty message, skipping")
+                    tracker.complete(message)
                     continue
-                
-                # TODO: Add correlation ID extraction for distributed tracing
-                # correlation_id = event.get("correlation_id")
-                
-                # Process the event
-                processed_event = process_event(event)
-                
-                # TODO: Add event acknowledgment and offset management
-                # This helps you learn consumer offset management
-                
-                # TODO: Add batch processing for better performance
-                # This helps you learn batch processing patterns
-                
-                # TODO: Add event routing based on content
-                # This helps you learn event routing patterns
-                
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                # TODO: Add retry logic with exponential backoff
-                # This helps you learn resilience patterns
-                
-    except KeyboardInterrupt:
-        logger.info("Received interrupt signal, shutting down consumer")
-    except Exception as e:
-        logger.error(f"Unexpected error in consumer loop: {e}")
-        KAFKA_CONNECTION_STATUS.set(0)
+                batch_metrics.observe(payload_sizes, (message.topic,), len(message.value))
+                event = LazyEvent(message.value, message.headers)
+                try:
+                    if CONSUMER_EVENT_TYPES is not None:
+                        # Routed from the headers or a partial scan, without decoding
+                        event_type = event.routing("event_type")
+                        if event_type not in CONSUMER_EVENT_TYPES:
+                            label = event_type if event_type in KNOWN_EVENT_TYPES else "unknown"
+                            batch_metrics.inc(skipped_counts, (message.topic, label, "filtered"))
+                            tracker.complete(message)
+                            continue
+                    # Validation, dedup, aggregation and enrichment read the whole
+                    # event, so what passes the filter is decoded here, where a
+                    # payload that does not decode can still be dead-lettered
+                    body = event.body
+                except Exception as e:
+                    event_log.error(
+                        "decode", "Error decoding message at offset %s: %s", message.offset, e
+                    )
+                    batch_metrics.inc(consumed_counts, (message.topic, "unknown", "error"))
+                    undecodable.append((message, e))
+                    continue
+                if not body:
+                    event_log.warning("empty", "Received empty message, skipping")
+                    tracker.complete(message)
+                    continue
+                decoded.append((message, event))
+            
+            # Retried records were validated, deduplicated and counted when first consumed
+            fresh = [event.body for message, event in decoded if message.topic == KAFKA_TOPIC]
+            errors = iter(validators.validate_batch(fresh))
+            items = []
+            invalid = []
+            for message, event in decoded:
+                if message.topic == KAFKA_TOPIC:
+                    body = event.body
+                    error = next(errors)
+                    if error is not None:
+                        event_type = body.get("event_type") if isinstance(body, dict) else None
+                        event_log.error(
+                            ("invalid", event_type), "Invalid event at %s-%s@%s (correlation_id=%s): %s",
+                            message.topic, message.partition, message.offset,
+                            extract(message.headers).correlation_id, error
+                        )
+                        invalid.append((message, InvalidEvent(error)))
+                        continue
+                    event_id = body.get("event_id")
+                    if dedup is not None and event_id is not None and dedup.seen(event_id):
+                        batch_metrics.inc(duplicate_counts, (message.topic,))
+                        tracker.complete(message)
+                        continue
+                    aggregator.observe(body, message.timestamp)
+                    recent_events.add(
+                        event, message.topic, message.partition, message.offset, message.timestamp
+                    )
+                items.append((message, event))
+            batch_metrics.flush()
+            recent_events.refresh_metrics()
+            if dedup is not None:
+                dedup.refresh_metrics()
+            
+            if undecodable:
+                # Retrying cannot fix a payload that does not decode
+                await asyncio.get_running_loop().run_in_executor(
+                    None, failure_router.dead_letter, undecodable
+                )
+                for message, _ in undecodable:
+                    tracker.complete(message)
+            
+            if invalid:
+                # Invalid events are kept aside for inspection, not retried
+                await asyncio.get_running_loop().run_in_executor(
+                    None, failure_router.quarantine, invalid
+                )
+                for message, _ in invalid:
+                    tracker.complete(message)
+            
+            if user_enricher is not None and items:
+                # Bounded by ENRICHMENT_TIMEOUT_SECONDS; a slow lookup is skipped, not awaited
+                await user_enricher.enrich(event for _, event in items)
+            
+            # Trace context stays in the record headers: lanes read the produce
+            # time back once processed (observe_end_to_end), and retried or
+            # dead-lettered records carry it along unchanged
+            
+            # Fan out to the key-ordered worker pool; offsets are completed
+            # as lanes finish and committed by the engine
+            await executor.dispatch(items)
+            
+            # TODO: Add event routing based on content
+            # This helps you learn event routing patterns
     finally:
-        if consumer:
-            consumer.close()
-            logger.info("Kafka consumer closed")
+        await executor.stop()
+        engine.finish()
+    
+    logger.info("Event consumption loop finished")
 
 async def start_consumer():
-    """Start the Kafka consumer in the background."""
+    """Start the polling engine and the processing task."""
     global consumer_task
-    if consumer_task is None or consumer_task.done():
+    if consumer_task is not None and consumer_task.done():
+        await stop_consumer()  # the task ended on its own; reap it and its engine first
+    if consumer_task is None:
+        engine.start()
+        lag_sampler.start()
         consumer_task = asyncio.create_task(consume_events())
         logger.info("Consumer task started")
 
 async def stop_consumer():
-    """Stop the Kafka consumer gracefully."""
+    """
+    Stop the Kafka consumer gracefully.
+
+    The poll thread stops after its current (short) poll, records already
+    handed off are processed, and processed offsets get a final commit.
+    The engine is stopped even if the processing task already ended (it may
+    have failed), so its poll thread never outlives the task.
+    """
     global consumer_task
-    if consumer_task and not consumer_task.done():
-        consumer_task.cancel()
-        try:
-            await consumer_task
-        except asyncio.CancelledError:
-            pass
-        logger.info("Consumer task stopped")
+    if consumer_task is None:
+        return
+    engine.stop()
+    try:
+        await consumer_task
+    except Exception as e:
+        logger.error(f"Consumer task failed: {e}")
+    consumer_task = None
+    await engine.join()
+    lag_sampler.stop()
+    await asyncio.get_running_loop().run_in_executor(None, lag_sampler.join)
+    logger.info("Consumer task stopped")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize Kafka consumer on application startup."""
-    global consumer
+    global consumer, engine, executor, commit_manager, lag_sampler
+    global failure_producer, failure_router, retry_gate, redriver, dedup, event_sink, user_enricher
+    compiled = validators.compile_all()
+    logger.info(f"Compiled {compiled} event validators")
     consumer = create_kafka_consumer()
+    if USER_SERVICE_URL:
+        user_enricher = Enricher(
+            "user",
+            _user_id,
+            HttpLookupBackend(USER_SERVICE_URL),
+            target="user",
+            ttl=ENRICHMENT_CACHE_TTL_SECONDS,
+            negative_ttl=ENRICHMENT_NEGATIVE_TTL_SECONDS,
+            max_entries=ENRICHMENT_CACHE_MAX_ENTRIES,
+            max_batch_size=ENRICHMENT_MAX_BATCH_SIZE,
+            timeout=ENRICHMENT_TIMEOUT_SECONDS
+        )
+    if PERSISTENCE_DB_PATH:
+        event_sink = GroupCommitWriter(
+            SqliteEventStore(PERSISTENCE_DB_PATH),
+            max_rows=PERSISTENCE_GROUP_MAX_ROWS,
+            max_wait_ms=PERSISTENCE_GROUP_MAX_WAIT_MS,
+            retention_seconds=PERSISTENCE_RETENTION_SECONDS
+        )
+        event_sink.start()
+    if DEDUP_ENABLED:
+        dedup = DedupFilter(
+            memory_bytes=DEDUP_MEMORY_BYTES,
+            window_seconds=DEDUP_WINDOW_SECONDS,
+            capacity=DEDUP_GENERATION_CAPACITY
+        )
+        if DEDUP_SNAPSHOT_PATH:
+            dedup.load(DEDUP_SNAPSHOT_PATH)
+    failure_producer = create_failure_producer()
+    failure_router = FailureRouter(
+        failure_producer,
+        RETRY_TIERS,
+        DLQ_TOPIC,
+        quarantine_topic=QUARANTINE_TOPIC,
+        send_timeout=FAILURE_ROUTING_TIMEOUT
+    )
+    retry_gate = RetryGate(consumer, failure_router.retry_topics)
+    redriver = DlqRedriver(
+        create_redrive_consumer,
+        failure_producer,
+        DLQ_TOPIC,
+        KAFKA_TOPIC,
+        send_timeout=FAILURE_ROUTING_TIMEOUT
+    )
+    executor = KeyOrderedExecutor(
+        process_event_batch,
+        tracker,
+        concurrency=CONSUMER_CONCURRENCY,
+        ordering_key=CONSUMER_ORDERING_KEY,
+        on_failure=failure_router.route,
+        on_processed=on_events_processed,
+        on_completed=on_events_completed
+    )
+    commit_manager = CommitManager(
+        consumer,
+        tracker,
+        max_records=CONSUMER_COMMIT_MAX_RECORDS,
+        interval_ms=CONSUMER_COMMIT_INTERVAL_MS
+    )
+    consumer.subscribe(
+        [KAFKA_TOPIC] + [tier.topic for tier in RETRY_TIERS],
+        listener=commit_manager.listener()
+    )
+    engine = PollingEngine(
+        consumer,
+        commit_manager,
+        queue_size=CONSUMER_QUEUE_MAX_BATCHES,
+        poll_timeout_ms=CONSUMER_POLL_TIMEOUT_MS,
+        batch_size=CONSUMER_BATCH_SIZE,
+        max_wait_ms=CONSUMER_BATCH_MAX_WAIT_MS,
+        positions_interval_ms=CONSUMER_POSITIONS_INTERVAL_MS,
+        gate=retry_gate
+    )
+    lag_sampler = LagSampler(
+        create_lag_client,
+        engine.positions,
+        CONSUMER_LAG,
+        interval_seconds=LAG_SAMPLE_INTERVAL_SECONDS,
+        retry_topics=failure_router.retry_topics,
+        retry_lag_gauge=CONSUMER_RETRY_LAG
+    )
     
     # TODO: Add health check for Kafka connectivity
     # This helps you learn health check patterns for microservices
@@ -295,8 +794,24 @@ async def shutdown_event():
     """Clean up resources on application shutdown."""
     await stop_consumer()
     global consumer
+    if event_sink:
+        await asyncio.get_running_loop().run_in_executor(None, event_sink.stop)
+    if user_enricher:
+        await user_enricher.backend.close()
+    if dedup and DEDUP_SNAPSHOT_PATH:
+        # Everything the filter saw has now been processed and committed
+        try:
+            dedup.save(DEDUP_SNAPSHOT_PATH)
+        except OSError as e:
+            logger.error(f"Failed to write dedup snapshot: {e}")
+    if redriver:
+        redriver.stop()
+        await asyncio.get_running_loop().run_in_executor(None, redriver.join)
+    if failure_producer:
+        failure_producer.close()
     if consumer:
-        consumer.close()
+        # Offsets were already committed by the engine's final commit
+        consumer.close(autocommit=False)
         logger.info("Kafka consumer closed")
 
 @app.get("/")
@@ -327,7 +842,8 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "kafka_connected": consumer is not None,
-            "consumer_running": consumer_task is not None and not consumer_task.done()
+            "consumer_running": consumer_task is not None and not consumer_task.done(),
+            "log_records_dropped": dropped_records()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -382,16 +898,123 @@ async def consumer_status():
     
     # TODO: Add consumer group information
     # TODO: Add partition assignment information
-    # TODO: Add lag information per partition
     
     return {
         "status": "running" if consumer_task and not consumer_task.done() else "stopped",
         "kafka_connected": consumer is not None,
         "topic": KAFKA_TOPIC,
         "group_id": KAFKA_GROUP_ID,
+        "in_flight_records": tracker.in_flight(),
+        "committed_offsets": commit_manager.status() if commit_manager else {},
+        "lag": lag_sampler.status() if lag_sampler else {},
+        "paused_retry_partitions": retry_gate.status() if retry_gate else {},
+        "handlers": handlers.describe(),
+        "dedup": dedup.status() if dedup else {"enabled": False},
+        "persistence": event_sink.status() if event_sink else {"enabled": False},
+        "enrichment": user_enricher.status() if user_enricher else {"enabled": False},
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.post("/dlq/redrive/start")
+async def start_dlq_redrive(
+    rate: float = DLQ_REDRIVE_DEFAULT_RATE,
+    max_messages: Optional[int] = None
+):
+    """
+    Replay dead-lettered records onto their original topic at `rate` records/sec.
+
+    Stops at the DLQ's current end, after max_messages records, or on /dlq/redrive/stop.
+    """
+    if not redriver:
+        raise HTTPException(status_code=503, detail="Kafka consumer not initialized")
+    try:
+        redriver.start(rate=rate, max_messages=max_messages)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "started", **redriver.status()}
+
+@app.post("/dlq/redrive/stop")
+async def stop_dlq_redrive():
+    """Stop a running redrive; records replayed so far stay committed."""
+    if redriver and redriver.running:
+        redriver.stop()
+        await asyncio.get_running_loop().run_in_executor(None, redriver.join)
+    return {"status": "stopped", **(redriver.status() if redriver else {})}
+
+@app.get("/dlq/redrive/status")
+async def dlq_redrive_status():
+    """Progress of the current or last redrive."""
+    return redriver.status() if redriver else {"running": False}
+
+@app.get("/aggregates")
+async def aggregates_status():
+    """Tracked dimensions and keys of the windowed aggregator."""
+    return aggregator.status()
+
+@app.get("/aggregates/{dimension}/sliding")
+async def sliding_aggregates(dimension: str, window_seconds: int = 60):
+    """
+    Count, rate (events/sec) and distinct users per key over the last window_seconds.
+
+    Distinct users are estimated per minute, so they cover the whole minutes
+    the window touches.
+    """
+    try:
+        keys = aggregator.sliding(dimension, window_seconds)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown dimension: {dimension}")
+    return {"dimension": dimension, "window_seconds": window_seconds, "keys": keys}
+
+@app.get("/aggregates/{dimension}/tumbling")
+async def tumbling_aggregates(dimension: str, minutes: int = 5):
+    """Per-minute counts and distinct users per key for the last `minutes` minutes."""
+    try:
+        keys = aggregator.tumbling(dimension, minutes)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown dimension: {dimension}")
+    return {"dimension": dimension, "minutes": minutes, "keys": keys}
+
+@app.get("/events/search")
+async def search_events(
+    event_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100
+):
+    """
+    Look up recently consumed events, newest first.
+
+    Filters combine; since/until are ISO 8601 times matched against the record
+    timestamp (naive times are UTC). Only the events still held by the
+    recent-event store are searched.
+    """
+    if limit < 1 or limit > SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    start = time.perf_counter()
+    found = recent_events.search(
+        event_id=event_id,
+        user_id=user_id,
+        event_type=event_type,
+        since_ms=_epoch_ms(since) if since else None,
+        until_ms=_epoch_ms(until) if until else None,
+        limit=limit
+    )
+    return {
+        "count": len(found),
+        "events": [record.to_dict() for record in found],
+        "took_ms": (time.perf_counter() - start) * 1000,
+        "store": recent_events.status()
+    }
+
+def _epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
 @app.post("/process-event")
 async def process_single_event(event: Dict[str, Any]):
     """
@@ -401,7 +1024,8 @@ async def process_single_event(event: Dict[str, Any]):
     This helps you learn API design and security best practices.
     """
     try:
-        processed_event = process_event(event)
+        # On a pool thread: handlers and the persistence write may block
+        processed_event = await asyncio.get_running_loop().run_in_executor(None, process_event, event)
         return {
             "status": "success",
             "processed_event": processed_event
@@ -417,5 +1041,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=False,  # Set to True for development
-        log_level="info"
+        log_level="info",
+        # Let uvicorn's loggers propagate to the queue-backed root handler
+        log_config=None
     ) 
\ No newline at end of file
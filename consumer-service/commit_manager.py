@@ -0,0 +1,152 @@
+"""
+KafkaTrace offset commit manager
+
+At-least-once offset management without a blocking commit per message. The
+OffsetTracker knows the last fully processed offset of every partition; the
+commit manager coalesces those into commit_async calls that fire when enough
+records have completed or enough time has passed, whichever comes first.
+
+A synchronous commit is made when partitions are revoked in a rebalance (so the
+next owner starts right after our last processed record) and on shutdown.
+
+All methods run on the poll thread, which owns the KafkaConsumer.
+"""
+
+import functools
+import logging
+import time
+from typing import Dict, Optional, Set
+
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+from kafka.structs import OffsetAndMetadata, TopicPartition
+from prometheus_client import Counter, Gauge
+
+from parallel import OffsetTracker
+
+logger = logging.getLogger(__name__)
+
+OFFSET_COMMITS = Counter(
+    'consumer_offset_commits_total',
+    'Offset commits issued by the commit manager',
+    ['mode', 'status']
+)
+
+COMMITTED_OFFSET = Gauge(
+    'consumer_committed_offset',
+    'Last committed offset per partition',
+    ['topic', 'partition']
+)
+
+
+class CommitManager:
+    """Coalesces processed offsets into periodic async commits."""
+
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        tracker: OffsetTracker,
+        max_records: int = 5000,
+        interval_ms: int = 1000
+    ):
+        self.consumer = consumer
+        self.tracker = tracker
+        self.max_records = max_records
+        self.interval_ms = interval_ms
+
+        self._committed: Dict[TopicPartition, int] = {}
+        self._completed_at_commit = 0
+        self._next_commit = time.monotonic() + interval_ms / 1000
+
+    def maybe_commit(self):
+        """Commit asynchronously if the record-count or time bound was reached."""
+        completed = self.tracker.completed - self._completed_at_commit
+        if completed < self.max_records and time.monotonic() < self._next_commit:
+            return
+        self._commit(sync=False)
+
+    def commit_sync(
+        self,
+        partitions: Set[TopicPartition] = None,
+        limits: Optional[Dict[TopicPartition, int]] = None
+    ):
+        """
+        Commit processed offsets synchronously (rebalance and shutdown).
+
+        limits caps the committed offset of a partition, e.g. at its first
+        record that was polled but never processed.
+        """
+        self._commit(sync=True, partitions=partitions, limits=limits)
+
+    def forget(self, partitions: Set[TopicPartition]):
+        """Drop commit state for partitions that were revoked."""
+        self.tracker.forget(partitions)
+        for tp in partitions:
+            self._committed.pop(tp, None)
+
+    def listener(self) -> ConsumerRebalanceListener:
+        return _CommitOnRevoke(self)
+
+    def status(self) -> Dict[str, int]:
+        return {f"{tp.topic}-{tp.partition}": offset for tp, offset in self._committed.items()}
+
+    def _commit(
+        self,
+        sync: bool,
+        partitions: Set[TopicPartition] = None,
+        limits: Optional[Dict[TopicPartition, int]] = None
+    ):
+        self._completed_at_commit = self.tracker.completed
+        self._next_commit = time.monotonic() + self.interval_ms / 1000
+
+        # Never commit partitions we no longer own: that would rewind the new owner
+        owned = partitions if partitions is not None else self.consumer.assignment()
+        offsets = {}
+        for tp, offset in self.tracker.snapshot().items():
+            next_offset = offset + 1
+            if limits and tp in limits:
+                next_offset = min(next_offset, limits[tp])
+            if tp in owned and self._committed.get(tp) != next_offset:
+                offsets[tp] = OffsetAndMetadata(next_offset, None)
+        if not offsets:
+            return
+
+        mode = "sync" if sync else "async"
+        if sync:
+            try:
+                self.consumer.commit(offsets)
+            except Exception as e:
+                OFFSET_COMMITS.labels(mode=mode, status="error").inc()
+                logger.error(f"Synchronous offset commit failed: {e}")
+                return
+            self._on_committed(mode, offsets, None)
+            logger.info(f"Committed offsets for {len(offsets)} partitions")
+        else:
+            self.consumer.commit_async(offsets, callback=functools.partial(self._on_committed, mode))
+
+    def _on_committed(self, mode: str, offsets: Dict[TopicPartition, OffsetAndMetadata], response):
+        if isinstance(response, Exception):
+            # Leave _committed untouched so the next round retries these offsets
+            OFFSET_COMMITS.labels(mode=mode, status="error").inc()
+            logger.error(f"Asynchronous offset commit failed: {response}")
+            return
+        OFFSET_COMMITS.labels(mode=mode, status="success").inc()
+        for tp, meta in offsets.items():
+            self._committed[tp] = meta.offset
+            COMMITTED_OFFSET.labels(topic=tp.topic, partition=tp.partition).set(meta.offset)
+
+
+class _CommitOnRevoke(ConsumerRebalanceListener):
+    """Commits synchronously before partitions move to another consumer."""
+
+    def __init__(self, manager: CommitManager):
+        self.manager = manager
+
+    def on_partitions_revoked(self, revoked):
+        revoked = set(revoked)
+        if revoked:
+            self.manager.commit_sync(revoked)
+        self.manager.forget(revoked)
+        logger.info(f"Partitions revoked: {sorted(str(tp) for tp in revoked)}")
+
+    def on_partitions_assigned(self, assigned):
+        logger.info(f"Partitions assigned: {sorted(str(tp) for tp in assigned)}")
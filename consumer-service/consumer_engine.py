@@ -0,0 +1,228 @@
+"""
+KafkaTrace consumer polling engine
+
+kafka-python's KafkaConsumer is a blocking, non-thread-safe client. The engine
+gives it a dedicated thread that owns every call into the consumer (poll,
+commit, close) and hands polled records to the event loop through a bounded
+asyncio queue, so the HTTP surface stays responsive while the consumer waits on
+the broker. A full queue blocks the poll thread, which is the backpressure.
+
+Records are handed off in batches of up to batch_size, or whatever arrived
+within max_wait_ms of the batch's first record.
+
+Offsets are committed through a CommitManager, which the poll thread drives
+between polls because only it may call into the consumer. For the same reason
+the poll thread periodically snapshots the consumer's positions for the lag
+sampler; once fetched, positions are in-memory lookups. An optional RetryGate
+filters each poll so retry-topic records are only handed off once due.
+
+Shutdown is cooperative: stop() lets the current poll return (polls are short),
+the event loop drains what was already handed off and calls finish(), and the
+poll thread makes a final synchronous commit of the processed offsets. Records
+that were polled but never processed (a batch dropped because the queue was
+full at stop, batches left queued when the processing task ended early) have
+their partitions sought back to the first of them, so a restart redelivers them.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from kafka import KafkaConsumer
+from kafka.consumer.fetcher import ConsumerRecord
+from kafka.structs import TopicPartition
+
+from commit_manager import CommitManager
+from retry import RetryGate
+
+logger = logging.getLogger(__name__)
+
+
+class PollingEngine:
+    """Runs KafkaConsumer.poll on its own thread and feeds record batches to asyncio."""
+
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        commits: CommitManager,
+        queue_size: int = 8,
+        poll_timeout_ms: int = 200,
+        batch_size: int = 500,
+        max_wait_ms: int = 100,
+        positions_interval_ms: int = 1000,
+        gate: Optional[RetryGate] = None
+    ):
+        self.consumer = consumer
+        self.commits = commits
+        self.queue_size = queue_size
+        self.poll_timeout_ms = poll_timeout_ms
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.positions_interval_ms = positions_interval_ms
+        self.gate = gate
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._drained = threading.Event()
+        self._leftover: List[List[ConsumerRecord]] = []
+        self._positions: Dict[TopicPartition, int] = {}
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start the poll thread. Must be called from the event loop."""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping.clear()
+        self._drained.clear()
+        self._leftover = []
+        self.thread = threading.Thread(target=self._run, name="kafka-poll", daemon=True)
+        self.thread.start()
+        logger.info("Polling engine started")
+
+    def stop(self):
+        """Ask the poll thread to stop after its current poll."""
+        self._stopping.set()
+
+    async def join(self):
+        """Wait for the poll thread to finish its final commit and exit."""
+        if self.thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.thread.join)
+            self.thread = None
+            logger.info("Polling engine stopped")
+
+    async def next_batch(self) -> Optional[List[ConsumerRecord]]:
+        """Return the next batch of polled records, or None once the engine stopped."""
+        return await self.queue.get()
+
+    def positions(self) -> Dict[TopicPartition, int]:
+        """Latest snapshot of the consumer's position per assigned partition."""
+        return self._positions
+
+    def finish(self):
+        """
+        Signal that everything handed off has been processed (event loop side).
+
+        Batches still queued (the processing task ended early) are given back
+        to the poll thread, which waits for this before its final commit.
+        """
+        while not self.queue.empty():
+            batch = self.queue.get_nowait()
+            if batch is not None:
+                self._leftover.append(batch)
+        self._drained.set()
+
+    def _run(self):
+        batch: List[ConsumerRecord] = []
+        dropped: List[List[ConsumerRecord]] = []
+        deadline = 0.0
+        next_positions = 0.0
+        try:
+            while not self._stopping.is_set():
+                self.commits.maybe_commit()
+                if time.monotonic() >= next_positions:
+                    self._refresh_positions()
+                    next_positions = time.monotonic() + self.positions_interval_ms / 1000
+                if self.gate is not None:
+                    self.gate.resume_due()
+                # Wait at most until the open batch's deadline, so a partial batch
+                # is handed off after max_wait_ms even on a quiet topic
+                timeout_ms = self.poll_timeout_ms
+                if batch:
+                    timeout_ms = max(0, min(timeout_ms, int((deadline - time.monotonic()) * 1000)))
+                polled = self.consumer.poll(
+                    timeout_ms=timeout_ms,
+                    max_records=self.batch_size - len(batch)
+                )
+                if polled and self.gate is not None:
+                    polled = self.gate.admit(polled)
+                if polled:
+                    if not batch:
+                        deadline = time.monotonic() + self.max_wait_ms / 1000
+                    for records in polled.values():
+                        batch.extend(records)
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    if not self._hand_off(batch):
+                        dropped.append(batch)
+                        batch = []
+                        break
+                    batch = []
+        except Exception as e:
+            logger.error(f"Unexpected error in poll thread: {e}")
+        finally:
+            if batch and not self._hand_off(batch, force=True):
+                dropped.append(batch)
+            self._hand_off(None, force=True)
+            self._drained.wait()
+            # The final commit must not pass a record that was never processed
+            rewind = self._unprocessed(dropped + self._leftover)
+            self.commits.commit_sync(limits=rewind)
+            self._seek_back(rewind)
+
+    def _refresh_positions(self):
+        positions = {}
+        for tp in self.consumer.assignment():
+            try:
+                positions[tp] = self.consumer.position(tp)
+            except Exception as e:
+                logger.debug(f"No position yet for {tp}: {e}")
+        self._positions = positions
+
+    def _unprocessed(self, batches: List[List[ConsumerRecord]]) -> Dict[TopicPartition, int]:
+        """First unprocessed offset per partition: tracked but not completed, or never handed off."""
+        first = self.commits.tracker.first_pending()
+        for records in batches:
+            for record in records:
+                tp = TopicPartition(record.topic, record.partition)
+                if record.offset < first.get(tp, record.offset + 1):
+                    first[tp] = record.offset
+        return first
+
+    def _seek_back(self, rewind: Dict[TopicPartition, int]):
+        """Seek partitions to their first unprocessed offset, so a restart redelivers from there."""
+        if not rewind:
+            return
+        assigned = self.consumer.assignment()
+        for tp, offset in rewind.items():
+            if tp not in assigned:
+                continue
+            try:
+                self.consumer.seek(tp, offset)
+            except Exception as e:
+                logger.error(f"Failed to seek {tp} back to {offset}: {e}")
+        # The records are polled and tracked again after a restart
+        self.commits.forget(set(rewind))
+        logger.info(f"Rewound {len(rewind)} partitions to their first unprocessed record")
+
+    async def _put(self, batch: Optional[List[ConsumerRecord]]) -> bool:
+        # Runs on the event loop, like finish(): once that ran nothing reads the queue
+        if self._drained.is_set():
+            return False
+        await self.queue.put(batch)
+        return not self._drained.is_set()
+
+    def _hand_off(self, batch: Optional[List[ConsumerRecord]], force: bool = False) -> bool:
+        """
+        Put a batch on the asyncio queue, blocking while it is full.
+
+        Returns False if the batch was not handed off: the engine was stopped
+        while waiting (unless force is set), or the event loop side already
+        finished. The caller seeks its partitions back.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._put(batch), self.loop)
+        while True:
+            try:
+                return future.result(timeout=self.poll_timeout_ms / 1000)
+            except concurrent.futures.TimeoutError:
+                # cancel() fails if the put just completed; the next wait returns its result
+                if self._stopping.is_set() and not force and future.cancel():
+                    return False
@@ -0,0 +1,285 @@
+"""
+KafkaTrace event deduplication
+
+Producer retries (acks="all", retries=3) and at-least-once redelivery after a
+rebalance or restart can hand the consumer the same event_id more than once.
+The DedupFilter remembers recently seen event_ids in a time-bucketed Bloom
+filter with a fixed memory budget:
+
+- the filter is split into `buckets` generations, each a bit array of the same
+  size; new ids are added to the current generation only;
+- a lookup probes every live generation, so an id is remembered for roughly
+  window_seconds;
+- the current generation rotates after window_seconds / buckets, or earlier
+  once it holds `capacity` ids (so a burst cannot push the false-positive rate
+  past its target); rotating clears the oldest generation.
+
+An id is only recorded once its record has been processed: seen() reserves a
+new id as in flight (so a copy arriving meanwhile is still dropped), add()
+records it after processing succeeds and release() drops the reservation.
+A record that failed, or was redelivered before it was processed (a restart,
+a seek-back), is therefore never mistaken for a duplicate of itself.
+
+A Bloom filter never misses a duplicate it still remembers but may report a
+new id as seen; the estimated false-positive rate is derived from the fill of
+each generation and exported as a gauge, together with the memory in use.
+Each lookup hashes the id once (blake2b) and derives its bit positions by
+double hashing; probes stop at the first unset bit.
+
+The filter can be snapshotted to a local file on shutdown and loaded on
+startup, so a restart does not start cold. Only a graceful shutdown writes the
+snapshot, when every id in the filter belongs to a processed and committed
+record; in-flight reservations are not saved.
+
+Not thread-safe: check and snapshot from the event loop.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import struct
+import time
+from typing import Any, Dict, List, Set
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_EVENTS = Counter(
+    'consumer_duplicate_events_total',
+    'Records dropped because their event_id was already seen',
+    ['topic']
+)
+
+DEDUP_FALSE_POSITIVE_RATE = Gauge(
+    'consumer_dedup_false_positive_rate',
+    'Estimated probability that a new event_id is reported as a duplicate'
+)
+
+DEDUP_MEMORY_BYTES = Gauge(
+    'consumer_dedup_memory_bytes',
+    'Memory held by the deduplication filter bit arrays'
+)
+
+DEDUP_FILL_RATIO = Gauge(
+    'consumer_dedup_fill_ratio',
+    'Fraction of bits set in the current deduplication generation'
+)
+
+_SNAPSHOT_MAGIC = b"KTDD"
+_SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sHQHHdI")  # magic, version, bits, hashes, buckets, rotate_seconds, current
+_GENERATION = struct.Struct("<dQQ")  # started_at, count, set_bits
+
+
+class _Generation:
+    __slots__ = ("bits", "started_at", "count", "set_bits")
+
+    def __init__(self, size_bytes: int, started_at: float):
+        self.bits = bytearray(size_bytes)
+        self.started_at = started_at
+        self.count = 0
+        self.set_bits = 0
+
+    def reset(self, started_at: float):
+        self.bits[:] = bytes(len(self.bits))
+        self.started_at = started_at
+        self.count = 0
+        self.set_bits = 0
+
+
+class DedupFilter:
+    """
+    Time-bucketed Bloom filter of recently seen event ids.
+
+    memory_bytes is split evenly across the generations (each rounded down to a
+    power-of-two number of bits); capacity is the number of ids a generation
+    takes before rotating early, and with the bit count sets the number of
+    hash functions (capped at max_hashes to bound the per-event cost).
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = 16 * 1024 * 1024,
+        window_seconds: float = 600,
+        buckets: int = 4,
+        capacity: int = 1_000_000,
+        max_hashes: int = 8
+    ):
+        if buckets < 2:
+            raise ValueError("buckets must be at least 2")
+        per_generation_bits = 1 << max(6, (memory_bytes * 8 // buckets).bit_length() - 1)
+        self.num_bits = per_generation_bits
+        self.capacity = capacity
+        self.hashes = max(1, min(max_hashes, round(per_generation_bits / capacity * math.log(2))))
+        self.rotate_seconds = window_seconds / buckets
+        self.window_seconds = window_seconds
+
+        now = time.time()
+        self._mask = per_generation_bits - 1
+        self._generations = [_Generation(per_generation_bits // 8, now) for _ in range(buckets)]
+        self._current = 0
+        self._in_flight: Set[str] = set()
+        self.checked = 0
+        self.duplicates = 0
+
+        DEDUP_MEMORY_BYTES.set(self.memory_bytes)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._generations) * self.num_bits // 8
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def seen(self, event_id: Any) -> bool:
+        """
+        Return True if event_id is in flight or was (probably) processed within
+        the window, else reserve it as in flight.
+        """
+        key = str(event_id)
+        self.checked += 1
+        if key in self._in_flight:
+            self.duplicates += 1
+            return True
+        positions = self._positions(key)
+        for generation in self._generations:
+            bits = generation.bits
+            for p in positions:
+                if not bits[p >> 3] & (1 << (p & 7)):
+                    break
+            else:
+                self.duplicates += 1
+                return True
+        self._in_flight.add(key)
+        return False
+
+    def add(self, event_id: Any):
+        """Record event_id once its record has been processed."""
+        now = time.time()
+        current = self._generations[self._current]
+        if now - current.started_at >= self.rotate_seconds or current.count >= self.capacity:
+            current = self._rotate(now)
+
+        bits = current.bits
+        positions = self._positions(str(event_id))
+        for p in positions:
+            byte = p >> 3
+            flag = 1 << (p & 7)
+            if not bits[byte] & flag:
+                bits[byte] |= flag
+                current.set_bits += 1
+        current.count += 1
+
+    def release(self, event_id: Any):
+        """Drop the in-flight reservation of event_id (processed or not)."""
+        self._in_flight.discard(str(event_id))
+
+    def release_all(self):
+        """Drop every reservation, e.g. when records that were never processed will be redelivered."""
+        self._in_flight.clear()
+
+    def false_positive_rate(self) -> float:
+        """Estimated chance that a new id matches at least one live generation."""
+        miss_all = 1.0
+        for generation in self._generations:
+            miss_all *= 1.0 - (generation.set_bits / self.num_bits) ** self.hashes
+        return 1.0 - miss_all
+
+    def refresh_metrics(self):
+        DEDUP_FALSE_POSITIVE_RATE.set(self.false_positive_rate())
+        DEDUP_FILL_RATIO.set(self._generations[self._current].set_bits / self.num_bits)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "in_flight": len(self._in_flight),
+            "window_seconds": self.window_seconds,
+            "generations": len(self._generations),
+            "bits_per_generation": self.num_bits,
+            "hashes": self.hashes,
+            "capacity_per_generation": self.capacity,
+            "ids_per_generation": [g.count for g in self._generations],
+            "false_positive_rate": self.false_positive_rate(),
+            "memory_bytes": self.memory_bytes
+        }
+
+    def save(self, path: str):
+        """Write the filter to path atomically (temp file + rename)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(
+                _SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, self.num_bits, self.hashes,
+                len(self._generations), self.rotate_seconds, self._current
+            ))
+            for generation in self._generations:
+                f.write(_GENERATION.pack(generation.started_at, generation.count, generation.set_bits))
+                f.write(generation.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        logger.info(f"Dedup snapshot written: path={path}, ids={sum(g.count for g in self._generations)}")
+
+    def load(self, path: str) -> bool:
+        """
+        Restore generations from a snapshot written by save().
+
+        Returns False (and keeps the empty filter) if there is no snapshot or it
+        was written with a different layout; generations older than the window
+        are cleared on load.
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    raise ValueError("truncated header")
+                magic, version, num_bits, hashes, buckets, rotate_seconds, current = _HEADER.unpack(header)
+                if (magic, version) != (_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION):
+                    raise ValueError("not a dedup snapshot")
+                if (num_bits, hashes, buckets, rotate_seconds) != (
+                    self.num_bits, self.hashes, len(self._generations), self.rotate_seconds
+                ):
+                    logger.warning(f"Dedup snapshot {path} has a different layout, starting cold")
+                    return False
+                generations: List[_Generation] = []
+                for _ in range(buckets):
+                    started_at, count, set_bits = _GENERATION.unpack(f.read(_GENERATION.size))
+                    generation = _Generation(0, started_at)
+                    generation.bits = bytearray(f.read(num_bits // 8))
+                    if len(generation.bits) != num_bits // 8:
+                        raise ValueError("truncated generation")
+                    generation.count = count
+                    generation.set_bits = set_bits
+                    generations.append(generation)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Could not load dedup snapshot {path}: {e}")
+            return False
+
+        now = time.time()
+        for generation in generations:
+            if now - generation.started_at >= self.window_seconds:
+                generation.reset(now)
+        self._generations = generations
+        self._current = current % buckets
+        self.refresh_metrics()
+        logger.info(f"Dedup snapshot loaded: path={path}, ids={sum(g.count for g in generations)}")
+        return True
+
+    def _positions(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        mask = self._mask
+        return [(h1 + i * h2) & mask for i in range(self.hashes)]
+
+    def _rotate(self, now: float) -> _Generation:
+        self._current = (self._current + 1) % len(self._generations)
+        current = self._generations[self._current]
+        current.reset(now)
+        self.refresh_metrics()
+        return current
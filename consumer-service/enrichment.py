@@ -0,0 +1,311 @@
+"""
+KafkaTrace event enrichment
+
+Looks up reference data for consumed events (the user profile behind
+data.user_id, ...) without tying consumer throughput to the latency of the
+service that owns it:
+
+- a bounded TTL/LRU cache answers repeat keys locally; keys the backend does
+  not know are cached too, for a shorter negative TTL;
+- concurrent misses for the same key share one in-flight lookup
+  (single-flight), so a hot user_id is fetched once however many events or
+  callers ask for it at the same time;
+- the misses of a batch are fetched in bulk calls of up to max_batch_size keys,
+  and a batch waits at most `timeout` seconds: events whose lookup is not back
+  by then continue without the enrichment rather than stalling the consumer.
+
+Backends implement LookupBackend.lookup_many. InProcessUserDirectory is a
+local stand-in (synthetic profiles, configurable latency) for development,
+tests and benchmarks; HttpLookupBackend calls a bulk HTTP endpoint.
+
+On a LazyEvent the results go beside the payload (event.enrichment), so the
+record stays unmodified and is persisted or forwarded as its original bytes;
+a plain dict event gets them under event["enrichment"].
+
+Enrichers run on the event loop.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from lazy_record import LazyEvent
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+ENRICHMENT_LOOKUPS = Counter(
+    'enrichment_lookups_total',
+    'Enrichment key lookups (distinct keys per batch) by how they were answered',
+    ['enricher', 'result']  # hit, miss, coalesced, timeout, error
+)
+
+ENRICHMENT_CACHE_HIT_RATIO = Gauge(
+    'enrichment_cache_hit_ratio',
+    'Share of enrichment lookups answered from the cache since startup',
+    ['enricher']
+)
+
+ENRICHMENT_BACKEND_LATENCY = Histogram(
+    'enrichment_backend_latency_seconds',
+    'Latency of one bulk lookup against the enrichment backend',
+    ['enricher'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+ENRICHMENT_BACKEND_BATCH_SIZE = Histogram(
+    'enrichment_backend_batch_size',
+    'Keys per bulk lookup against the enrichment backend',
+    ['enricher'],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500)
+)
+
+_NOT_FOUND = object()
+
+
+class LookupBackend:
+    """Bulk key -> value lookups; keys missing from the result are unknown."""
+
+    name = "backend"
+
+    async def lookup_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessUserDirectory(LookupBackend):
+    """
+    Local stand-in for a user service: deterministic synthetic profiles.
+
+    latency_seconds is awaited once per bulk call, like a network round trip;
+    ids outside known_ids (when given) are reported as unknown.
+    """
+
+    name = "in-process"
+
+    def __init__(self, latency_seconds: float = 0.005, known_ids: Optional[range] = None):
+        self.latency_seconds = latency_seconds
+        self.known_ids = known_ids
+        self.calls = 0
+
+    async def lookup_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        profiles = {}
+        for key in keys:
+            try:
+                user_id = int(key)
+            except (TypeError, ValueError):
+                continue
+            if self.known_ids is not None and user_id not in self.known_ids:
+                continue
+            profiles[key] = {
+                "user_id": user_id,
+                "tier": ("free", "pro", "enterprise")[user_id % 3],
+                "region": ("us-east", "us-west", "eu-central", "ap-south")[user_id % 4],
+                "signup_year": 2015 + user_id % 10
+            }
+        return profiles
+
+
+class HttpLookupBackend(LookupBackend):
+    """GET {url}?ids=a,b,c answering a JSON object keyed by id."""
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        if httpx is None:
+            raise RuntimeError("httpx is required for HttpLookupBackend")
+        self.url = url
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def lookup_many(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        response = await self.client.get(self.url, params={"ids": ",".join(str(k) for k in keys)})
+        response.raise_for_status()
+        found = response.json()
+        # JSON object keys are strings; map them back to the keys we asked for
+        return {key: found[str(key)] for key in keys if str(key) in found}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class TTLCache:
+    """LRU-bounded cache whose entries also expire after their TTL."""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, now: float) -> Any:
+        """The cached value, or _NOT_FOUND if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _NOT_FOUND
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return _NOT_FOUND
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class Enricher:
+    """
+    Attaches backend data to events under their enrichment[target], keyed by key_of(event).
+
+    Events without a key, or whose lookup is unknown, failed or timed out, get
+    no entry; unknown keys are not looked up again until negative_ttl passes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        key_of: Callable[[Dict[str, Any]], Optional[Hashable]],
+        backend: LookupBackend,
+        target: str,
+        ttl: float = 300,
+        negative_ttl: float = 30,
+        max_entries: int = 100_000,
+        max_batch_size: int = 100,
+        timeout: float = 0.5
+    ):
+        self.name = name
+        self.key_of = key_of
+        self.backend = backend
+        self.target = target
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+
+        self.cache = TTLCache(max_entries)
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._fetches: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.requests = 0
+
+    async def enrich(self, events: Iterable[Dict[str, Any]]):
+        """Resolve the keys of a batch of events and attach what was found."""
+        now = time.monotonic()
+        resolved: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        misses: List[Hashable] = []
+        keyed = []
+        counts = {"hit": 0, "miss": 0, "coalesced": 0}
+
+        for event in events:
+            key = self.key_of(event)
+            if key is None or not isinstance(key, Hashable):
+                continue
+            keyed.append((event, key))
+            if key in resolved or key in waiting:
+                continue
+            value = self.cache.get(key, now)
+            if value is not _NOT_FOUND:
+                resolved[key] = value
+                counts["hit"] += 1
+                continue
+            future = self._in_flight.get(key)
+            if future is not None:
+                counts["coalesced"] += 1
+            else:
+                future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+                misses.append(key)
+                counts["miss"] += 1
+            waiting[key] = future
+
+        for start in range(0, len(misses), self.max_batch_size):
+            task = asyncio.create_task(self._fetch(misses[start:start + self.max_batch_size]))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+        if waiting:
+            done, pending = await asyncio.wait(waiting.values(), timeout=self.timeout)
+            for key, future in waiting.items():
+                if future in done and not future.exception():
+                    resolved[key] = future.result()
+            if pending:
+                ENRICHMENT_LOOKUPS.labels(enricher=self.name, result="timeout").inc(
+                    sum(1 for f in waiting.values() if f in pending)
+                )
+
+        for event, key in keyed:
+            value = resolved.get(key)
+            if value is not None:
+                _attach(event, self.target, value)
+
+        for result, count in counts.items():
+            if count:
+                ENRICHMENT_LOOKUPS.labels(enricher=self.name, result=result).inc(count)
+        self.hits += counts["hit"]
+        self.requests += sum(counts.values())
+        if self.requests:
+            ENRICHMENT_CACHE_HIT_RATIO.labels(enricher=self.name).set(self.hits / self.requests)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "cached_keys": len(self.cache),
+            "in_flight_keys": len(self._in_flight),
+            "lookups": self.requests,
+            "hit_ratio": self.hits / self.requests if self.requests else None
+        }
+
+    async def _fetch(self, keys: List[Hashable]):
+        """One bulk backend call; resolves the keys' shared futures either way."""
+        ENRICHMENT_BACKEND_BATCH_SIZE.labels(enricher=self.name).observe(len(keys))
+        start = time.perf_counter()
+        try:
+            found = await self.backend.lookup_many(keys)
+        except Exception as e:
+            ENRICHMENT_LOOKUPS.labels(enricher=self.name, result="error").inc(len(keys))
+            logger.warning(f"Enrichment lookup failed for {len(keys)} keys: {e}")
+            for key in keys:
+                future = self._in_flight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                    future.exception()  # mark retrieved: callers that timed out never will
+            return
+        finally:
+            ENRICHMENT_BACKEND_LATENCY.labels(enricher=self.name).observe(time.perf_counter() - start)
+
+        now = time.monotonic()
+        for key in keys:
+            value = found.get(key)
+            self.cache.put(key, value, now + (self.ttl if value is not None else self.negative_ttl))
+            future = self._in_flight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+
+def _attach(event: Any, target: str, value: Any):
+    if isinstance(event, LazyEvent):
+        if event.enrichment is None:
+            event.enrichment = {}
+        event.enrichment[target] = value
+        return
+    enrichment = event.get("enrichment")
+    if not isinstance(enrichment, dict):
+        enrichment = event["enrichment"] = {}
+    enrichment[target] = value
@@ -0,0 +1,225 @@
+"""
+KafkaTrace recent-event store
+
+Keeps the last max_events consumed events (and none older than max_age_seconds)
+in memory for incident debugging, with secondary indexes so lookups by
+event_id, user_id, event_type or time range never scan the whole store:
+
+- event_id -> record (hash);
+- user_id and event_type -> records in arrival order (deques);
+- record timestamp (per second) -> records (time-ordered buckets).
+
+Records are evicted in arrival order. The evicted record is the oldest entry
+of its user_id and event_type deques and of its time bucket, so every index
+pops it from the left in O(1) and never holds an evicted record. Records use
+__slots__ and keep the event as the record's raw bytes (with the serializer
+that reads them), decoded again only when a search returns it: an entry costs
+about its payload size plus a small fixed overhead, where the decoded dict
+cost several times that.
+
+Not thread-safe: add and search from the event loop.
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from lazy_record import LazyEvent
+from serialization import DEFAULT_SERIALIZER, Serializer, serializer_for_headers
+
+RECENT_EVENTS_STORED = Gauge(
+    'consumer_recent_events_stored',
+    'Events held in the recent-event store'
+)
+
+
+class StoredEvent:
+    __slots__ = ("event_id", "user_id", "event_type", "timestamp_ms", "added_at",
+                 "topic", "partition", "offset", "raw", "serializer")
+
+    def __init__(self, event: Any, topic: str, partition: int, offset: int,
+                 timestamp_ms: int, added_at: float):
+        data = event.get("data")
+        event_type = event.get("event_type")
+        self.event_id = _index_key(event.get("event_id"))
+        self.user_id = _index_key(data.get("user_id")) if isinstance(data, dict) else None
+        self.event_type = event_type if isinstance(event_type, str) else None
+        self.timestamp_ms = timestamp_ms
+        self.added_at = added_at
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.raw, self.serializer = _encoded(event)
+
+    @property
+    def event(self) -> Any:
+        return self.serializer.loads(self.raw)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "topic": self.topic,
+            "partition": self.partition,
+            "offset": self.offset,
+            "timestamp": self.timestamp_ms,
+            "event": self.event
+        }
+
+
+class RecentEventStore:
+    """Bounded store of recent events indexed by event_id, user_id, event_type and time."""
+
+    def __init__(self, max_events: int = 50_000, max_age_seconds: float = 900):
+        self.max_events = max_events
+        self.max_age_seconds = max_age_seconds
+
+        self._records: Deque[StoredEvent] = deque()
+        self._by_event_id: Dict[str, StoredEvent] = {}
+        self._by_user: Dict[str, Deque[StoredEvent]] = {}
+        self._by_type: Dict[Any, Deque[StoredEvent]] = {}
+        self._by_second: Dict[int, Deque[StoredEvent]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, event: Any, topic: str, partition: int, offset: int,
+            timestamp_ms: Optional[int] = None):
+        """Store an event: a decoded LazyEvent (its raw bytes are kept) or a dict."""
+        now = time.time()
+        if not timestamp_ms or timestamp_ms <= 0:
+            timestamp_ms = int(now * 1000)
+        record = StoredEvent(event, topic, partition, offset, timestamp_ms, now)
+
+        self._records.append(record)
+        if record.event_id is not None:
+            self._by_event_id[record.event_id] = record
+        if record.user_id is not None:
+            _append(self._by_user, record.user_id, record)
+        if record.event_type is not None:
+            _append(self._by_type, record.event_type, record)
+        _append(self._by_second, timestamp_ms // 1000, record)
+
+        while len(self._records) > self.max_events:
+            self._evict()
+        self._expire(now)
+
+    def refresh_metrics(self):
+        RECENT_EVENTS_STORED.set(len(self._records))
+
+    def search(
+        self,
+        event_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        limit: int = 100
+    ) -> List[StoredEvent]:
+        """
+        Events matching every given filter, newest first, at most `limit`.
+
+        The most selective index available drives the lookup; the remaining
+        filters are checked per candidate.
+        """
+        self._expire(time.time())
+        if event_id is not None:
+            event_id = str(event_id)
+            record = self._by_event_id.get(event_id)
+            candidates: Iterable[StoredEvent] = (record,) if record is not None else ()
+        elif user_id is not None:
+            user_id = str(user_id)
+            candidates = reversed(self._by_user.get(user_id, ()))
+        elif event_type is not None:
+            candidates = reversed(self._by_type.get(event_type, ()))
+        elif since_ms is not None or until_ms is not None:
+            candidates = self._time_range(since_ms, until_ms)
+        else:
+            candidates = reversed(self._records)
+
+        results = []
+        for record in candidates:
+            if event_id is not None and record.event_id != event_id:
+                continue
+            if user_id is not None and record.user_id != user_id:
+                continue
+            if event_type is not None and record.event_type != event_type:
+                continue
+            if since_ms is not None and record.timestamp_ms < since_ms:
+                continue
+            if until_ms is not None and record.timestamp_ms > until_ms:
+                continue
+            results.append(record)
+            if len(results) >= limit:
+                break
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "events": len(self._records),
+            "max_events": self.max_events,
+            "max_age_seconds": self.max_age_seconds,
+            "users": len(self._by_user),
+            "event_types": len(self._by_type),
+            "oldest_timestamp": min(self._by_second) * 1000 if self._by_second else None
+        }
+
+    def _time_range(self, since_ms: Optional[int], until_ms: Optional[int]) -> Iterable[StoredEvent]:
+        """Records in the per-second buckets the range touches, newest second first."""
+        if not self._by_second:
+            return
+        first = max(since_ms // 1000, min(self._by_second)) if since_ms is not None else min(self._by_second)
+        last = min(until_ms // 1000, max(self._by_second)) if until_ms is not None else max(self._by_second)
+        if last - first >= len(self._by_second):
+            seconds = sorted((s for s in self._by_second if first <= s <= last), reverse=True)
+        else:
+            seconds = range(last, first - 1, -1)
+        for second in seconds:
+            bucket = self._by_second.get(second)
+            if bucket:
+                yield from reversed(bucket)
+
+    def _expire(self, now: float):
+        horizon = now - self.max_age_seconds
+        while self._records and self._records[0].added_at < horizon:
+            self._evict()
+
+    def _evict(self):
+        record = self._records.popleft()
+        if record.event_id is not None and self._by_event_id.get(record.event_id) is record:
+            del self._by_event_id[record.event_id]
+        if record.user_id is not None:
+            _popleft(self._by_user, record.user_id)
+        if record.event_type is not None:
+            _popleft(self._by_type, record.event_type)
+        _popleft(self._by_second, record.timestamp_ms // 1000)
+
+
+def _encoded(event: Any) -> Tuple[bytes, Serializer]:
+    """An event's bytes and the serializer that reads them back."""
+    if isinstance(event, LazyEvent):
+        if not event.modified:
+            return event.raw, serializer_for_headers(event.headers)
+        event = event.body
+    return DEFAULT_SERIALIZER.dumps(event), DEFAULT_SERIALIZER
+
+
+def _index_key(value: Any) -> Optional[str]:
+    """Ids are indexed as strings, so user_id 1234 matches the query value "1234"."""
+    if isinstance(value, (str, int)):
+        return str(value)
+    return None
+
+
+def _append(index: Dict[Any, Deque[StoredEvent]], key: Any, record: StoredEvent):
+    records = index.get(key)
+    if records is None:
+        records = index[key] = deque()
+    records.append(record)
+
+
+def _popleft(index: Dict[Any, Deque[StoredEvent]], key: Any):
+    records = index[key]
+    records.popleft()
+    if not records:
+        del index[key]
@@ -0,0 +1,283 @@
+"""
+KafkaTrace event handler registry
+
+Event processing is a set of handlers registered per event_type, optionally
+narrowed by conditions on event fields (e.g. data.action). Registrations are
+compiled once into a dispatch table keyed by event_type, with equality
+conditions on a field turned into a dict lookup, so routing an event costs a
+few dict lookups however many handlers exist, instead of a growing if/elif
+chain. Events no handler wants are skipped without further work.
+
+A handler registered with batch=True receives every matching event of a
+processed batch in one call (a list), instead of one call per event.
+
+    registry = HandlerRegistry()
+
+    @registry.handler("user_action", where={"data.action": "purchase"})
+    def record_purchase(event): ...
+
+    @registry.handler("system_metric", batch=True)
+    def store_metrics(events): ...
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+_MISSING = object()
+
+Event = Dict[str, Any]
+Outcome = Union[List[Any], BaseException, None]
+
+
+class Registration:
+    """One registered handler and the conditions under which it runs."""
+
+    __slots__ = ("handler", "event_types", "where", "predicate", "batch", "order", "_checks")
+
+    def __init__(
+        self,
+        handler: Callable,
+        event_types: Tuple[str, ...],
+        where: Dict[str, frozenset],
+        predicate: Optional[Callable[[Event], bool]],
+        batch: bool,
+        order: int
+    ):
+        self.handler = handler
+        self.event_types = event_types
+        self.where = where
+        self.predicate = predicate
+        self.batch = batch
+        self.order = order
+        self._checks = tuple((_field_getter(path), accepted) for path, accepted in where.items())
+
+    @property
+    def name(self) -> str:
+        return getattr(self.handler, "__name__", repr(self.handler))
+
+    def matches(self, event: Event) -> bool:
+        for get, accepted in self._checks:
+            if get(event) not in accepted:
+                return False
+        return self.predicate is None or bool(self.predicate(event))
+
+
+class _Route:
+    """Compiled routing for one event_type."""
+
+    __slots__ = ("always", "indexed", "filtered")
+
+    def __init__(self):
+        self.always: Tuple[Registration, ...] = ()
+        # (field getter, {value: registrations}) for single-field equality conditions
+        self.indexed: List[Tuple[Callable[[Event], Any], Dict[Any, Tuple[Registration, ...]]]] = []
+        # Anything with several conditions or a predicate, checked one by one
+        self.filtered: Tuple[Registration, ...] = ()
+
+
+def _field_getter(path: str) -> Callable[[Event], Any]:
+    """Build a getter for a dotted field path (missing fields read as _MISSING)."""
+    keys = tuple(path.split("."))
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda event: event.get(key, _MISSING)
+
+    first, rest = keys[0], keys[1:]
+
+    def get(event: Event) -> Any:
+        value = event.get(first, _MISSING)
+        for key in rest:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+    return get
+
+
+class HandlerRegistry:
+    """Handlers by event_type and field conditions, compiled into a dispatch table."""
+
+    def __init__(self):
+        self._registrations: List[Registration] = []
+        self._table: Optional[Dict[str, _Route]] = None
+
+    def handler(
+        self,
+        *event_types: str,
+        where: Optional[Dict[str, Any]] = None,
+        predicate: Optional[Callable[[Event], bool]] = None,
+        batch: bool = False
+    ):
+        """
+        Decorator registering a handler for one or more event types.
+
+        where maps dotted field paths to a value (or a list/tuple/set of values)
+        the field must equal; predicate is an arbitrary check on the event.
+        A batch handler takes a list of events and may return one result per
+        event (a list of the same length) or a single result for all of them.
+        """
+        def decorator(fn: Callable) -> Callable:
+            self.register(fn, *event_types, where=where, predicate=predicate, batch=batch)
+            return fn
+        return decorator
+
+    def register(
+        self,
+        fn: Callable,
+        *event_types: str,
+        where: Optional[Dict[str, Any]] = None,
+        predicate: Optional[Callable[[Event], bool]] = None,
+        batch: bool = False
+    ) -> Registration:
+        if not event_types:
+            raise ValueError("A handler needs at least one event type")
+        conditions = {}
+        for path, accepted in (where or {}).items():
+            if not isinstance(accepted, (list, tuple, set, frozenset)):
+                accepted = (accepted,)
+            conditions[path] = frozenset(accepted)
+        registration = Registration(
+            fn, tuple(event_types), conditions, predicate, batch, len(self._registrations)
+        )
+        self._registrations.append(registration)
+        self._table = None
+        return registration
+
+    @property
+    def event_types(self) -> List[str]:
+        return sorted({t for r in self._registrations for t in r.event_types})
+
+    def compile(self) -> Dict[str, _Route]:
+        """Build the dispatch table; done lazily on first dispatch after a change."""
+        table: Dict[str, _Route] = {}
+        indexes: Dict[Tuple[str, str], Dict[Any, List[Registration]]] = {}
+        for registration in self._registrations:
+            for event_type in registration.event_types:
+                route = table.get(event_type)
+                if route is None:
+                    route = table[event_type] = _Route()
+                if not registration.where and registration.predicate is None:
+                    route.always += (registration,)
+                elif len(registration.where) == 1 and registration.predicate is None:
+                    (path, accepted), = registration.where.items()
+                    index = indexes.get((event_type, path))
+                    if index is None:
+                        index = indexes[(event_type, path)] = {}
+                        route.indexed.append((_field_getter(path), index))
+                    for value in accepted:
+                        index.setdefault(value, []).append(registration)
+                else:
+                    route.filtered += (registration,)
+        # Freeze the per-value lists so dispatch only reads tuples
+        for index in indexes.values():
+            for value, registrations in index.items():
+                index[value] = tuple(registrations)
+        self._table = table
+        return table
+
+    def route(self, event: Event) -> Tuple[Registration, ...]:
+        """Registrations that want this event, in registration order."""
+        table = self._table if self._table is not None else self.compile()
+        route = table.get(event.get("event_type"))
+        if route is None:
+            return ()
+        matched = route.always
+        groups = 1 if matched else 0
+        for get, index in route.indexed:
+            try:
+                hit = index.get(get(event))
+            except TypeError:
+                # Unhashable field value (a nested object or list) cannot match
+                continue
+            if hit:
+                matched += hit
+                groups += 1
+        for registration in route.filtered:
+            if registration.matches(event):
+                matched += (registration,)
+                groups += 1
+        if groups > 1:
+            matched = tuple(sorted(matched, key=lambda r: r.order))
+        return matched
+
+    def dispatch(self, event: Event) -> Outcome:
+        """Run the handlers for one event (batch handlers get a one-event list)."""
+        return self.dispatch_batch([event])[0]
+
+    def dispatch_batch(
+        self,
+        events: List[Event],
+        durations: Optional[List[float]] = None
+    ) -> List[Outcome]:
+        """
+        Run the handlers for a batch of events.
+
+        Returns one outcome per event: None if no handler wanted it, the
+        exception if a handler failed, otherwise the handlers' results in
+        order. Per-event handlers run first, then each batch handler once with
+        all of its events that have not failed. If durations is given, each
+        event's handling time is added to it (a batch call's time is split
+        evenly across its events).
+        """
+        outcomes: List[Outcome] = [None] * len(events)
+        pending: Dict[Registration, List[int]] = {}
+        clock = time.perf_counter
+
+        for i, event in enumerate(events):
+            registrations = self.route(event)
+            if not registrations:
+                continue
+            results: List[Any] = []
+            outcomes[i] = results
+            started = clock()
+            for registration in registrations:
+                if registration.batch:
+                    pending.setdefault(registration, []).append(i)
+                    continue
+                try:
+                    results.append(registration.handler(event))
+                except Exception as e:
+                    outcomes[i] = e
+                    break
+            if durations is not None:
+                durations[i] += clock() - started
+
+        for registration, indexes in pending.items():
+            live = [i for i in indexes if not isinstance(outcomes[i], BaseException)]
+            if not live:
+                continue
+            started = clock()
+            try:
+                returned = registration.handler([events[i] for i in live])
+            except Exception as e:
+                returned = [e] * len(live)
+            if durations is not None:
+                share = (clock() - started) / len(live)
+                for i in live:
+                    durations[i] += share
+            if not (isinstance(returned, list) and len(returned) == len(live)):
+                returned = [returned] * len(live)
+            for i, result in zip(live, returned):
+                if isinstance(outcomes[i], BaseException):
+                    continue
+                if isinstance(result, BaseException):
+                    outcomes[i] = result
+                else:
+                    outcomes[i].append(result)
+        return outcomes
+
+    def describe(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Registered handlers per event_type, for status endpoints."""
+        described: Dict[str, List[Dict[str, Any]]] = {}
+        for registration in self._registrations:
+            for event_type in registration.event_types:
+                described.setdefault(event_type, []).append({
+                    "handler": registration.name,
+                    "where": {path: sorted(map(str, values)) for path, values in registration.where.items()},
+                    "predicate": registration.predicate is not None,
+                    "batch": registration.batch
+                })
+        return described
+
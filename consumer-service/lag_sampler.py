@@ -0,0 +1,153 @@
+"""
+KafkaTrace consumer lag sampler
+
+Feeds the CONSUMER_LAG gauge (and the HighConsumerLag alert built on it). On a
+fixed interval a background thread fetches the log-end offsets of the assigned
+partitions and compares them with the consumer's positions.
+
+Retry topics are paused until their records are due, so their lag is expected
+and is exported on a separate gauge that the alert does not read.
+
+The broker round trips go through a separate, group-less KafkaConsumer owned by
+the sampler thread, so they never share the poll thread or the main client's
+connections and cannot slow down message throughput. Positions come from the
+polling engine, which snapshots them from memory between polls.
+"""
+
+import logging
+import threading
+import time
+from typing import AbstractSet, Any, Callable, Dict, Optional
+
+from kafka import KafkaConsumer
+from kafka.structs import TopicPartition
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+
+class LagSampler:
+    """Samples per-partition lag and catch-up rate on its own thread."""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], KafkaConsumer],
+        positions: Callable[[], Dict[TopicPartition, int]],
+        lag_gauge: Gauge,
+        interval_seconds: float = 10.0,
+        retry_topics: AbstractSet[str] = frozenset(),
+        retry_lag_gauge: Optional[Gauge] = None
+    ):
+        self.client_factory = client_factory
+        self.positions = positions
+        self.lag_gauge = lag_gauge
+        self.interval_seconds = interval_seconds
+        self.retry_topics = retry_topics
+        self.retry_lag_gauge = retry_lag_gauge
+
+        self.thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._client: Optional[KafkaConsumer] = None
+        self._snapshot: Dict[TopicPartition, Dict[str, Any]] = {}
+        self._sampled_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="lag-sampler", daemon=True)
+        self.thread.start()
+        logger.info(f"Lag sampler started (interval={self.interval_seconds}s)")
+
+    def stop(self):
+        """Stop sampling; the thread exits at its next wake-up."""
+        self._stopping.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def status(self) -> Dict[str, Any]:
+        """Per-partition lag and catch-up rate from the latest sample; total_lag excludes retry topics."""
+        snapshot = self._snapshot
+        return {
+            "sampled_at": self._sampled_at,
+            "total_lag": sum(p["lag"] for tp, p in snapshot.items() if tp.topic not in self.retry_topics),
+            "retry_lag": sum(p["lag"] for tp, p in snapshot.items() if tp.topic in self.retry_topics),
+            "partitions": {
+                f"{tp.topic}-{tp.partition}": {k: v for k, v in p.items() if k != "sampled_at"}
+                for tp, p in sorted(snapshot.items())
+            }
+        }
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                try:
+                    self._sample()
+                except Exception as e:
+                    logger.error(f"Lag sampling failed: {e}")
+                self._stopping.wait(self.interval_seconds)
+        finally:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            logger.info("Lag sampler stopped")
+
+    def _sample(self):
+        positions = self.positions()
+        previous = self._snapshot
+        now = time.monotonic()
+
+        if positions:
+            if self._client is None:
+                self._client = self.client_factory()
+            end_offsets = self._client.end_offsets(list(positions))
+        else:
+            end_offsets = {}
+
+        snapshot = {}
+        for tp, position in positions.items():
+            end_offset = end_offsets.get(tp)
+            if end_offset is None:
+                continue
+            lag = max(0, end_offset - position)
+            catch_up_rate = None
+            if tp in previous:
+                elapsed = now - previous[tp]["sampled_at"]
+                if elapsed > 0:
+                    # Positive while the consumer is gaining on the log end
+                    catch_up_rate = (previous[tp]["lag"] - lag) / elapsed
+            snapshot[tp] = {
+                "position": position,
+                "end_offset": end_offset,
+                "lag": lag,
+                "catch_up_rate": catch_up_rate,
+                "sampled_at": now
+            }
+            gauge = self._gauge_for(tp)
+            if gauge is not None:
+                gauge.labels(topic=tp.topic, partition=tp.partition).set(lag)
+
+        for tp in previous.keys() - snapshot.keys():
+            # Partition moved to another consumer: stop reporting a stale lag
+            gauge = self._gauge_for(tp)
+            if gauge is None:
+                continue
+            try:
+                gauge.remove(tp.topic, str(tp.partition))
+            except KeyError:
+                pass
+
+        self._snapshot = snapshot
+        self._sampled_at = time.time()
+
+    def _gauge_for(self, tp: TopicPartition) -> Optional[Gauge]:
+        if tp.topic in self.retry_topics:
+            return self.retry_lag_gauge
+        return self.lag_gauge
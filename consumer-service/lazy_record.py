@@ -0,0 +1,133 @@
+"""
+KafkaTrace lazy records
+
+LazyEvent wraps a consumed record's raw value and headers and only decodes the
+payload when something reads a field of the event body. The routing fields
+(event_type, event_id) are answered from the kt-event-type / kt-event-id
+headers the producer sets, without decoding; records without them are decoded.
+
+Records that are filtered out or routed by event_type alone are never decoded,
+and encode_event() re-emits the original bytes of an event that was not
+modified, instead of serializing it again. Only top-level assignments mark an
+event modified; code that changes a nested value must set `modified` itself.
+Enrichment is kept beside the payload, in `enrichment`, and is not part of the
+record's bytes, so enriching an event does not mark it modified.
+
+Like the dicts it replaces, a LazyEvent is not thread-safe.
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional
+
+from serialization import (
+    ROUTING_HEADERS,
+    Headers,
+    Serializer,
+    decode_value,
+    serializer_for_headers,
+)
+
+ROUTING_FIELDS = frozenset(ROUTING_HEADERS.values())
+
+_FIELD_HEADERS = {field: header for header, field in ROUTING_HEADERS.items()}
+
+
+class LazyEvent(MutableMapping):
+    """An event backed by its record's raw bytes, decoded on first body access."""
+
+    __slots__ = ("raw", "headers", "modified", "enrichment", "_body", "_routing")
+
+    def __init__(self, raw: bytes, headers: Headers = None):
+        self.raw = raw
+        self.headers = headers
+        self.modified = False
+        self.enrichment: Optional[Dict[str, Any]] = None
+        self._body: Any = None
+        self._routing: Optional[Dict[str, Optional[str]]] = None
+
+    @property
+    def decoded(self) -> bool:
+        return self._body is not None
+
+    @property
+    def body(self) -> Any:
+        """The decoded payload (decoded once, on first access)."""
+        body = self._body
+        if body is None:
+            body = self._body = decode_value(self.raw, self.headers)
+        return body
+
+    def routing(self, field: str) -> Any:
+        """A routing field, from the record headers when present."""
+        if self._body is None:
+            value = self._routing_field(field)
+            if value is not None:
+                return value
+        body = self.body
+        return body.get(field) if isinstance(body, dict) else None
+
+    def _routing_field(self, field: str) -> Optional[str]:
+        """The field's header value, or None when reading it needs a full decode."""
+        found = self._routing
+        if found is None:
+            found = self._routing = {}
+        elif field in found:
+            return found[field]
+        header = _FIELD_HEADERS[field]
+        value = None
+        for key, header_value in self.headers or ():
+            if key == header and header_value is not None:
+                value = header_value.decode("utf-8", "replace")
+                break
+        found[field] = value
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        body = self._body
+        if body is None:
+            if key in ROUTING_FIELDS:
+                value = self._routing_field(key)
+                if value is not None:
+                    return value
+            body = self.body
+        return body.get(key, default)
+
+    def __getitem__(self, key: Any) -> Any:
+        if self._body is None and key in ROUTING_FIELDS:
+            value = self._routing_field(key)
+            if value is not None:
+                return value
+        return self.body[key]
+
+    def __setitem__(self, key: Any, value: Any):
+        self.body[key] = value
+        self.modified = True
+
+    def __delitem__(self, key: Any):
+        del self.body[key]
+        self.modified = True
+
+    def __iter__(self) -> Iterator:
+        return iter(self.body)
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def __repr__(self) -> str:
+        if self._body is None:
+            return f"LazyEvent(<{len(self.raw)} bytes undecoded>)"
+        return f"LazyEvent({self._body!r})"
+
+
+def encode_event(event: Any, serializer: Serializer) -> bytes:
+    """
+    Bytes of an event in the serializer's format.
+
+    An unmodified LazyEvent whose record already has that format is re-emitted
+    as-is; anything else is serialized.
+    """
+    if isinstance(event, LazyEvent):
+        if not event.modified and serializer_for_headers(event.headers).content_type == serializer.content_type:
+            return event.raw
+        return serializer.dumps(event.body)
+    return serializer.dumps(event)
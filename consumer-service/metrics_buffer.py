@@ -0,0 +1,80 @@
+"""
+KafkaTrace metric buffering
+
+Shared by the producer and consumer services. prometheus_client resolves
+metric.labels(...) through a locked dict lookup on every call and takes a lock
+per observe(), which adds up when done per event. Two helpers keep that off
+the hot path without changing what /metrics exposes:
+
+- LabelCache binds a metric's label children once (optionally pre-binding the
+  known combinations, so their series exist at zero from startup) and hands
+  them out from a plain dict afterwards.
+- MetricBatch accumulates counter increments and histogram observations
+  locally and applies them in one pass on flush(): one inc() per label set,
+  and each observation through the child's public observe(), with the child
+  resolved once per label set.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+class LabelCache:
+    """Label children of one metric, keyed by their label values in order."""
+
+    def __init__(self, metric, prebind: Iterable[LabelValues] = ()):
+        self.metric = metric
+        self._children: Dict[LabelValues, object] = {}
+        for values in prebind:
+            self.get(values)
+
+    def get(self, values: LabelValues):
+        child = self._children.get(values)
+        if child is None:
+            # labels() returns the same child for the same values, so a race
+            # between two threads here is harmless
+            child = self._children[values] = self.metric.labels(*values)
+        return child
+
+
+class MetricBatch:
+    """
+    Local accumulator for counter increments and histogram observations.
+
+    Not thread-safe: use one per batch (or per thread), or only from the
+    event loop, and flush() it when the batch is done or on a timer.
+    """
+
+    def __init__(self):
+        self._counts: Dict[Tuple[LabelCache, LabelValues], float] = {}
+        self._observations: Dict[Tuple[LabelCache, LabelValues], List[float]] = {}
+
+    def inc(self, cache: LabelCache, values: LabelValues, amount: float = 1):
+        key = (cache, values)
+        self._counts[key] = self._counts.get(key, 0) + amount
+
+    def observe(self, cache: LabelCache, values: LabelValues, value: float):
+        key = (cache, values)
+        observations = self._observations.get(key)
+        if observations is None:
+            observations = self._observations[key] = []
+        observations.append(value)
+
+    def observe_many(self, cache: LabelCache, values: LabelValues, observed: Iterable[float]):
+        key = (cache, values)
+        observations = self._observations.get(key)
+        if observations is None:
+            observations = self._observations[key] = []
+        observations.extend(observed)
+
+    def flush(self):
+        """Apply everything accumulated so far to the collectors and reset."""
+        counts, self._counts = self._counts, {}
+        observations, self._observations = self._observations, {}
+        for (cache, values), amount in counts.items():
+            cache.get(values).inc(amount)
+        for (cache, values), observed in observations.items():
+            observe = cache.get(values).observe
+            for value in observed:
+                observe(value)
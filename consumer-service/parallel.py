@@ -0,0 +1,247 @@
+"""
+KafkaTrace key-ordered parallel processing
+
+Fans consumed records out over a worker pool while keeping per-key ordering.
+Records are routed to one of N lanes by an ordering key (the partition, the
+record key / event_id, or data.user_id); each lane processes its work in
+order on the thread pool, so different keys run concurrently and a given key
+is never processed out of order.
+
+Because lanes finish out of order, offsets are tracked per partition and only
+the highest offset below which everything is processed is ever committed.
+Records that fail are handed to an on_failure callback (the retry pipeline)
+before their offsets complete, so a failure is never committed past unrouted.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from kafka.consumer.fetcher import ConsumerRecord
+from kafka.structs import TopicPartition
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+PARTITION_IN_FLIGHT = Gauge(
+    'consumer_partition_in_flight',
+    'Records dispatched to the worker pool and not yet processed',
+    ['topic', 'partition']
+)
+
+LANE_QUEUE_DEPTH = Gauge(
+    'consumer_lane_queue_depth',
+    'Work chunks waiting in each ordered processing lane',
+    ['lane']
+)
+
+ORDERING_KEYS = ("partition", "event_id", "user_id")
+
+WorkItem = Tuple[ConsumerRecord, Dict[str, Any]]
+Failure = Tuple[ConsumerRecord, BaseException]
+
+
+class OffsetTracker:
+    """
+    Per-partition record of which dispatched offsets have completed.
+
+    Offsets are tracked in dispatch order; complete() advances the partition's
+    committable offset past every contiguous completed offset, so a slow record
+    holds back the commit point until it finishes. Records are tracked and
+    completed on the event loop while the poll thread snapshots and forgets
+    partitions, so state changes are guarded by a lock.
+    """
+
+    def __init__(self):
+        self._pending: Dict[TopicPartition, Deque[int]] = {}
+        self._completed: Dict[TopicPartition, Set[int]] = {}
+        self._safe: Dict[TopicPartition, int] = {}
+        self._lock = threading.Lock()
+        self.completed = 0  # total records completed, read by the commit manager
+
+    def track(self, records: List[ConsumerRecord]):
+        """Register records in the order they were polled."""
+        with self._lock:
+            for record in records:
+                tp = TopicPartition(record.topic, record.partition)
+                pending = self._pending.get(tp)
+                if pending is None:
+                    pending = self._pending[tp] = deque()
+                    self._completed[tp] = set()
+                pending.append(record.offset)
+
+    def complete(self, record: ConsumerRecord):
+        tp = TopicPartition(record.topic, record.partition)
+        with self._lock:
+            self.completed += 1
+            pending = self._pending.get(tp)
+            if pending is None:
+                # Partition was revoked while the record was in flight
+                return
+            completed = self._completed[tp]
+            completed.add(record.offset)
+            safe = None
+            while pending and pending[0] in completed:
+                safe = pending.popleft()
+                completed.discard(safe)
+            if safe is not None:
+                self._safe[tp] = safe
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(p) for p in self._pending.values())
+
+    def first_pending(self) -> Dict[TopicPartition, int]:
+        """Lowest tracked offset per partition that has not completed yet."""
+        with self._lock:
+            return {tp: pending[0] for tp, pending in self._pending.items() if pending}
+
+    def forget(self, partitions):
+        """Drop state for partitions that are no longer assigned."""
+        with self._lock:
+            for tp in partitions:
+                self._pending.pop(tp, None)
+                self._completed.pop(tp, None)
+                self._safe.pop(tp, None)
+
+    def snapshot(self) -> Dict[TopicPartition, int]:
+        """Last fully processed offset per partition (thread-safe copy)."""
+        with self._lock:
+            return dict(self._safe)
+
+
+class KeyOrderedExecutor:
+    """
+    Runs process_batch over key-ordered lanes on a thread pool.
+
+    process_batch(events) must return one result per event, the exception for
+    events that failed; it runs on a pool thread, as does on_failure(failures).
+    on_processed(items) gets the work items that processed without error, on
+    the loop; on_completed(items) then gets every item of the chunk, failed or
+    not. Completed records are reported to the OffsetTracker on the loop.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Dict[str, Any]]], List[Any]],
+        tracker: OffsetTracker,
+        concurrency: int = 4,
+        ordering_key: str = "partition",
+        lane_queue_size: int = 4,
+        on_failure: Optional[Callable[[List[Failure]], None]] = None,
+        on_processed: Optional[Callable[[List[WorkItem]], None]] = None,
+        on_completed: Optional[Callable[[List[WorkItem]], None]] = None
+    ):
+        if ordering_key not in ORDERING_KEYS:
+            raise ValueError(f"Unknown ordering key {ordering_key!r}, expected one of {ORDERING_KEYS}")
+        self.process_batch = process_batch
+        self.tracker = tracker
+        self.concurrency = concurrency
+        self.ordering_key = ordering_key
+        self.lane_queue_size = lane_queue_size
+        self.on_failure = on_failure
+        self.on_processed = on_processed
+        self.on_completed = on_completed
+
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.lanes: List[asyncio.Queue] = []
+        self.lane_tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="event-worker")
+        self.lanes = [asyncio.Queue(maxsize=self.lane_queue_size) for _ in range(self.concurrency)]
+        self.lane_tasks = [
+            asyncio.create_task(self._run_lane(i, lane)) for i, lane in enumerate(self.lanes)
+        ]
+        logger.info(f"Parallel executor started: lanes={self.concurrency}, ordering_key={self.ordering_key}")
+
+    async def dispatch(self, items: List[WorkItem]):
+        """
+        Split a batch across lanes by ordering key, preserving order within each lane.
+
+        Waits while a target lane is full, which backs pressure up to the poll thread.
+        """
+        chunks: Dict[int, List[WorkItem]] = {}
+        in_flight: Dict[Tuple[str, int], int] = {}
+        for item in items:
+            lane = hash(self._key(item)) % self.concurrency
+            chunks.setdefault(lane, []).append(item)
+            record = item[0]
+            key = (record.topic, record.partition)
+            in_flight[key] = in_flight.get(key, 0) + 1
+
+        for (topic, partition), count in in_flight.items():
+            PARTITION_IN_FLIGHT.labels(topic=topic, partition=partition).inc(count)
+        for lane, chunk in chunks.items():
+            await self.lanes[lane].put(chunk)
+            LANE_QUEUE_DEPTH.labels(lane=lane).set(self.lanes[lane].qsize())
+
+    async def drain(self):
+        """Wait until every dispatched chunk has been processed."""
+        for lane in self.lanes:
+            await lane.join()
+
+    async def stop(self):
+        await self.drain()
+        for task in self.lane_tasks:
+            task.cancel()
+        await asyncio.gather(*self.lane_tasks, return_exceptions=True)
+        self.lane_tasks = []
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def _key(self, item: WorkItem):
+        record, event = item
+        if self.ordering_key == "partition":
+            return record.partition
+        if self.ordering_key == "event_id":
+            return record.key if record.key is not None else event.get("event_id")
+        data = event.get("data")
+        return data.get("user_id") if isinstance(data, dict) else None
+
+    async def _run_lane(self, index: int, lane: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await lane.get()
+            try:
+                events = [event for _, event in chunk]
+                processed = []
+                try:
+                    results = await loop.run_in_executor(self.pool, self.process_batch, events)
+                    failures = []
+                    for item, result in zip(chunk, results):
+                        if isinstance(result, BaseException):
+                            failures.append((item[0], result))
+                        else:
+                            processed.append(item)
+                except Exception as e:
+                    logger.error(f"Error processing chunk in lane {index}: {e}")
+                    failures = [(record, e) for record, _ in chunk]
+                if processed and self.on_processed is not None:
+                    try:
+                        self.on_processed(processed)
+                    except Exception as e:
+                        logger.error(f"Error reporting processed records in lane {index}: {e}")
+                if failures and self.on_failure is not None:
+                    await loop.run_in_executor(self.pool, self.on_failure, failures)
+            except Exception as e:
+                logger.error(f"Error routing failed records in lane {index}: {e}")
+            finally:
+                if self.on_completed is not None:
+                    try:
+                        self.on_completed(chunk)
+                    except Exception as e:
+                        logger.error(f"Error reporting completed records in lane {index}: {e}")
+                in_flight: Dict[Tuple[str, int], int] = {}
+                for record, _ in chunk:
+                    self.tracker.complete(record)
+                    key = (record.topic, record.partition)
+                    in_flight[key] = in_flight.get(key, 0) + 1
+                for (topic, partition), count in in_flight.items():
+                    PARTITION_IN_FLIGHT.labels(topic=topic, partition=partition).dec(count)
+                LANE_QUEUE_DEPTH.labels(lane=index).set(lane.qsize())
+                lane.task_done()
@@ -0,0 +1,294 @@
+"""
+KafkaTrace processed-event persistence
+
+Processed events are written to a local SQLite database in WAL mode. Making
+every event durable on its own costs one fsync per event, so writes go through
+a GroupCommitWriter instead: callers on the worker lanes submit their rows and
+block, while a single writer thread gathers everything submitted into one
+transaction (one executemany, one fsync) once max_rows are waiting or max_wait_ms
+after the first of them arrived, whichever comes first. Rows submitted while a
+commit is in progress join the next group, so even with max_wait_ms=0 groups
+grow with the number of concurrent writers.
+
+A caller returns only once its rows are durable, and lanes complete offsets
+only after process_batch returns, so no offset is committed for an event that
+is not on disk yet. A failed commit raises in every caller of that group; the
+lanes then route those records to the retry pipeline.
+
+Rows are keyed by event_id and written with INSERT OR REPLACE, so records
+replayed after a restart or a retry overwrite their earlier row; events without
+an event_id get a row each. With a retention set, the writer thread deletes
+rows processed longer ago than that every prune_interval_seconds.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from lazy_record import encode_event
+from serialization import DEFAULT_SERIALIZER
+
+logger = logging.getLogger(__name__)
+
+PERSISTED_EVENTS = Counter(
+    'consumer_persisted_events_total',
+    'Processed events written by the persistence sink',
+    ['status']
+)
+
+PERSIST_GROUP_SIZE = Histogram(
+    'consumer_persist_group_size',
+    'Rows written per group commit',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+
+PERSIST_COMMIT_DURATION = Histogram(
+    'consumer_persist_commit_duration_seconds',
+    'Time to write and fsync one group commit',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# event_id, event_type, source, event_timestamp, processed_at, status, payload
+EventRow = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], float, str, bytes]
+
+
+def event_row(event: Dict[str, Any], status: str, processed_at: float) -> EventRow:
+    """Build the row persisted for a processed event (payload as JSON, the consumed bytes when unchanged)."""
+    event_id = event.get("event_id")
+    return (
+        str(event_id) if event_id is not None else None,
+        event.get("event_type"),
+        event.get("source"),
+        event.get("timestamp"),
+        processed_at,
+        status,
+        encode_event(event, DEFAULT_SERIALIZER)
+    )
+
+
+class SqliteEventStore:
+    """
+    processed_events table in a local SQLite database (WAL, synchronous=FULL).
+
+    The connection is opened by open() on the thread that writes, since
+    sqlite3 connections are bound to the thread that created them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # FULL fsyncs the WAL on every commit, which is what makes a group durable
+        self.connection.execute("PRAGMA synchronous=FULL")
+        # UNIQUE rather than PRIMARY KEY: rows without an event_id never conflict
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS processed_events ("
+            " event_id TEXT UNIQUE,"
+            " event_type TEXT,"
+            " source TEXT,"
+            " event_timestamp TEXT,"
+            " processed_at REAL NOT NULL,"
+            " status TEXT NOT NULL,"
+            " payload BLOB NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS processed_events_processed_at ON processed_events (processed_at)"
+        )
+
+    def write(self, rows: Sequence[EventRow]):
+        """Write rows in one transaction."""
+        connection = self.connection
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO processed_events VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def prune(self, processed_before: float) -> int:
+        """Delete rows processed before the given time; returns how many were deleted."""
+        return self.connection.execute(
+            "DELETE FROM processed_events WHERE processed_at < ?", (processed_before,)
+        ).rowcount
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM processed_events").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class GroupCommitWriter:
+    """
+    Coalesces rows submitted from many threads into group commits on one thread.
+
+    submit() returns a Future resolved once the rows are durable; write() blocks
+    on it. Submitting blocks while max_pending_rows are already waiting. Rows
+    older than retention_seconds (None keeps everything) are pruned between
+    group commits.
+    """
+
+    def __init__(
+        self,
+        store: SqliteEventStore,
+        max_rows: int = 2000,
+        max_wait_ms: int = 50,
+        max_pending_rows: int = 20000,
+        retention_seconds: Optional[float] = None,
+        prune_interval_seconds: float = 60
+    ):
+        self.store = store
+        self.max_rows = max_rows
+        self.max_wait_ms = max_wait_ms
+        self.max_pending_rows = max_pending_rows
+        self.retention_seconds = retention_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+
+        self._pending: List[Tuple[Sequence[EventRow], Future]] = []
+        self._pending_rows = 0
+        self._first_pending_at = 0.0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._opened = threading.Event()
+        self._open_error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+        self.rows_written = 0
+        self.rows_pruned = 0
+        self.commits = 0
+
+    def start(self):
+        self._stopping = False
+        self._opened.clear()
+        self._thread = threading.Thread(target=self._run, name="event-persist", daemon=True)
+        self._thread.start()
+        self._opened.wait()
+        if self._open_error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._open_error
+        logger.info(f"Persistence started: path={self.store.path}, max_rows={self.max_rows}")
+
+    def stop(self):
+        """Write everything still pending, then close the store."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info(f"Persistence stopped: rows_written={self.rows_written}, commits={self.commits}")
+
+    def submit(self, rows: Sequence[EventRow]) -> Future:
+        future: Future = Future()
+        if not rows:
+            future.set_result(None)
+            return future
+        with self._condition:
+            while self._pending_rows >= self.max_pending_rows and not self._stopping:
+                self._condition.wait()
+            if self._stopping:
+                raise RuntimeError("Persistence is stopping")
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append((rows, future))
+            self._pending_rows += len(rows)
+            self._condition.notify_all()
+        return future
+
+    def write(self, rows: Sequence[EventRow]):
+        """Block until rows are durable; raises if their group commit failed."""
+        self.submit(rows).result()
+
+    def status(self) -> Dict[str, Any]:
+        with self._condition:
+            pending = self._pending_rows
+        return {
+            "path": self.store.path,
+            "rows_written": self.rows_written,
+            "rows_pruned": self.rows_pruned,
+            "retention_seconds": self.retention_seconds,
+            "commits": self.commits,
+            "pending_rows": pending
+        }
+
+    def _take_group(self) -> List[Tuple[Sequence[EventRow], Future]]:
+        """Wait until a group is due (size or time bound) and take it."""
+        with self._condition:
+            while True:
+                if self._pending:
+                    if self._stopping or self._pending_rows >= self.max_rows:
+                        break
+                    remaining = self._first_pending_at + self.max_wait_ms / 1000 - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                elif self._stopping:
+                    return []
+                else:
+                    self._condition.wait()
+            group, self._pending = self._pending, []
+            self._pending_rows = 0
+            self._condition.notify_all()
+            return group
+
+    def _run(self):
+        try:
+            self.store.open()
+        except Exception as e:
+            self._open_error = e
+            return
+        finally:
+            self._opened.set()
+        pruned_at = 0.0
+        try:
+            while True:
+                group = self._take_group()
+                if not group:
+                    break
+                rows = [row for submitted, _ in group for row in submitted]
+                start = time.perf_counter()
+                try:
+                    self.store.write(rows)
+                except Exception as e:
+                    PERSISTED_EVENTS.labels(status="error").inc(len(rows))
+                    logger.error(f"Group commit of {len(rows)} rows failed: {e}")
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+                PERSIST_COMMIT_DURATION.observe(time.perf_counter() - start)
+                PERSIST_GROUP_SIZE.observe(len(rows))
+                PERSISTED_EVENTS.labels(status="success").inc(len(rows))
+                self.rows_written += len(rows)
+                self.commits += 1
+                for _, future in group:
+                    future.set_result(None)
+                if self.retention_seconds is not None:
+                    now = time.monotonic()
+                    if now - pruned_at >= self.prune_interval_seconds:
+                        pruned_at = now
+                        self._prune()
+        finally:
+            self.store.close()
+
+    def _prune(self):
+        try:
+            pruned = self.store.prune(time.time() - self.retention_seconds)
+        except Exception as e:
+            logger.error(f"Pruning processed events failed: {e}")
+            return
+        self.rows_pruned += pruned
+        if pruned:
+            logger.info(f"Pruned {pruned} processed events older than {self.retention_seconds}s")
@@ -0,0 +1,166 @@
+"""
+KafkaTrace dead-letter redrive
+
+Replays dead-lettered records back onto the topic they were first consumed
+from, once whatever made them fail has been fixed. A redrive runs on its own
+thread with its own consumer (a dedicated group, so its progress survives
+restarts) and is paced to a fixed rate so a large DLQ does not flood the
+pipeline. It stops at the end offsets seen when it started, so records that
+fail again during the redrive are not replayed in a loop.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.structs import OffsetAndMetadata, TopicPartition
+from prometheus_client import Counter
+
+from retry import ORIGINAL_TOPIC_HEADER, header_value, strip_pipeline_headers
+
+logger = logging.getLogger(__name__)
+
+DLQ_REDRIVEN = Counter(
+    'consumer_dlq_redriven_total',
+    'Dead-lettered records replayed by a redrive',
+    ['status']
+)
+
+
+class DlqRedriver:
+    """Rate-limited replay of the dead-letter topic, one redrive at a time."""
+
+    def __init__(
+        self,
+        consumer_factory: Callable[[], KafkaConsumer],
+        producer: KafkaProducer,
+        dlq_topic: str,
+        default_topic: str,
+        send_timeout: float = 10.0
+    ):
+        self.consumer_factory = consumer_factory
+        self.producer = producer
+        self.dlq_topic = dlq_topic
+        self.default_topic = default_topic
+        self.send_timeout = send_timeout
+
+        self.thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._status: Dict[str, Any] = {}
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, rate: float, max_messages: Optional[int] = None):
+        """Start a redrive at `rate` records/sec; raises RuntimeError if one is running."""
+        if self.running:
+            raise RuntimeError("A redrive is already running")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._stopping.clear()
+        self._status = {
+            "rate": rate,
+            "max_messages": max_messages,
+            "redriven": 0,
+            "failed": 0,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "last_error": None
+        }
+        self.thread = threading.Thread(
+            target=self._run, args=(rate, max_messages), name="dlq-redrive", daemon=True
+        )
+        self.thread.start()
+        logger.info(f"DLQ redrive started: rate={rate}/s, max_messages={max_messages}")
+
+    def stop(self):
+        self._stopping.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"running": self.running, **self._status}
+
+    def _run(self, rate: float, max_messages: Optional[int]):
+        consumer = None
+        try:
+            consumer = self.consumer_factory()
+            partitions = [
+                TopicPartition(self.dlq_topic, p)
+                for p in sorted(consumer.partitions_for_topic(self.dlq_topic) or ())
+            ]
+            consumer.assign(partitions)
+            end_offsets = consumer.end_offsets(partitions)
+            remaining = {tp for tp in partitions if consumer.position(tp) < end_offsets[tp]}
+
+            interval = 1.0 / rate
+            next_send = time.monotonic()
+            while remaining and not self._stopping.is_set():
+                if max_messages is not None and self._status["redriven"] >= max_messages:
+                    break
+                # Poll about a second's worth so offsets are committed regularly
+                polled = consumer.poll(timeout_ms=500, max_records=max(1, min(500, int(rate))))
+                sends: List[Tuple[TopicPartition, int, Any]] = []
+                for tp, records in polled.items():
+                    for record in records:
+                        if record.offset >= end_offsets[tp]:
+                            remaining.discard(tp)
+                            break
+                        if max_messages is not None and self._status["redriven"] + len(sends) >= max_messages:
+                            break
+                        delay = next_send - time.monotonic()
+                        if delay > 0 and self._stopping.wait(delay):
+                            break
+                        next_send = max(next_send + interval, time.monotonic() - 1.0)
+                        topic = header_value(record.headers, ORIGINAL_TOPIC_HEADER)
+                        sends.append((tp, record.offset, self.producer.send(
+                            topic.decode() if topic else self.default_topic,
+                            key=record.key,
+                            value=record.value,
+                            headers=strip_pipeline_headers(record.headers)
+                        )))
+                if not self._flush(consumer, sends):
+                    break
+                for tp in list(remaining):
+                    if consumer.position(tp) >= end_offsets[tp]:
+                        remaining.discard(tp)
+        except Exception as e:
+            self._status["last_error"] = str(e)
+            logger.error(f"DLQ redrive failed: {e}")
+        finally:
+            if consumer is not None:
+                consumer.close(autocommit=False)
+            self._status["finished_at"] = datetime.utcnow().isoformat()
+            logger.info(
+                f"DLQ redrive finished: redriven={self._status['redriven']}, "
+                f"failed={self._status['failed']}"
+            )
+
+    def _flush(self, consumer: KafkaConsumer, sends: List[Tuple[TopicPartition, int, Any]]) -> bool:
+        """Wait for replayed records and commit past them; False stops the redrive."""
+        commit: Dict[TopicPartition, OffsetAndMetadata] = {}
+        ok = True
+        for tp, offset, future in sends:
+            try:
+                future.get(timeout=self.send_timeout)
+            except Exception as e:
+                # Stop without committing past this record; it is replayed next time
+                self._status["failed"] += 1
+                self._status["last_error"] = str(e)
+                DLQ_REDRIVEN.labels(status="error").inc()
+                logger.error(f"Failed to redrive {tp.topic}-{tp.partition}@{offset}: {e}")
+                ok = False
+                break
+            self._status["redriven"] += 1
+            DLQ_REDRIVEN.labels(status="success").inc()
+            commit[tp] = OffsetAndMetadata(offset + 1, None)
+        if commit:
+            consumer.commit(commit)
+        return ok
@@ -0,0 +1,239 @@
+"""
+KafkaTrace retry topics and dead-letter queue
+
+A record that fails processing must neither be dropped nor retried in place,
+where a poison message would stall its partition. Failed records are instead
+republished to a chain of retry topics with increasing delays and, once every
+tier is exhausted, to a dead-letter topic. The original headers travel with the
+record, together with the failure reason and where it was first consumed from.
+Records that fail schema validation skip the retries: they go to a quarantine
+topic with the same headers.
+
+Retry topics are consumed by the same consumer as the main topic. Each retry
+record carries the time it becomes due; the RetryGate holds a retry partition
+back (seek + pause on the poll thread) until its head record is due, so only
+that retry partition waits and the main partitions keep flowing.
+"""
+
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.consumer.fetcher import ConsumerRecord
+from kafka.structs import TopicPartition
+from prometheus_client import Counter
+
+from structured_logging import EventLog
+
+logger = logging.getLogger(__name__)
+event_log = EventLog(logger)  # per-record routing lines, rate-limited per destination
+
+FAILED_EVENTS_ROUTED = Counter(
+    'consumer_failed_events_routed_total',
+    'Failed records republished to a retry tier or the dead-letter topic',
+    ['destination', 'status']
+)
+
+# Pipeline headers; every other header on the record is passed through untouched
+RETRY_COUNT_HEADER = "kt-retry-count"
+NOT_BEFORE_HEADER = "kt-not-before"  # epoch ms at which a retry record is due
+ERROR_HEADER = "kt-error"
+FAILED_AT_HEADER = "kt-failed-at"  # epoch ms of the latest failure
+ORIGINAL_TOPIC_HEADER = "kt-original-topic"
+ORIGINAL_PARTITION_HEADER = "kt-original-partition"
+ORIGINAL_OFFSET_HEADER = "kt-original-offset"
+
+PIPELINE_HEADERS = frozenset((
+    RETRY_COUNT_HEADER, NOT_BEFORE_HEADER, ERROR_HEADER, FAILED_AT_HEADER,
+    ORIGINAL_TOPIC_HEADER, ORIGINAL_PARTITION_HEADER, ORIGINAL_OFFSET_HEADER
+))
+
+MAX_ERROR_HEADER_BYTES = 1024
+
+Headers = List[Tuple[str, bytes]]
+
+
+class InvalidEvent(ValueError):
+    """An event that does not match its schema; retrying cannot fix it."""
+
+
+class RetryTier(NamedTuple):
+    topic: str
+    delay_seconds: float
+
+
+def header_value(headers: Optional[Headers], name: str) -> Optional[bytes]:
+    for key, value in headers or ():
+        if key == name:
+            return value
+    return None
+
+
+def retry_count(record: ConsumerRecord) -> int:
+    value = header_value(record.headers, RETRY_COUNT_HEADER)
+    return int(value) if value else 0
+
+
+def strip_pipeline_headers(headers: Optional[Headers]) -> Headers:
+    return [(k, v) for k, v in headers or () if k not in PIPELINE_HEADERS]
+
+
+class FailureRouter:
+    """
+    Republishes failed records to their next retry tier or the dead-letter topic.
+
+    route() blocks until the broker has acked every republished record, so the
+    caller only completes the original offsets once the failures are durable.
+    It runs on a worker thread (KafkaProducer is thread-safe).
+    """
+
+    def __init__(
+        self,
+        producer: KafkaProducer,
+        tiers: List[RetryTier],
+        dlq_topic: str,
+        quarantine_topic: Optional[str] = None,
+        send_timeout: float = 10.0
+    ):
+        self.producer = producer
+        self.tiers = tiers
+        self.dlq_topic = dlq_topic
+        self.quarantine_topic = quarantine_topic or dlq_topic
+        self.send_timeout = send_timeout
+        self.retry_topics: Set[str] = {tier.topic for tier in tiers}
+
+    def route(self, failures: List[Tuple[ConsumerRecord, BaseException]]):
+        """Send each failed record to the tier after the one it failed in."""
+        self._publish(failures)
+
+    def dead_letter(self, failures: List[Tuple[ConsumerRecord, BaseException]]):
+        """Send failed records straight to the DLQ (e.g. undecodable payloads)."""
+        self._publish(failures, self.dlq_topic)
+
+    def quarantine(self, failures: List[Tuple[ConsumerRecord, BaseException]]):
+        """Send records that failed validation to the quarantine topic."""
+        self._publish(failures, self.quarantine_topic)
+
+    def _publish(self, failures: List[Tuple[ConsumerRecord, BaseException]], topic: Optional[str] = None):
+        now_ms = int(time.time() * 1000)
+        sends = []
+        for record, error in failures:
+            attempt = retry_count(record)
+            if topic is not None:
+                destination, not_before = topic, None
+            elif attempt >= len(self.tiers):
+                destination, not_before = self.dlq_topic, None
+            else:
+                tier = self.tiers[attempt]
+                destination, not_before = tier.topic, now_ms + int(tier.delay_seconds * 1000)
+            headers = self._headers(record, error, attempt + 1, now_ms, not_before)
+            try:
+                future = self.producer.send(destination, key=record.key, value=record.value, headers=headers)
+            except Exception as e:
+                future = e
+            sends.append((record, destination, future))
+
+        for record, destination, future in sends:
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                future.get(timeout=self.send_timeout)
+            except Exception as e:
+                # Nothing left to fall back on: the record is lost, make it loud
+                FAILED_EVENTS_ROUTED.labels(destination=destination, status="error").inc()
+                event_log.error(
+                    ("route-failed", destination), "Failed to route record %s-%s@%s to %s: %s",
+                    record.topic, record.partition, record.offset, destination, e
+                )
+                continue
+            FAILED_EVENTS_ROUTED.labels(destination=destination, status="success").inc()
+            if destination == self.dlq_topic:
+                event_log.warning(
+                    "dead-lettered", "Record %s-%s@%s dead-lettered after %s retries",
+                    record.topic, record.partition, record.offset, retry_count(record)
+                )
+
+    def _headers(
+        self,
+        record: ConsumerRecord,
+        error: BaseException,
+        attempt: int,
+        now_ms: int,
+        not_before: Optional[int]
+    ) -> Headers:
+        headers = strip_pipeline_headers(record.headers)
+        # Keep where the record was first consumed from across retry hops
+        original = [
+            (name, header_value(record.headers, name))
+            for name in (ORIGINAL_TOPIC_HEADER, ORIGINAL_PARTITION_HEADER, ORIGINAL_OFFSET_HEADER)
+        ]
+        if original[0][1] is None:
+            original = [
+                (ORIGINAL_TOPIC_HEADER, record.topic.encode()),
+                (ORIGINAL_PARTITION_HEADER, str(record.partition).encode()),
+                (ORIGINAL_OFFSET_HEADER, str(record.offset).encode())
+            ]
+        headers.extend(original)
+        reason = f"{type(error).__name__}: {error}".encode("utf-8", "replace")
+        headers.append((ERROR_HEADER, reason[:MAX_ERROR_HEADER_BYTES]))
+        headers.append((FAILED_AT_HEADER, str(now_ms).encode()))
+        headers.append((RETRY_COUNT_HEADER, str(attempt).encode()))
+        if not_before is not None:
+            headers.append((NOT_BEFORE_HEADER, str(not_before).encode()))
+        return headers
+
+
+class RetryGate:
+    """
+    Holds retry-topic records back until they are due.
+
+    Records within a retry partition share one delay, so they become due in
+    offset order: when the head record is not due yet, the partition is rewound
+    to it and paused until then. Poll thread only.
+    """
+
+    def __init__(self, consumer: KafkaConsumer, retry_topics: Set[str]):
+        self.consumer = consumer
+        self.retry_topics = retry_topics
+        self._paused: Dict[TopicPartition, int] = {}
+
+    def admit(
+        self,
+        polled: Dict[TopicPartition, List[ConsumerRecord]]
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        """Drop records that are not due yet from a poll result, pausing their partitions."""
+        now_ms = int(time.time() * 1000)
+        for tp, records in polled.items():
+            if tp.topic not in self.retry_topics:
+                continue
+            for i, record in enumerate(records):
+                not_before = header_value(record.headers, NOT_BEFORE_HEADER)
+                if not_before and int(not_before) > now_ms:
+                    self.consumer.seek(tp, record.offset)
+                    self.consumer.pause(tp)
+                    self._paused[tp] = int(not_before)
+                    polled[tp] = records[:i]
+                    break
+        return polled
+
+    def resume_due(self):
+        """Resume paused retry partitions whose head record is now due."""
+        if not self._paused:
+            return
+        now_ms = int(time.time() * 1000)
+        assigned = self.consumer.assignment()
+        due = []
+        for tp, not_before in list(self._paused.items()):
+            if tp not in assigned:
+                # Revoked while paused; the new owner applies its own delay
+                del self._paused[tp]
+            elif not_before <= now_ms:
+                due.append(tp)
+                del self._paused[tp]
+        if due:
+            self.consumer.resume(*due)
+
+    def status(self) -> Dict[str, int]:
+        paused = dict(self._paused)  # read from the event loop while the poll thread updates it
+        return {f"{tp.topic}-{tp.partition}": not_before for tp, not_before in paused.items()}
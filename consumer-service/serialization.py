@@ -0,0 +1,150 @@
+"""
+KafkaTrace serializer registry
+
+Shared by the producer and consumer services so both sides agree on how event
+payloads are encoded. The wire format of every record is declared in a Kafka
+record header, which lets a consumer decode a topic that mixes formats while a
+rollout is in progress.
+
+Backends:
+- orjson (JSON, fastest; preferred when installed)
+- msgpack (binary, smallest payloads)
+- json (stdlib fallback, always available)
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Record header that carries the payload's content type
+FORMAT_HEADER = "kt-format"
+
+# Records produced before the header existed are plain JSON
+LEGACY_CONTENT_TYPE = "application/json"
+
+# Routing fields copied into headers, so consumers can route or filter a
+# record without decoding its payload
+EVENT_TYPE_HEADER = "kt-event-type"
+EVENT_ID_HEADER = "kt-event-id"
+ROUTING_HEADERS = {EVENT_TYPE_HEADER: "event_type", EVENT_ID_HEADER: "event_id"}
+
+Headers = Optional[List[Tuple[str, bytes]]]
+
+
+class Serializer:
+    """A named encode/decode pair plus the header value that identifies it."""
+
+    __slots__ = ("name", "content_type", "dumps", "loads", "header")
+
+    def __init__(
+        self,
+        name: str,
+        content_type: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any]
+    ):
+        self.name = name
+        self.content_type = content_type
+        self.dumps = dumps
+        self.loads = loads
+        self.header = (FORMAT_HEADER, content_type.encode("ascii"))
+
+    def __repr__(self) -> str:
+        return f"Serializer(name={self.name!r}, content_type={self.content_type!r})"
+
+
+SERIALIZERS: Dict[str, Serializer] = {}
+_DECODERS: Dict[bytes, Serializer] = {}
+
+
+def register_serializer(serializer: Serializer, preferred_decoder: bool = False) -> None:
+    """
+    Register a serializer by name.
+
+    The first serializer registered for a content type decodes records of that
+    type, unless a later one is registered with preferred_decoder=True.
+    """
+    SERIALIZERS[serializer.name] = serializer
+    content_type = serializer.header[1]
+    if preferred_decoder or content_type not in _DECODERS:
+        _DECODERS[content_type] = serializer
+
+
+def get_serializer(name: Optional[str] = None) -> Serializer:
+    """
+    Look up a serializer by name, falling back to the fastest JSON backend.
+
+    Unknown or uninstalled backends log a warning instead of failing startup.
+    """
+    if name is None:
+        return DEFAULT_SERIALIZER
+    serializer = SERIALIZERS.get(name)
+    if serializer is None:
+        logger.warning(f"Serializer {name!r} is not available, using {DEFAULT_SERIALIZER.name}")
+        return DEFAULT_SERIALIZER
+    return serializer
+
+
+def serializer_for_headers(headers: Headers) -> Serializer:
+    """Pick the decoder declared by a record's format header."""
+    if headers:
+        for key, value in headers:
+            if key == FORMAT_HEADER:
+                serializer = _DECODERS.get(value)
+                if serializer is None:
+                    raise ValueError(f"Unsupported payload format: {value!r}")
+                return serializer
+    return _DECODERS[LEGACY_CONTENT_TYPE.encode("ascii")]
+
+
+def decode_value(value: bytes, headers: Headers = None) -> Any:
+    """Decode a record value according to its format header."""
+    return serializer_for_headers(headers).loads(value)
+
+
+def routing_headers(event: Dict[str, Any]) -> List[Tuple[str, bytes]]:
+    """Headers carrying an event's string routing fields (see ROUTING_HEADERS)."""
+    headers = []
+    for header, field in ROUTING_HEADERS.items():
+        value = event.get(field)
+        if type(value) is str:
+            headers.append((header, value.encode("utf-8")))
+    return headers
+
+
+register_serializer(Serializer(
+    "json",
+    "application/json",
+    lambda v: json.dumps(v, separators=(",", ":")).encode("utf-8"),
+    lambda b: json.loads(b.decode("utf-8"))
+))
+
+if orjson is not None:
+    register_serializer(Serializer(
+        "orjson",
+        "application/json",
+        orjson.dumps,
+        orjson.loads
+    ), preferred_decoder=True)
+
+if msgpack is not None:
+    register_serializer(Serializer(
+        "msgpack",
+        "application/msgpack",
+        lambda v: msgpack.packb(v, use_bin_type=True),
+        lambda b: msgpack.unpackb(b, raw=False)
+    ))
+
+DEFAULT_SERIALIZER = SERIALIZERS["orjson"] if orjson is not None else SERIALIZERS["json"]
@@ -0,0 +1,178 @@
+"""
+KafkaTrace structured logging
+
+Shared by the producer and consumer services. Logging must stay cheap on the
+per-event hot path, so:
+
+- The root logger gets a QueueHandler; a QueueListener thread does all the
+  formatting and the write to stdout. The calling thread only enqueues the
+  LogRecord, and when the queue is full the record is dropped (and counted)
+  rather than blocking.
+- Messages use %-style arguments, which are merged on the listener thread, so
+  a record that is sampled out or dropped is never formatted at all.
+- EventLog wraps a logger for per-event lines: successes are sampled at a
+  configurable rate and errors are rate-limited per key, with the number of
+  suppressed lines reported on the next one emitted.
+
+Records are written as one JSON object per line (orjson when installed), with
+any `extra` fields included as top-level keys.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName"}
+
+_ERROR_KEYS_MAX = 1024  # distinct rate-limit keys tracked before resetting
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object."""
+
+    def __init__(self, service: Optional[str] = None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if self.service:
+            entry["service"] = self.service
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueues records untouched so all formatting happens on the listener thread.
+
+    The stock prepare() merges the message on the calling thread. Records are
+    passed in-process, so arguments are handed over as-is; callers must not
+    mutate them after logging.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    service: Optional[str] = None,
+    queue_size: int = 10000
+) -> QueueListener:
+    """
+    Route all logging through a bounded queue to a background writer thread.
+
+    Replaces any handlers on the root logger. The listener is stopped (and the
+    queue flushed) at interpreter exit.
+    """
+    formatter = JsonFormatter(service) if json_format else logging.Formatter(TEXT_FORMAT)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def dropped_records() -> int:
+    """Records dropped because the log queue was full."""
+    return sum(
+        handler.dropped for handler in logging.getLogger().handlers
+        if isinstance(handler, _NonBlockingQueueHandler)
+    )
+
+
+class EventLog:
+    """
+    Per-event log lines for a hot path.
+
+    success() emits roughly sample_rate of its calls (1.0 logs every one, 0
+    none). error() and warning() emit the first line per key in every
+    interval_seconds window and count the rest, so a burst of identical
+    failures costs one line per window. Safe to call from worker threads.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rate: float = 1.0, interval_seconds: float = 10.0):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        self._windows: Dict[Any, list] = {}  # key -> [window_start, suppressed]
+        self._lock = threading.Lock()
+
+    def success(self, msg: str, *args, **fields):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(msg, *args, extra=fields or None)
+
+    def error(self, key: Any, msg: str, *args, **fields):
+        self._limited(logging.ERROR, key, msg, args, fields)
+
+    def warning(self, key: Any, msg: str, *args, **fields):
+        self._limited(logging.WARNING, key, msg, args, fields)
+
+    def _limited(self, level: int, key: Any, msg: str, args: tuple, fields: Dict[str, Any]):
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] < self.interval_seconds:
+                window[1] += 1
+                return
+            suppressed = window[1] if window is not None else 0
+            if len(self._windows) >= _ERROR_KEYS_MAX:
+                self._windows.clear()
+            self._windows[key] = [now, 0]
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.logger.log(level, msg, *args, extra=fields or None)
@@ -0,0 +1,64 @@
+import time
+
+import aggregation
+from aggregation import WindowAggregator
+
+
+class FakeChild:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeMetric:
+    def __init__(self):
+        self.children = {}
+        self.labels_calls = 0
+
+    def labels(self, *values, **labels):
+        self.labels_calls += 1
+        return self.children.setdefault(values or tuple(labels.values()), FakeChild())
+
+
+def make_aggregator(**kwargs):
+    return WindowAggregator(
+        {"event_type": lambda event: event.get("event_type")},
+        lambda event: event.get("data", {}).get("user_id"),
+        **kwargs
+    )
+
+
+def test_dropped_counter_children_are_bound_once(monkeypatch):
+    dropped, keys = FakeMetric(), FakeMetric()
+    monkeypatch.setattr(aggregation, "AGGREGATION_DROPPED", dropped)
+    monkeypatch.setattr(aggregation, "AGGREGATION_KEYS", keys)
+    aggregator = make_aggregator(max_keys=1)
+    bound = dropped.labels_calls
+    now_ms = int(time.time() * 1000)
+
+    for i in range(50):
+        aggregator.observe({"event_type": "user_action", "data": {"user_id": i}}, now_ms)
+        aggregator.observe({"event_type": f"other-{i}", "data": {"user_id": i}}, now_ms)
+        aggregator.observe({"event_type": "user_action", "data": {"user_id": i}}, now_ms - 7200 * 1000)
+
+    assert dropped.labels_calls == bound
+    assert dropped.children[("event_type", "key_limit")].value == 50
+    assert dropped.children[("event_type", "late")].value == 50
+    assert keys.children[("event_type",)].value == 1
+
+
+def test_sliding_counts_and_distinct_users():
+    aggregator = make_aggregator()
+    now_ms = int(time.time() * 1000)
+    for i in range(30):
+        aggregator.observe({"event_type": "user_action", "data": {"user_id": i % 10}}, now_ms)
+
+    window = aggregator.sliding("event_type", 60)["user_action"]
+
+    assert window["count"] == 30
+    assert window["distinct_users"] == 10
@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+from kafka.structs import TopicPartition
+
+from commit_manager import CommitManager
+from parallel import OffsetTracker
+
+Record = namedtuple("Record", ["topic", "partition", "offset"])
+
+TP0 = TopicPartition("events", 0)
+TP1 = TopicPartition("events", 1)
+
+
+class FakeConsumer:
+    def __init__(self, assigned):
+        self.assigned = set(assigned)
+        self.commits = []
+
+    def assignment(self):
+        return set(self.assigned)
+
+    def commit(self, offsets):
+        self.commits.append({tp: meta.offset for tp, meta in offsets.items()})
+
+    def commit_async(self, offsets, callback=None):
+        self.commit(offsets)
+        if callback is not None:
+            callback(offsets, None)
+
+
+def processed(tracker, tp, offsets):
+    records = [Record(tp.topic, tp.partition, offset) for offset in offsets]
+    tracker.track(records)
+    for record in records:
+        tracker.complete(record)
+
+
+def test_commits_next_offset_after_last_processed():
+    tracker = OffsetTracker()
+    consumer = FakeConsumer([TP0, TP1])
+    processed(tracker, TP0, range(10))
+    processed(tracker, TP1, range(3))
+
+    CommitManager(consumer, tracker).commit_sync()
+
+    assert consumer.commits == [{TP0: 10, TP1: 3}]
+
+
+def test_commit_holds_back_at_unfinished_record():
+    tracker = OffsetTracker()
+    consumer = FakeConsumer([TP0])
+    records = [Record(TP0.topic, TP0.partition, offset) for offset in range(10)]
+    tracker.track(records)
+    for record in records[:4] + records[5:]:
+        tracker.complete(record)
+
+    CommitManager(consumer, tracker).commit_sync()
+
+    assert consumer.commits == [{TP0: 4}]
+    assert tracker.first_pending() == {TP0: 4}
+
+
+def test_final_commit_never_passes_first_undelivered_offset():
+    tracker = OffsetTracker()
+    consumer = FakeConsumer([TP0, TP1])
+    processed(tracker, TP0, range(10))
+    processed(tracker, TP1, range(10))
+
+    CommitManager(consumer, tracker).commit_sync(limits={TP0: 6, TP1: 12})
+
+    assert consumer.commits == [{TP0: 6, TP1: 10}]
+
+
+def test_commit_skips_partitions_not_owned():
+    tracker = OffsetTracker()
+    consumer = FakeConsumer([TP0])
+    processed(tracker, TP0, range(2))
+    processed(tracker, TP1, range(2))
+    manager = CommitManager(consumer, tracker)
+
+    manager.commit_sync()
+    manager.commit_sync()  # nothing new to commit
+
+    assert consumer.commits == [{TP0: 2}]
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from kafka.structs import TopicPartition
+
+from commit_manager import CommitManager
+from consumer_engine import PollingEngine
+from parallel import OffsetTracker
+
+Record = namedtuple("Record", ["topic", "partition", "offset", "key", "value", "headers"])
+
+TP = TopicPartition("events", 0)
+
+
+class FakeConsumer:
+    """One partition of `size` records; poll reads from the position and advances it."""
+
+    def __init__(self, size):
+        self.log = [Record(TP.topic, TP.partition, offset, None, b"{}", []) for offset in range(size)]
+        self.offset = 0
+        self.committed = None
+
+    def assignment(self):
+        return {TP}
+
+    def position(self, tp):
+        return self.offset
+
+    def seek(self, tp, offset):
+        self.offset = offset
+
+    def poll(self, timeout_ms=0, max_records=None):
+        records = self.log[self.offset:self.offset + max_records]
+        if not records:
+            time.sleep(timeout_ms / 1000)
+            return {}
+        self.offset = records[-1].offset + 1
+        return {TP: records}
+
+    def commit(self, offsets):
+        self.committed = offsets[TP].offset
+
+    def commit_async(self, offsets, callback=None):
+        self.commit(offsets)
+        if callback is not None:
+            callback(offsets, None)
+
+
+def make_engine(consumer, tracker):
+    return PollingEngine(
+        consumer, CommitManager(consumer, tracker), queue_size=1, poll_timeout_ms=20, batch_size=10, max_wait_ms=0
+    )
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+async def fill_queue(engine, consumer):
+    # One batch queued, the next one polled and blocked on the full queue
+    engine.start()
+    await wait_for(lambda: engine.queue.full() and consumer.offset >= 20)
+
+
+def test_stop_with_full_queue_redelivers_dropped_batch_after_restart():
+    consumer = FakeConsumer(100)
+    tracker = OffsetTracker()
+    engine = make_engine(consumer, tracker)
+
+    async def run():
+        await fill_queue(engine, consumer)
+        engine.stop()
+        await asyncio.sleep(0.2)  # several poll timeouts: the blocked hand-off gives up
+        batch = await engine.next_batch()
+        tracker.track(batch)
+        for record in batch:
+            tracker.complete(record)
+        assert await engine.next_batch() is None
+        engine.finish()
+        await engine.join()
+
+        assert [r.offset for r in batch] == list(range(10))
+        assert consumer.committed == 10
+        assert consumer.offset == 10  # the dropped batch starts here
+
+        engine.start()
+        redelivered = await engine.next_batch()
+        engine.stop()
+        engine.finish()
+        await engine.join()
+        return redelivered
+
+    assert asyncio.run(run())[0].offset == 10
+
+
+def test_processing_task_ending_early_rewinds_queued_and_unfinished_records():
+    consumer = FakeConsumer(100)
+    tracker = OffsetTracker()
+    engine = make_engine(consumer, tracker)
+
+    async def run():
+        await fill_queue(engine, consumer)
+        # The task processed nothing and ended without stop(): the poll thread
+        # must not stay blocked on a queue nobody reads
+        engine.finish()
+        await asyncio.wait_for(engine.join(), timeout=5)
+
+    asyncio.run(run())
+    assert not engine.running
+    assert consumer.offset == 0
+    assert consumer.committed is None
+
+
+def test_tracked_but_unfinished_records_are_rewound():
+    consumer = FakeConsumer(100)
+    tracker = OffsetTracker()
+    engine = make_engine(consumer, tracker)
+
+    async def run():
+        await fill_queue(engine, consumer)
+        batch = await engine.next_batch()
+        tracker.track(batch)
+        for record in batch[:4]:
+            tracker.complete(record)
+        engine.stop()
+        engine.finish()
+        await engine.join()
+
+    asyncio.run(run())
+    assert consumer.committed == 4
+    assert consumer.offset == 4
@@ -0,0 +1,49 @@
+from dedup import DedupFilter
+
+
+def make_filter():
+    return DedupFilter(memory_bytes=64 * 1024, capacity=1000)
+
+
+def test_copy_arriving_while_the_first_is_in_flight_is_a_duplicate():
+    dedup = make_filter()
+
+    assert not dedup.seen("evt-1")
+    assert dedup.seen("evt-1")
+    assert dedup.in_flight == 1
+
+
+def test_processed_ids_are_remembered_after_release():
+    dedup = make_filter()
+    dedup.seen("evt-1")
+
+    dedup.add("evt-1")
+    dedup.release("evt-1")
+
+    assert dedup.in_flight == 0
+    assert dedup.seen("evt-1")
+
+
+def test_redelivery_of_an_unprocessed_record_is_not_dropped():
+    dedup = make_filter()
+    dedup.seen("evt-1")
+
+    dedup.release("evt-1")  # failed, or dispatched but lost to a seek-back
+
+    assert not dedup.seen("evt-1")
+
+
+def test_snapshot_holds_only_processed_ids(tmp_path):
+    path = str(tmp_path / "dedup.snapshot")
+    dedup = make_filter()
+    dedup.seen("processed")
+    dedup.add("processed")
+    dedup.release("processed")
+    dedup.seen("in-flight")
+    dedup.save(path)
+
+    restored = make_filter()
+    assert restored.load(path)
+
+    assert restored.seen("processed")
+    assert not restored.seen("in-flight")
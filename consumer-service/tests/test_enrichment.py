@@ -0,0 +1,149 @@
+import asyncio
+
+from enrichment import _NOT_FOUND, Enricher, InProcessUserDirectory, LookupBackend, TTLCache
+from lazy_record import LazyEvent, encode_event
+from serialization import DEFAULT_SERIALIZER
+
+
+def user_event(user_id):
+    return {"event_type": "user_action", "data": {"user_id": user_id}}
+
+
+def make_enricher(backend, **kwargs):
+    return Enricher("user", lambda event: event["data"].get("user_id"), backend, target="user", **kwargs)
+
+
+class RecordingDirectory(InProcessUserDirectory):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    async def lookup_many(self, keys):
+        self.batches.append(list(keys))
+        return await super().lookup_many(keys)
+
+
+class FailingBackend(LookupBackend):
+    async def lookup_many(self, keys):
+        raise ConnectionError("user service unavailable")
+
+
+def test_hits_and_misses_are_counted():
+    backend = InProcessUserDirectory(latency_seconds=0)
+    enricher = make_enricher(backend)
+
+    async def run():
+        first = [user_event(1), user_event(2), user_event(1)]
+        await enricher.enrich(first)
+        second = [user_event(1), user_event(2), user_event(3)]
+        await enricher.enrich(second)
+        return first + second
+
+    events = asyncio.run(run())
+
+    assert backend.calls == 2
+    assert enricher.hits == 2  # 1 and 2 in the second batch
+    assert enricher.requests == 5  # distinct keys per batch: 2 + 3
+    assert all(event["enrichment"]["user"]["user_id"] == event["data"]["user_id"] for event in events)
+
+
+def test_concurrent_lookups_for_one_key_share_one_backend_call():
+    backend = InProcessUserDirectory(latency_seconds=0.05)
+    enricher = make_enricher(backend)
+    events = [user_event(7) for _ in range(20)]
+
+    async def run():
+        await asyncio.gather(*(enricher.enrich([event]) for event in events))
+
+    asyncio.run(run())
+
+    assert backend.calls == 1
+    assert all(event["enrichment"]["user"]["user_id"] == 7 for event in events)
+
+
+def test_misses_are_fetched_in_batches_of_max_batch_size():
+    backend = RecordingDirectory(latency_seconds=0)
+    enricher = make_enricher(backend, max_batch_size=4)
+
+    asyncio.run(enricher.enrich([user_event(i) for i in range(10)]))
+
+    assert [len(keys) for keys in backend.batches] == [4, 4, 2]
+    assert sorted(key for keys in backend.batches for key in keys) == list(range(10))
+
+
+def test_entries_expire_after_ttl():
+    backend = InProcessUserDirectory(latency_seconds=0)
+    enricher = make_enricher(backend, ttl=0.05)
+
+    async def run():
+        await enricher.enrich([user_event(1)])
+        await enricher.enrich([user_event(1)])
+        assert backend.calls == 1
+        await asyncio.sleep(0.1)
+        await enricher.enrich([user_event(1)])
+
+    asyncio.run(run())
+
+    assert backend.calls == 2
+
+
+def test_unknown_keys_use_negative_ttl():
+    backend = InProcessUserDirectory(latency_seconds=0, known_ids=range(10))
+    enricher = make_enricher(backend, negative_ttl=60)
+    unknown = user_event(99)
+
+    async def run():
+        await enricher.enrich([unknown])
+        await enricher.enrich([user_event(99)])
+
+    asyncio.run(run())
+
+    assert backend.calls == 1
+    assert "enrichment" not in unknown
+
+
+def test_ttl_cache_expiry_and_lru_bound():
+    cache = TTLCache(max_entries=2)
+    cache.put("a", 1, expires_at=10)
+    cache.put("b", 2, expires_at=20)
+
+    assert cache.get("a", now=5) == 1
+    cache.put("c", 3, expires_at=20)  # evicts b, the least recently used
+
+    assert cache.get("b", now=5) is _NOT_FOUND
+    assert cache.get("a", now=10) is _NOT_FOUND  # expired
+    assert cache.get("c", now=10) == 3
+    assert len(cache) == 1
+
+
+def test_enriched_lazy_event_keeps_its_original_bytes():
+    raw = DEFAULT_SERIALIZER.dumps(user_event(1))
+    event = LazyEvent(raw, [DEFAULT_SERIALIZER.header])
+    enricher = make_enricher(InProcessUserDirectory(latency_seconds=0))
+
+    asyncio.run(enricher.enrich([event]))
+
+    assert event.enrichment["user"]["user_id"] == 1
+    assert not event.modified
+    assert encode_event(event, DEFAULT_SERIALIZER) is raw
+
+
+def test_timed_out_lookup_leaves_event_unenriched():
+    backend = InProcessUserDirectory(latency_seconds=1.0)
+    enricher = make_enricher(backend, timeout=0.01)
+    event = user_event(1)
+
+    asyncio.run(enricher.enrich([event]))
+
+    assert "enrichment" not in event
+    assert event["data"] == {"user_id": 1}
+
+
+def test_failed_lookup_leaves_event_unenriched():
+    enricher = make_enricher(FailingBackend())
+    event = user_event(1)
+
+    asyncio.run(enricher.enrich([event]))
+
+    assert "enrichment" not in event
+    assert enricher.status()["in_flight_keys"] == 0
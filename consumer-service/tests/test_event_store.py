@@ -0,0 +1,81 @@
+from event_store import RecentEventStore
+from lazy_record import LazyEvent
+from serialization import DEFAULT_SERIALIZER
+
+BASE_MS = 1_700_000_000_000
+
+
+def make_event(i, event_type="user_action"):
+    return {"event_id": f"evt-{i}", "event_type": event_type, "data": {"user_id": 1000 + i % 3}}
+
+
+def lazy(event):
+    record = LazyEvent(DEFAULT_SERIALIZER.dumps(event), [DEFAULT_SERIALIZER.header])
+    record.body
+    return record
+
+
+def fill(store, n, per_second=4):
+    for i in range(n):
+        store.add(lazy(make_event(i)), "events", 0, i, BASE_MS + (i // per_second) * 1000)
+
+
+def test_stores_raw_bytes_and_decodes_on_search():
+    store = RecentEventStore(max_events=10)
+    event = lazy(make_event(1))
+    store.add(event, "events", 0, 1, BASE_MS)
+
+    record, = store.search(event_id="evt-1")
+
+    assert record.raw is event.raw
+    assert record.to_dict()["event"] == make_event(1)
+
+
+def test_modified_event_is_stored_as_modified():
+    store = RecentEventStore(max_events=10)
+    event = lazy(make_event(1))
+    event["enrichment"] = {"user": {"tier": "pro"}}
+    store.add(event, "events", 0, 1, BASE_MS)
+
+    assert store.search(event_id="evt-1")[0].event["enrichment"] == {"user": {"tier": "pro"}}
+
+
+def test_plain_dicts_are_accepted():
+    store = RecentEventStore(max_events=10)
+    store.add(make_event(1), "events", 0, 1, BASE_MS)
+
+    assert store.search(user_id="1001")[0].event == make_event(1)
+
+
+def test_eviction_prunes_every_index():
+    store = RecentEventStore(max_events=10)
+    fill(store, 25)
+
+    assert len(store) == 10
+    assert sum(len(bucket) for bucket in store._by_second.values()) == 10
+    assert min(store._by_second) == BASE_MS // 1000 + 15 // 4  # event 15 is the oldest kept
+    assert sum(len(records) for records in store._by_user.values()) == 10
+    assert sum(len(records) for records in store._by_type.values()) == 10
+    assert len(store._by_event_id) == 10
+
+
+def test_search_filters_and_orders_newest_first():
+    store = RecentEventStore(max_events=100)
+    fill(store, 20)
+
+    by_user = store.search(user_id="1000")
+    assert [r.offset for r in by_user] == [18, 15, 12, 9, 6, 3, 0]
+
+    in_range = store.search(since_ms=BASE_MS + 1000, until_ms=BASE_MS + 2999)
+    assert [r.offset for r in in_range] == list(range(11, 3, -1))
+
+    assert [r.offset for r in store.search(limit=3)] == [19, 18, 17]
+    assert store.search(event_id="evt-99") == []
+
+
+def test_unhashable_fields_are_not_indexed():
+    store = RecentEventStore(max_events=10)
+    store.add({"event_id": ["x"], "event_type": {"a": 1}, "data": {"user_id": [1]}}, "events", 0, 0, BASE_MS)
+
+    assert len(store) == 1
+    assert store.status()["event_types"] == 0
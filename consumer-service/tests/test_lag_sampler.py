@@ -0,0 +1,34 @@
+from kafka.structs import TopicPartition
+from prometheus_client import CollectorRegistry, Gauge
+
+from lag_sampler import LagSampler
+
+
+class EndOffsetsClient:
+    def __init__(self, end_offsets):
+        self._end_offsets = end_offsets
+
+    def end_offsets(self, partitions):
+        return {tp: self._end_offsets[tp] for tp in partitions}
+
+
+def test_retry_topic_lag_is_kept_out_of_consumer_lag():
+    registry = CollectorRegistry()
+    lag = Gauge("consumer_lag", "", ["topic", "partition"], registry=registry)
+    retry_lag = Gauge("consumer_retry_lag", "", ["topic", "partition"], registry=registry)
+    events, retry = TopicPartition("events", 0), TopicPartition("events.retry.1m", 0)
+    sampler = LagSampler(
+        lambda: EndOffsetsClient({events: 120, retry: 5000}),
+        lambda: {events: 100, retry: 0},
+        lag,
+        retry_topics={"events.retry.1m"},
+        retry_lag_gauge=retry_lag
+    )
+
+    sampler._sample()
+
+    assert registry.get_sample_value("consumer_lag", {"topic": "events", "partition": "0"}) == 20
+    assert registry.get_sample_value("consumer_lag", {"topic": "events.retry.1m", "partition": "0"}) is None
+    assert registry.get_sample_value("consumer_retry_lag", {"topic": "events.retry.1m", "partition": "0"}) == 5000
+    assert sampler.status()["total_lag"] == 20
+    assert sampler.status()["retry_lag"] == 5000
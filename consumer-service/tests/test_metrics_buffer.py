@@ -0,0 +1,55 @@
+from metrics_buffer import LabelCache, MetricBatch
+
+
+class FakeChild:
+    def __init__(self):
+        self.total = 0
+        self.observed = []
+
+    def inc(self, amount=1):
+        self.total += amount
+
+    def observe(self, value):
+        self.observed.append(value)
+
+
+class FakeMetric:
+    def __init__(self):
+        self.children = {}
+        self.labels_calls = 0
+
+    def labels(self, *values):
+        self.labels_calls += 1
+        return self.children.setdefault(values, FakeChild())
+
+
+def test_label_cache_resolves_each_child_once():
+    metric = FakeMetric()
+    cache = LabelCache(metric, prebind=[("a",)])
+
+    assert cache.get(("a",)) is cache.get(("a",))
+    cache.get(("b",))
+
+    assert metric.labels_calls == 2
+
+
+def test_flush_applies_counts_and_observations_through_public_api():
+    counter, histogram = FakeMetric(), FakeMetric()
+    counts, observations = LabelCache(counter), LabelCache(histogram)
+    batch = MetricBatch()
+
+    batch.inc(counts, ("events", "success"))
+    batch.inc(counts, ("events", "success"), 2)
+    batch.inc(counts, ("events", "error"))
+    batch.observe(observations, ("events",), 0.5)
+    batch.observe_many(observations, ("events",), [1.0, 2.0])
+    assert counter.children == {}
+
+    batch.flush()
+
+    assert counter.children[("events", "success")].total == 3
+    assert counter.children[("events", "error")].total == 1
+    assert histogram.children[("events",)].observed == [0.5, 1.0, 2.0]
+
+    batch.flush()  # nothing accumulated since
+    assert counter.children[("events", "success")].total == 3
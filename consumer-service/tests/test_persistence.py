@@ -0,0 +1,41 @@
+import time
+
+from persistence import GroupCommitWriter, SqliteEventStore, event_row
+
+
+def rows(path):
+    store = SqliteEventStore(path)
+    store.open()
+    try:
+        return store.connection.execute(
+            "SELECT event_id, status FROM processed_events ORDER BY rowid"
+        ).fetchall()
+    finally:
+        store.close()
+
+
+def test_events_without_an_event_id_get_a_row_each(tmp_path):
+    path = str(tmp_path / "events.db")
+    writer = GroupCommitWriter(SqliteEventStore(path), max_wait_ms=0)
+    writer.start()
+    now = time.time()
+    writer.write([event_row({"event_type": "user_action"}, "success", now) for _ in range(2)])
+    writer.write([event_row({"event_id": "evt-1"}, "skipped", now)])
+    writer.write([event_row({"event_id": "evt-1"}, "success", now)])
+    writer.stop()
+
+    assert rows(path) == [(None, "success"), (None, "success"), ("evt-1", "success")]
+
+
+def test_rows_older_than_the_retention_are_pruned(tmp_path):
+    path = str(tmp_path / "events.db")
+    writer = GroupCommitWriter(
+        SqliteEventStore(path), max_wait_ms=0, retention_seconds=3600, prune_interval_seconds=0
+    )
+    writer.start()
+    writer.write([event_row({"event_id": "old"}, "success", time.time() - 7200)])
+    writer.write([event_row({"event_id": "new"}, "success", time.time())])
+    writer.stop()
+
+    assert rows(path) == [("new", "success")]
+    assert writer.rows_pruned == 1
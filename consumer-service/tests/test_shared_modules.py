@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PRODUCER_DIR = os.path.join(SERVICE_DIR, "..", "producer-service")
+
+# Each image is built from its own service directory (COPY *.py ./), so modules
+# both services use are kept as identical copies; app.py is each service's own
+SERVICE_MODULES = {"app.py"}
+
+
+def _modules(directory):
+    return {name for name in os.listdir(directory) if name.endswith(".py")}
+
+
+SHARED = sorted((_modules(SERVICE_DIR) & _modules(PRODUCER_DIR)) - SERVICE_MODULES)
+
+
+def test_shared_modules_are_found():
+    assert {"serialization.py", "metrics_buffer.py", "structured_logging.py", "tracing.py",
+            "validation.py"} <= set(SHARED)
+
+
+@pytest.mark.parametrize("name", SHARED)
+def test_shared_module_copies_are_identical(name):
+    with open(os.path.join(SERVICE_DIR, name), "rb") as f:
+        consumer_copy = f.read()
+    with open(os.path.join(PRODUCER_DIR, name), "rb") as f:
+        producer_copy = f.read()
+    assert consumer_copy == producer_copy, (
+        f"{name} differs between consumer-service and producer-service; apply the change to both copies"
+    )
@@ -0,0 +1,47 @@
+import pytest
+
+from validation import EVENT_SCHEMAS, ValidatorCache
+
+
+def make_event(**overrides):
+    event = {
+        "event_id": "evt-1",
+        "timestamp": "2024-01-01T00:00:00",
+        "event_type": "user_action",
+        "source": "test",
+        "version": "1.0",
+        "data": {"user_id": 1, "action": "login"},
+    }
+    event.update(overrides)
+    return event
+
+
+@pytest.fixture
+def cache():
+    cache = ValidatorCache(EVENT_SCHEMAS)
+    cache.compile_all()
+    return cache
+
+
+def test_valid_event(cache):
+    assert cache.validate_batch([make_event()]) == [None]
+
+
+@pytest.mark.parametrize("overrides", [
+    {"event_type": ["user_action"]},
+    {"event_type": {"name": "user_action"}},
+    {"version": ["1.0"]},
+    {"version": {"major": 1}},
+    {"event_type": ["x"], "version": {"major": 1}},
+])
+def test_unhashable_event_type_or_version_is_rejected_not_raised(cache, overrides):
+    results = cache.validate_batch([make_event(), make_event(**overrides), make_event()])
+
+    assert results[0] is None
+    assert results[1].startswith("$: no schema for")
+    assert results[2] is None
+
+
+def test_validator_lookup_with_unhashable_key(cache):
+    assert cache.validator(["user_action"], "1.0") is None
+    assert cache.validator("user_action", {"major": 1}) is None
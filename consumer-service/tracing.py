@@ -0,0 +1,104 @@
+"""
+KafkaTrace trace context
+
+Shared by the producer and consumer services. The producer stamps every record
+with its trace context in Kafka record headers, leaving the event body alone,
+so the consumer can tell where a record came from and how old it is without
+deserializing the payload:
+
+- kt-correlation-id: ties the record to the request (or event) it came from
+- kt-produced-at: wall-clock milliseconds when the record was handed to the producer
+- kt-producer: the producing instance (its hostname, the pod name on Kubernetes)
+- traceparent: optional W3C trace context, a child span of the HTTP request's
+
+Retried and dead-lettered records keep their headers, so the context (and the
+original produce time) survives the retry pipeline.
+"""
+
+import os
+import re
+from typing import List, Optional, Tuple
+
+CORRELATION_ID_HEADER = "kt-correlation-id"
+PRODUCED_AT_HEADER = "kt-produced-at"
+PRODUCER_HEADER = "kt-producer"
+TRACEPARENT_HEADER = "traceparent"
+
+Header = Tuple[str, bytes]
+
+# version-traceid-parentid-flags; versions after 00 may append fields
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+_ZERO_TRACE_ID = "0" * 32
+_ZERO_SPAN_ID = "0" * 16
+
+
+class TraceContext:
+    """Trace context read back from a record's headers; absent fields are None."""
+
+    __slots__ = ("correlation_id", "produced_at_ms", "producer", "traceparent")
+
+    def __init__(
+        self,
+        correlation_id: Optional[str] = None,
+        produced_at_ms: Optional[int] = None,
+        producer: Optional[str] = None,
+        traceparent: Optional[str] = None
+    ):
+        self.correlation_id = correlation_id
+        self.produced_at_ms = produced_at_ms
+        self.producer = producer
+        self.traceparent = traceparent
+
+    @property
+    def trace_id(self) -> Optional[str]:
+        return self.traceparent[3:35] if self.traceparent else None
+
+
+def child_traceparent(parent: Optional[str]) -> Optional[str]:
+    """A new span id under a W3C traceparent value; None if it is absent or malformed."""
+    if not parent:
+        return None
+    match = _TRACEPARENT.match(parent.strip())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == "ff" or (version == "00" and rest) or trace_id == _ZERO_TRACE_ID or span_id == _ZERO_SPAN_ID:
+        return None
+    return f"00-{trace_id}-{os.urandom(8).hex()}-{flags}"
+
+
+def trace_headers(
+    correlation_id: str,
+    producer: bytes,
+    produced_at_ms: int,
+    traceparent: Optional[str] = None
+) -> List[Header]:
+    """Record headers for one record's trace context."""
+    headers = [
+        (CORRELATION_ID_HEADER, correlation_id.encode("utf-8")),
+        (PRODUCED_AT_HEADER, str(produced_at_ms).encode("ascii")),
+        (PRODUCER_HEADER, producer)
+    ]
+    if traceparent:
+        headers.append((TRACEPARENT_HEADER, traceparent.encode("ascii")))
+    return headers
+
+
+def extract(headers: Optional[List[Header]]) -> TraceContext:
+    """Read a record's trace context in one pass over its headers."""
+    context = TraceContext()
+    for key, value in headers or ():
+        if value is None:
+            continue
+        if key == PRODUCED_AT_HEADER:
+            try:
+                context.produced_at_ms = int(value)
+            except ValueError:
+                pass
+        elif key == CORRELATION_ID_HEADER:
+            context.correlation_id = value.decode("utf-8", "replace")
+        elif key == PRODUCER_HEADER:
+            context.producer = value.decode("utf-8", "replace")
+        elif key == TRACEPARENT_HEADER:
+            context.traceparent = value.decode("ascii", "replace")
+    return context
@@ -15,28 +15,41 @@ Learning Objectives:
 import asyncio
 import json
 import logging
+import os
 import random
+import socket
 import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import Body, FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from kafka import KafkaProducer
-from kafka.errors import KafkaError
+from kafka.errors import KafkaError, KafkaTimeoutError
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from prometheus_client.registry import CollectorRegistry
-from starlette.responses import Response
-from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect, Request
 
-# Configure structured logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from load_generator import LoadGenerator
+from metrics_buffer import LabelCache, MetricBatch
+from send_buffer import SendBuffer, SendBufferFull
+from serialization import decode_value, get_serializer, routing_headers
+from structured_logging import EventLog, configure_logging, dropped_records
+from tracing import child_traceparent, trace_headers
+from validation import validators
+
+# Configure structured logging: JSON lines written by a background thread
+LOG_LEVEL = "INFO"
+LOG_JSON = True  # False for the plain text format
+LOG_SUCCESS_SAMPLE_RATE = 0.01  # fraction of per-event success lines emitted
+LOG_ERROR_INTERVAL_SECONDS = 10  # repeated per-event errors: one line per key per window
+
+configure_logging(level=LOG_LEVEL, json_format=LOG_JSON, service="producer")
 logger = logging.getLogger(__name__)
+event_log = EventLog(logger, LOG_SUCCESS_SAMPLE_RATE, LOG_ERROR_INTERVAL_SECONDS)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -74,6 +87,25 @@ KAFKA_CONNECTION_STATUS = Gauge(
     'Kafka connection status (1=connected, 0=disconnected)'
 )
 
+DEAD_LETTERS = Counter(
+    'producer_dead_letters_total',
+    'Events routed to the dead-letter topic after a failed delivery',
+    ['status']
+)
+
+EVENT_PAYLOAD_SIZE = Histogram(
+    'event_payload_size_bytes',
+    'Serialized size of produced event payloads',
+    ['topic'],
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144, 1048576)
+)
+
+PRODUCE_BATCH_SIZE = Histogram(
+    'produce_batch_size',
+    'Events per pipelined produce batch',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+
 # Kafka configuration
 # TODO: Move these to environment variables for different environments
 # This helps you learn configuration management best practices
@@ -81,9 +113,66 @@ KAFKA_BOOTSTRAP_SERVERS = "kafka.kafka.svc.cluster.local:9092"
 KAFKA_TOPIC = "events"
 KAFKA_RETRIES = 3
 KAFKA_ACKS = "all"
+KAFKA_SEND_TIMEOUT = 10  # seconds to wait for a broker ack
+# send() blocks the event loop while it waits for topic metadata; keep that short
+# and answer 503 when the cluster is unreachable
+KAFKA_MAX_BLOCK_MS = 500
+KAFKA_UNAVAILABLE_RETRY_AFTER = 5  # seconds suggested to clients on 503
+KAFKA_BATCH_SIZE = 65536
+KAFKA_LINGER_MS = 5
+# Payload format: "orjson", "msgpack" or "json" (declared per record in a header)
+SERIALIZATION_FORMAT = "orjson"
+
+serializer = get_serializer(SERIALIZATION_FORMAT)
+
+# Dead-letter topic for events the broker rejected; header names match the
+# consumer's retry pipeline so its DLQ redrive can replay them
+DLQ_TOPIC = "events.dlq"
+DLQ_ORIGINAL_TOPIC_HEADER = "kt-original-topic"
+DLQ_ERROR_HEADER = "kt-error"
+DLQ_FAILED_AT_HEADER = "kt-failed-at"
+DLQ_MAX_ERROR_BYTES = 1024
+
+# Trace context, carried in record headers rather than the event body (see tracing.py)
+TRACE_CORRELATION_ID_HTTP_HEADER = "X-Correlation-ID"
+TRACE_PRODUCER_INSTANCE = socket.gethostname()  # the pod name on Kubernetes
+TRACE_PROPAGATE_TRACEPARENT = True  # stamp a child of the request's W3C traceparent on its records
+
+# Send buffer budget: requests beyond it are shed with 429 instead of queueing
+SEND_BUFFER_MAX_RECORDS = 20000
+SEND_BUFFER_MAX_BYTES = 16 * 1024 * 1024
+SEND_BUFFER_RETRY_AFTER = 1  # seconds suggested to shed clients
+
+send_buffer = SendBuffer(SEND_BUFFER_MAX_RECORDS, SEND_BUFFER_MAX_BYTES)
+
+# NDJSON streaming ingestion (/events/stream)
+STREAM_MAX_IN_FLIGHT = 5000  # unacknowledged lines per connection
+STREAM_MAX_LINE_BYTES = 1024 * 1024
+STREAM_MAX_REPORTED_ERRORS = 10  # per-line errors kept in the summary
+
+# Sample event vocabulary (4 entries each so a random byte masks to an index)
+SAMPLE_EVENT_TYPES = ("user_action", "system_metric", "business_event", "error_log")
+SAMPLE_ACTIONS = ("login", "logout", "purchase", "view")
+SAMPLE_USER_AGENT = "Mozilla/5.0 (compatible; KafkaTrace/1.0)"
+_SAMPLE_IP_ADDRESSES = tuple(f"192.168.1.{i}" for i in range(1, 256))
+_SAMPLE_BYTES_PER_EVENT = 37  # 2 UUIDs + user_id (2) + event_type + action + ip
+SAMPLE_EVENT_BLOCK_SIZE = 1000  # max events generated per refill (about 1s of load at the target rate)
+
+# Load generator defaults (used by /start-background)
+LOADGEN_DEFAULT_RATE = 1.0  # events/sec
+LOADGEN_DEFAULT_WORKERS = 1
+
+# Metric updates are buffered and applied per batch, or every tick for single sends
+METRICS_FLUSH_INTERVAL = 1.0  # seconds; /metrics also flushes before each scrape
+
+produced_counts = LabelCache(EVENTS_PRODUCED, [(KAFKA_TOPIC, t) for t in SAMPLE_EVENT_TYPES])
+production_durations = LabelCache(EVENT_PRODUCTION_DURATION, [(KAFKA_TOPIC,)])
+payload_sizes = LabelCache(EVENT_PAYLOAD_SIZE, [(KAFKA_TOPIC,)])
+pending_metrics = MetricBatch()  # event loop only
 
 # Global producer instance
 producer: KafkaProducer = None
+metrics_task: Optional[asyncio.Task] = None
 
 def create_kafka_producer() -> KafkaProducer:
     """
@@ -95,15 +184,20 @@ def create_kafka_producer() -> KafkaProducer:
     try:
         producer = KafkaProducer(
             bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+            # Values are serialized up front so their size can be admitted
+            # against the send buffer before they reach the producer
             key_serializer=lambda k: k.encode('utf-8') if k else None,
             retries=KAFKA_RETRIES,
             acks=KAFKA_ACKS,
             # TODO: Add compression for better performance
             # compression_type='gzip',
-            # TODO: Add batch size and linger for throughput optimization
-            # batch_size=16384,
-            # linger_ms=10,
+            # Give pipelined sends a short window to coalesce into one request
+            batch_size=KAFKA_BATCH_SIZE,
+            linger_ms=KAFKA_LINGER_MS,
+            # Keep the client's own buffer above the send buffer budget so
+            # send() never blocks the event loop waiting for space
+            buffer_memory=max(SEND_BUFFER_MAX_BYTES * 2, 33554432),
+            max_block_ms=KAFKA_MAX_BLOCK_MS,
         )
         KAFKA_CONNECTION_STATUS.set(1)
         logger.info("Kafka producer created successfully")
@@ -120,104 +214,518 @@ def generate_sample_event() -> Dict[str, Any]:
     TODO: Replace with your actual event schema and business logic.
     This helps you learn event design patterns and schema evolution.
     """
-    event_types = ["user_action", "system_metric", "business_event", "error_log"]
-    
     return {
         "event_id": str(uuid.uuid4()),
         "timestamp": datetime.utcnow().isoformat(),
-        "event_type": random.choice(event_types),
+        "event_type": random.choice(SAMPLE_EVENT_TYPES),
         "source": "producer-service",
         "version": "1.0",
         "data": {
             "user_id": random.randint(1000, 9999),
-            "action": random.choice(["login", "logout", "purchase", "view"]),
+            "action": random.choice(SAMPLE_ACTIONS),
             "metadata": {
                 "ip_address": f"192.168.1.{random.randint(1, 255)}",
-                "user_agent": "Mozilla/5.0 (compatible; KafkaTrace/1.0)",
+                "user_agent": SAMPLE_USER_AGENT,
                 "session_id": str(uuid.uuid4())
             }
         },
-        # TODO: Add correlation_id for distributed tracing
-        # "correlation_id": request.headers.get("X-Correlation-ID"),
+        # The correlation id travels in the record headers (see _record_headers)
     }
 
-async def produce_event_async(event: Dict[str, Any], topic: str = KAFKA_TOPIC) -> bool:
+def generate_sample_events(
+    n: int,
+    seed: Optional[int] = None,
+    timestamp: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Generate n sample events in bulk for load testing.
+
+    All randomness for the batch comes from one byte slab (os.urandom, or a
+    seeded random.Random for reproducible runs): 16 bytes per UUID, 2 for the
+    user_id and one each for event_type, action and IP. The slab is hex-encoded
+    once and UUIDs are sliced out of it with the version/variant bits applied,
+    and the whole batch shares a single timestamp string.
+
+    With a seed (and a fixed timestamp) the output is fully reproducible.
+    """
+    if n <= 0:
+        return []
+
+    slab_size = n * _SAMPLE_BYTES_PER_EVENT
+    slab = random.Random(seed).randbytes(slab_size) if seed is not None else os.urandom(slab_size)
+    hexed = slab.hex()
+    timestamp_str = (timestamp or datetime.utcnow()).isoformat()
+    variants = "89ab"
+
+    events = []
+    append = events.append
+    for i in range(n):
+        o = i * _SAMPLE_BYTES_PER_EVENT
+        h = o * 2
+        event_id = (
+            f"{hexed[h:h + 8]}-{hexed[h + 8:h + 12]}-4{hexed[h + 13:h + 16]}-"
+            f"{variants[slab[o + 8] & 3]}{hexed[h + 17:h + 20]}-{hexed[h + 20:h + 32]}"
+        )
+        h += 32
+        session_id = (
+            f"{hexed[h:h + 8]}-{hexed[h + 8:h + 12]}-4{hexed[h + 13:h + 16]}-"
+            f"{variants[slab[o + 24] & 3]}{hexed[h + 17:h + 20]}-{hexed[h + 20:h + 32]}"
+        )
+        append({
+            "event_id": event_id,
+            "timestamp": timestamp_str,
+            "event_type": SAMPLE_EVENT_TYPES[slab[o + 34] & 3],
+            "source": "producer-service",
+            "version": "1.0",
+            "data": {
+                "user_id": 1000 + ((slab[o + 32] << 8) | slab[o + 33]) % 9000,
+                "action": SAMPLE_ACTIONS[slab[o + 35] & 3],
+                "metadata": {
+                    "ip_address": _SAMPLE_IP_ADDRESSES[slab[o + 36] % 255],
+                    "user_agent": SAMPLE_USER_AGENT,
+                    "session_id": session_id
+                }
+            },
+        })
+    return events
+
+def _encode_and_admit(events: List[Dict[str, Any]]) -> List[bytes]:
+    """
+    Serialize events and reserve send-buffer budget for all of them at once.
+
+    Raises SendBufferFull when the batch does not fit; nothing is admitted then.
+    """
+    payloads = [serializer.dumps(event) for event in events]
+    send_buffer.admit(len(payloads), sum(len(p) for p in payloads))
+    return payloads
+
+class BrokerUnavailable(Exception):
+    """Raised when send() times out waiting for metadata; nothing was sent."""
+
+_PRODUCER_INSTANCE = TRACE_PRODUCER_INSTANCE.encode("utf-8")
+
+def _request_trace(request: Request) -> Tuple[str, Optional[str]]:
+    """The request's correlation id (a new one if the client sent none) and child traceparent."""
+    correlation_id = request.headers.get(TRACE_CORRELATION_ID_HTTP_HEADER) or str(uuid.uuid4())
+    traceparent = child_traceparent(request.headers.get("traceparent")) if TRACE_PROPAGATE_TRACEPARENT else None
+    return correlation_id, traceparent
+
+def _record_headers(
+    event: Dict[str, Any],
+    correlation_id: Optional[str],
+    traceparent: Optional[str],
+    produced_at_ms: int
+) -> List[tuple]:
+    """
+    Format header, routing fields and trace context for one event's record.
+
+    The event's own correlation_id wins over the request's; events produced
+    outside a request (the load generator) fall back to their event_id.
+    """
+    return [serializer.header, *routing_headers(event), *trace_headers(
+        event.get("correlation_id") or correlation_id or str(event.get("event_id")),
+        _PRODUCER_INSTANCE,
+        produced_at_ms,
+        traceparent
+    )]
+
+def _send_async(
+    key: Optional[str],
+    payload: bytes,
+    topic: str,
+    headers: Optional[List[tuple]] = None
+) -> asyncio.Future:
+    """
+    Hand an admitted payload to the Kafka producer and return an asyncio future for its delivery.
+
+    kafka-python resolves its send futures on the producer's sender thread, so the
+    callbacks marshal the result back onto the event loop with call_soon_threadsafe.
+    The future resolves to (record_metadata, ack_latency_seconds). The payload's
+    send-buffer budget is released once the broker acks or rejects it, even if the
+    caller has stopped waiting.
+
+    Raises BrokerUnavailable if the producer has no metadata for the topic
+    within KAFKA_MAX_BLOCK_MS.
+    """
+    loop = asyncio.get_running_loop()
+    delivery = loop.create_future()
+    size = len(payload)
+    start_time = time.time()
+
+    def _settle_success(record_metadata, duration: float):
+        send_buffer.release(1, size)
+        if not delivery.done():
+            delivery.set_result((record_metadata, duration))
+
+    def _settle_error(exc: BaseException):
+        send_buffer.release(1, size)
+        if not delivery.done():
+            delivery.set_exception(exc)
+
+    def _on_success(record_metadata):
+        loop.call_soon_threadsafe(_settle_success, record_metadata, time.time() - start_time)
+
+    def _on_error(exc):
+        loop.call_soon_threadsafe(_settle_error, exc)
+
+    try:
+        future = producer.send(
+            topic=topic,
+            key=key,
+            value=payload,
+            headers=headers or [serializer.header]
+        )
+    except KafkaTimeoutError as e:
+        send_buffer.release(1, size)
+        raise BrokerUnavailable(str(e)) from e
+    except Exception:
+        send_buffer.release(1, size)
+        raise
+    future.add_callback(_on_success)
+    future.add_errback(_on_error)
+    return delivery
+
+def _dead_letter(
+    key: Optional[str],
+    payload: bytes,
+    topic: str,
+    error: BaseException,
+    headers: Optional[List[tuple]] = None
+):
+    """
+    Route an event whose delivery failed to the dead-letter topic.
+
+    The record keeps the headers of the failed send (format, routing and trace
+    context) with the DLQ headers appended, so it can still be routed and
+    correlated. Fire-and-forget: the DLQ send takes send-buffer budget like any
+    other, so a broker outage cannot grow it without bound, and is dropped (and
+    counted) when there is no room or it fails as well.
+    """
+    headers = [
+        *(headers or [serializer.header]),
+        (DLQ_ORIGINAL_TOPIC_HEADER, topic.encode()),
+        (DLQ_ERROR_HEADER, f"{type(error).__name__}: {error}".encode("utf-8", "replace")[:DLQ_MAX_ERROR_BYTES]),
+        (DLQ_FAILED_AT_HEADER, str(int(time.time() * 1000)).encode())
+    ]
+    try:
+        send_buffer.admit(1, len(payload))
+        delivery = _send_async(key, payload, DLQ_TOPIC, headers=headers)
+    except Exception as e:
+        DEAD_LETTERS.labels(status="dropped").inc()
+        event_log.error("dlq-dropped", "Dropped event %s: could not dead-letter it: %s", key, e)
+        return
+
+    def _on_dead_lettered(future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            DEAD_LETTERS.labels(status="dropped").inc()
+            event_log.error("dlq-dropped", "Dropped event %s: dead-letter send failed", key)
+        else:
+            DEAD_LETTERS.labels(status="sent").inc()
+            event_log.warning("dlq-sent", "Event %s dead-lettered to %s", key, DLQ_TOPIC)
+
+    delivery.add_done_callback(_on_dead_lettered)
+
+async def produce_event_async(
+    event: Dict[str, Any],
+    topic: str = KAFKA_TOPIC,
+    correlation_id: Optional[str] = None,
+    traceparent: Optional[str] = None
+) -> bool:
     """
     Asynchronously produce an event to Kafka with error handling.
-    
-    TODO: Add dead letter queue (DLQ) for failed events.
-    This helps you learn error handling patterns in event streaming.
+
+    The event loop is never blocked waiting for the broker: the send is handed to
+    the producer's I/O thread and awaited via _send_async, so many sends can be
+    in flight from a single worker.
+
+    Raises SendBufferFull if the send buffer has no room; callers shed the request.
+    Raises BrokerUnavailable if the cluster cannot be reached; callers answer 503.
+    Events the broker rejects are routed to the dead-letter topic. Timed-out sends
+    are not, since they may still be delivered.
     """
     start_time = time.time()
+    payload = None
+    headers = None
     
     try:
-        # TODO: Add event validation before sending
-        # This helps you learn data quality and schema validation
+        # Events from clients are validated by the endpoints before they get here
         
         # TODO: Add event enrichment (e.g., adding user context, geolocation)
         # This helps you learn event processing patterns
         
-        future = producer.send(
-            topic=topic,
-            key=event.get("event_id"),
-            value=event
-        )
+        payload, = _encode_and_admit([event])
         
-        # Wait for the send to complete
-        record_metadata = future.get(timeout=10)
+        # asyncio.wait rather than wait_for: on 3.11 wait_for can swallow a
+        # cancellation that races with the ack, leaving the caller running
+        headers = _record_headers(event, correlation_id, traceparent, int(time.time() * 1000))
+        delivery = _send_async(event.get("event_id"), payload, topic, headers=headers)
+        done, _ = await asyncio.wait((delivery,), timeout=KAFKA_SEND_TIMEOUT)
+        if not done:
+            delivery.cancel()
+            raise asyncio.TimeoutError()
+        record_metadata, duration = delivery.result()
         
-        duration = time.time() - start_time
-        EVENT_PRODUCTION_DURATION.observe(duration)
-        EVENTS_PRODUCED.labels(topic=topic, event_type=event.get("event_type")).inc()
+        pending_metrics.observe(production_durations, (topic,), duration)
+        pending_metrics.observe(payload_sizes, (topic,), len(payload))
+        pending_metrics.inc(produced_counts, (topic, event.get("event_type")))
         
-        logger.info(
-            f"Event produced successfully: topic={record_metadata.topic}, "
-            f"partition={record_metadata.partition}, offset={record_metadata.offset}, "
-            f"duration={duration:.3f}s"
+        event_log.success(
+            "Event produced successfully: topic=%s, partition=%s, offset=%s, duration=%.3fs",
+            record_metadata.topic, record_metadata.partition, record_metadata.offset, duration
         )
         
         return True
         
+    except (SendBufferFull, BrokerUnavailable):
+        raise
     except KafkaError as e:
         duration = time.time() - start_time
-        EVENT_PRODUCTION_DURATION.observe(duration)
-        logger.error(f"Failed to produce event: {e}")
+        pending_metrics.observe(production_durations, (topic,), duration)
+        event_log.error(type(e).__name__, "Failed to produce event: %s", e)
+        if payload is not None:
+            _dead_letter(event.get("event_id"), payload, topic, e, headers)
+        return False
+    except asyncio.TimeoutError:
+        duration = time.time() - start_time
+        pending_metrics.observe(production_durations, (topic,), duration)
+        event_log.error("timeout", "Timed out waiting for delivery after %ss", KAFKA_SEND_TIMEOUT)
         return False
     except Exception as e:
         duration = time.time() - start_time
-        EVENT_PRODUCTION_DURATION.observe(duration)
-        logger.error(f"Unexpected error producing event: {e}")
+        pending_metrics.observe(production_durations, (topic,), duration)
+        event_log.error(type(e).__name__, "Unexpected error producing event: %s", e)
         return False
 
-async def background_event_producer():
+async def produce_events_pipelined(
+    events: List[Dict[str, Any]],
+    topic: str = KAFKA_TOPIC,
+    correlation_id: Optional[str] = None,
+    traceparent: Optional[str] = None
+) -> List[Dict[str, Any]]:
     """
-    Background task that continuously produces events.
-    
-    TODO: Add rate limiting and backpressure handling.
-    This helps you learn flow control in event streaming systems.
+    Produce a batch of events with every send in flight at once.
+
+    All events are enqueued on the producer before anything is awaited, so the
+    whole batch shares the producer's linger window and round trips instead of
+    paying one broker ack per event. Returns one result per event, in order.
+
+    The batch is admitted to the send buffer as a whole; SendBufferFull is raised
+    before anything is sent if it does not fit. As in produce_event_async, events
+    the broker rejects are dead-lettered and timed-out sends are not, and
+    BrokerUnavailable is raised if the topic's metadata cannot be fetched.
     """
-    while True:
+    if not events:
+        return []
+
+    start_time = time.time()
+    payloads = _encode_and_admit(events)
+    PRODUCE_BATCH_SIZE.observe(len(events))
+    deliveries = []
+    record_headers = []
+    produced_at_ms = int(start_time * 1000)
+    for i, (event, payload) in enumerate(zip(events, payloads)):
+        headers = _record_headers(event, correlation_id, traceparent, produced_at_ms)
+        record_headers.append(headers)
+        try:
+            deliveries.append(_send_async(event.get("event_id"), payload, topic, headers=headers))
+        except BrokerUnavailable:
+            # Every record goes to the same topic: don't block once more per event
+            unsent = payloads[i + 1:]
+            send_buffer.release(len(unsent), sum(len(p) for p in unsent))
+            raise
+        except Exception as e:
+            # send() raises synchronously on a full producer buffer
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(e)
+            deliveries.append(failed)
+
+    done, pending = await asyncio.wait(deliveries, timeout=KAFKA_SEND_TIMEOUT)
+    for delivery in pending:
+        delivery.cancel()
+
+    results = []
+    batch_metrics = MetricBatch()
+    batch_metrics.observe_many(payload_sizes, (topic,), map(len, payloads))
+    for event, payload, headers, delivery in zip(events, payloads, record_headers, deliveries):
+        result = {"event_id": event.get("event_id"), "success": False}
+        if delivery in done and delivery.exception() is None:
+            record_metadata, duration = delivery.result()
+            batch_metrics.observe(production_durations, (topic,), duration)
+            batch_metrics.inc(produced_counts, (topic, event.get("event_type")))
+            result.update(
+                success=True,
+                partition=record_metadata.partition,
+                offset=record_metadata.offset
+            )
+        elif delivery in pending:
+            batch_metrics.observe(production_durations, (topic,), time.time() - start_time)
+            result["error"] = "delivery timed out"
+        else:
+            exception = delivery.exception()
+            batch_metrics.observe(production_durations, (topic,), time.time() - start_time)
+            result["error"] = str(exception)
+            if isinstance(exception, KafkaError):
+                _dead_letter(event.get("event_id"), payload, topic, exception, headers)
+        results.append(result)
+    batch_metrics.flush()
+
+    successful_count = sum(1 for r in results if r["success"])
+    logger.info(
+        f"Batch produced: topic={topic}, events={len(events)}, "
+        f"successful={successful_count}, duration={time.time() - start_time:.3f}s"
+    )
+    if successful_count < len(events):
+        logger.error(f"Failed to produce {len(events) - successful_count} events in batch")
+
+    return results
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves receive() to the request body reader.
+
+    Starlette's StreamingResponse listens for client disconnects by calling
+    receive() concurrently, which would swallow request body chunks that the
+    NDJSON reader is still consuming while acks are streamed back.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def _produce_ndjson_stream(
+    request: Request,
+    topic: str,
+    in_flight: asyncio.Semaphore,
+    acks: Optional[asyncio.Queue] = None
+) -> Dict[str, Any]:
+    """
+    Produce every line of an NDJSON request body as soon as it is parsed.
+
+    The body is read chunk by chunk and a line takes an `in_flight` slot before
+    it is sent, so memory stays flat regardless of upload size. Without `acks`
+    the slot is returned on delivery; with `acks` one ack dict per line is put
+    on the queue and whoever writes it to the client returns the slot, so a
+    slow reader also slows ingestion. Returns the summary.
+    """
+    summary = {"lines": 0, "produced": 0, "failed": 0, "invalid": 0, "errors": []}
+    outstanding = 0
+    drained = asyncio.Event()
+    drained.set()
+    start_time = time.time()
+    passthrough = serializer.content_type == "application/json"
+    correlation_id, traceparent = _request_trace(request)
+
+    def _note_error(line_no: int, error: str):
+        if len(summary["errors"]) < STREAM_MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_no, "error": error})
+
+    def _finish_line(ack: Dict[str, Any]):
+        if acks is not None:
+            acks.put_nowait(ack)
+        else:
+            in_flight.release()
+
+    def _on_delivery(line_no: int, event: Dict[str, Any], delivery: asyncio.Future):
+        nonlocal outstanding
+        ack = {"line": line_no, "event_id": event.get("event_id"), "success": False}
+        if not delivery.cancelled() and delivery.exception() is None:
+            record_metadata, duration = delivery.result()
+            pending_metrics.observe(production_durations, (topic,), duration)
+            pending_metrics.inc(produced_counts, (topic, event.get("event_type")))
+            summary["produced"] += 1
+            ack.update(success=True, partition=record_metadata.partition, offset=record_metadata.offset)
+        else:
+            error = "cancelled" if delivery.cancelled() else str(delivery.exception())
+            summary["failed"] += 1
+            _note_error(line_no, error)
+            ack["error"] = error
+        _finish_line(ack)
+        outstanding -= 1
+        if outstanding == 0:
+            drained.set()
+
+    async def _produce_line(line_no: int, line: bytes):
+        nonlocal outstanding
+        summary["lines"] += 1
+        await in_flight.acquire()
         try:
-            event = generate_sample_event()
-            success = await produce_event_async(event)
-            
-            if not success:
-                # TODO: Implement exponential backoff for failed sends
-                # This helps you learn resilience patterns
-                await asyncio.sleep(1)
-            else:
-                # TODO: Make this configurable based on load testing
-                await asyncio.sleep(random.uniform(0.5, 2.0))
-                
+            event = decode_value(line)
+            error = validators.validate(event)
+            if error is not None:
+                raise ValueError(error)
         except Exception as e:
-            logger.error(f"Error in background producer: {e}")
-            await asyncio.sleep(5)
+            summary["invalid"] += 1
+            _note_error(line_no, f"invalid event: {e}")
+            _finish_line({"line": line_no, "success": False, "error": "invalid event"})
+            return
+
+        # NDJSON lines are already JSON: forward the bytes when the wire format is JSON too
+        payload = line if passthrough else serializer.dumps(event)
+        try:
+            await send_buffer.admit_when_ready(1, len(payload))
+            pending_metrics.observe(payload_sizes, (topic,), len(payload))
+            headers = _record_headers(event, correlation_id, traceparent, int(time.time() * 1000))
+            delivery = _send_async(event.get("event_id"), payload, topic, headers=headers)
+        except Exception:
+            in_flight.release()
+            raise
+        outstanding += 1
+        drained.clear()
+        delivery.add_done_callback(lambda d: _on_delivery(line_no, event, d))
+
+    line_no = 0
+    pending = b""
+    try:
+        async for chunk in request.stream():
+            pending += chunk
+            if b"\n" in chunk:
+                lines = pending.split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    line_no += 1
+                    line = line.strip()
+                    if line:
+                        await _produce_line(line_no, line)
+            if len(pending) > STREAM_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail="NDJSON line too long")
+        if pending.strip():
+            line_no += 1
+            await _produce_line(line_no, pending.strip())
+    except ClientDisconnect:
+        logger.warning(f"Client disconnected after {line_no} NDJSON lines")
+    finally:
+        await drained.wait()
+
+    summary["duration_seconds"] = time.time() - start_time
+    logger.info(
+        f"NDJSON stream produced: topic={topic}, lines={summary['lines']}, "
+        f"produced={summary['produced']}, failed={summary['failed']}, "
+        f"invalid={summary['invalid']}, duration={summary['duration_seconds']:.3f}s"
+    )
+    return summary
+
+# Managed load generator behind the /load endpoints
+load_generator = LoadGenerator(
+    produce=produce_event_async,
+    generate=generate_sample_events,
+    block_size=SAMPLE_EVENT_BLOCK_SIZE
+)
+
+async def flush_metrics_periodically():
+    """Apply buffered single-send metric updates once per tick."""
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        pending_metrics.flush()
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize Kafka producer on application startup."""
-    global producer
+    global producer, metrics_task
+    compiled = validators.compile_all()
+    logger.info(f"Compiled {compiled} event validators")
     producer = create_kafka_producer()
+    metrics_task = asyncio.create_task(flush_metrics_periodically())
     
     # TODO: Add health check for Kafka connectivity
     # This helps you learn health check patterns for microservices
@@ -226,10 +734,33 @@ async def startup_event():
 async def shutdown_event():
     """Clean up resources on application shutdown."""
     global producer
+    if load_generator.running:
+        await load_generator.stop()
+    if metrics_task:
+        metrics_task.cancel()
+    pending_metrics.flush()
     if producer:
         producer.close()
         logger.info("Kafka producer closed")
 
+def _unavailable(error: BrokerUnavailable) -> HTTPException:
+    """Map an unreachable cluster to 503 instead of blocking until the client gives up."""
+    return HTTPException(
+        status_code=503,
+        detail=f"Kafka unavailable: {error}",
+        headers={"Retry-After": str(KAFKA_UNAVAILABLE_RETRY_AFTER)}
+    )
+
+def _shed(error: SendBufferFull) -> HTTPException:
+    """Map a full send buffer to a fast 429 (or 413 if the request can never fit)."""
+    if not error.retryable:
+        return HTTPException(status_code=413, detail=str(error))
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(SEND_BUFFER_RETRY_AFTER)}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint with service information."""
@@ -256,7 +787,9 @@ async def health_check():
         return {
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
-            "kafka_connected": producer is not None
+            "kafka_connected": producer is not None,
+            "send_buffer": send_buffer.status(),
+            "log_records_dropped": dropped_records()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -265,6 +798,7 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
+    pending_metrics.flush()
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/events")
@@ -275,25 +809,37 @@ async def produce_event(
 ):
     """
     Produce a single event to Kafka.
+
+    The record carries the request's X-Correlation-ID (generated when absent)
+    and, if the request has one, a child of its W3C traceparent in its headers.
     
     TODO: Add request validation and rate limiting.
     This helps you learn API design and security best practices.
     """
     if event is None:
         event = generate_sample_event()
+    else:
+        error = validators.validate(event)
+        if error is not None:
+            raise HTTPException(status_code=422, detail=f"Invalid event: {error}")
     
     # TODO: Add authentication and authorization
     # This helps you learn security patterns for microservices
     
-    # TODO: Add request correlation ID for tracing
-    # correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+    correlation_id, traceparent = _request_trace(request)
     
-    success = await produce_event_async(event)
+    try:
+        success = await produce_event_async(event, correlation_id=correlation_id, traceparent=traceparent)
+    except SendBufferFull as e:
+        raise _shed(e)
+    except BrokerUnavailable as e:
+        raise _unavailable(e)
     
     if success:
         return {
             "status": "success",
             "event_id": event.get("event_id"),
+            "correlation_id": event.get("correlation_id") or correlation_id,
             "message": "Event produced successfully"
         }
     else:
@@ -302,50 +848,170 @@ async def produce_event(
 @app.post("/events/batch")
 async def produce_events_batch(
     request: Request,
-    events: list = None,
+    events: Optional[List[Dict[str, Any]]] = Body(None),
     count: int = 10
 ):
     """
     Produce multiple events in batch.
-    
-    TODO: Add batch size limits and validation.
-    This helps you learn batch processing patterns.
+
+    The JSON array body is the batch; without a body, `count` generated sample
+    events are produced instead.
+
+    Every event is enqueued before any delivery is awaited, so a batch costs
+    roughly one linger window plus a round trip rather than one ack per event.
+    Each entry in "results" carries the partition and offset it landed on.
+    Events that fail validation are not produced; their result carries the
+    validation error while the rest of the batch goes through. All records of
+    the batch share the request's correlation id and traceparent.
+
+    The batch is admitted to the send buffer as a whole, which bounds its size:
+    429 while the buffer is too full, 413 if it could never fit.
     """
     if events is None:
-        events = [generate_sample_event() for _ in range(count)]
-    
-    # TODO: Add batch validation and error handling
-    # This helps you learn batch processing error handling
+        events = generate_sample_events(count)
+        errors = [None] * len(events)
+    else:
+        errors = validators.validate_batch(events)
     
-    results = []
-    for event in events:
-        success = await produce_event_async(event)
-        results.append({
-            "event_id": event.get("event_id"),
-            "success": success
-        })
+    valid = [event for event, error in zip(events, errors) if error is None]
+    correlation_id, traceparent = _request_trace(request)
+    try:
+        produced = iter(await produce_events_pipelined(
+            valid, correlation_id=correlation_id, traceparent=traceparent
+        ))
+    except SendBufferFull as e:
+        raise _shed(e)
+    except BrokerUnavailable as e:
+        raise _unavailable(e)
+    results = [
+        next(produced) if error is None else {
+            "event_id": event.get("event_id") if isinstance(event, dict) else None,
+            "success": False,
+            "error": f"invalid event: {error}"
+        }
+        for event, error in zip(events, errors)
+    ]
     
     successful_count = sum(1 for r in results if r["success"])
     
     return {
         "status": "completed",
+        "correlation_id": correlation_id,
         "total_events": len(events),
         "successful_events": successful_count,
         "failed_events": len(events) - successful_count,
         "results": results
     }
 
+@app.post("/events/stream")
+async def produce_events_stream(request: Request, ack: str = "summary"):
+    """
+    Produce events from an NDJSON request body (one JSON event per line).
+
+    Lines are produced as they arrive with a bounded number in flight, so
+    multi-GB backfills can go through one connection at constant memory.
+    Lines that do not parse or fail validation are counted as invalid.
+
+    ack=summary (default) returns one compact summary once the body is done;
+    ack=each streams an NDJSON ack per line followed by a final summary line.
+    """
+    if ack not in ("summary", "each"):
+        raise HTTPException(status_code=400, detail="ack must be 'summary' or 'each'")
+
+    in_flight = asyncio.Semaphore(STREAM_MAX_IN_FLIGHT)
+
+    if ack == "summary":
+        try:
+            summary = await _produce_ndjson_stream(request, KAFKA_TOPIC, in_flight)
+        except SendBufferFull as e:
+            raise _shed(e)
+        except BrokerUnavailable as e:
+            raise _unavailable(e)
+        return {"status": "completed", **summary}
+
+    acks: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _ingest():
+        try:
+            summary = await _produce_ndjson_stream(request, KAFKA_TOPIC, in_flight, acks)
+            acks.put_nowait({"summary": summary})
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"NDJSON stream ingestion failed: {detail}")
+            acks.put_nowait({"error": detail})
+        finally:
+            acks.put_nowait(done)
+
+    async def _write_acks():
+        ingest_task = asyncio.create_task(_ingest())
+        try:
+            while True:
+                item = await acks.get()
+                if item is done:
+                    break
+                yield json.dumps(item, separators=(",", ":")).encode("utf-8") + b"\n"
+                if "line" in item:
+                    in_flight.release()
+        finally:
+            if not ingest_task.done():
+                ingest_task.cancel()
+
+    return _DuplexStreamingResponse(_write_acks(), media_type="application/x-ndjson")
+
+@app.post("/load/start")
+async def start_load(
+    rate: float = LOADGEN_DEFAULT_RATE,
+    workers: int = LOADGEN_DEFAULT_WORKERS,
+    mode: str = "closed"
+):
+    """
+    Start generating synthetic load at a target events/sec.
+
+    mode=closed waits for each ack before the next send (per worker);
+    mode=open sends on the token schedule regardless of ack latency.
+    """
+    try:
+        load_generator.start(rate=rate, workers=workers, mode=mode)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "started", **load_generator.status()}
+
+@app.post("/load/retarget")
+async def retarget_load(rate: Optional[float] = None, workers: Optional[int] = None):
+    """Change the target rate and/or worker count of the running load generator."""
+    try:
+        load_generator.retarget(rate=rate, workers=workers)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "retargeted", **load_generator.status()}
+
+@app.post("/load/stop")
+async def stop_load():
+    """Stop the load generator and wait for outstanding sends."""
+    if load_generator.running:
+        await load_generator.stop()
+    return {"status": "stopped", **load_generator.status()}
+
+@app.get("/load/status")
+async def load_status():
+    """Current target/achieved rate, latency percentiles and counters."""
+    return load_generator.status()
+
 @app.post("/start-background")
 async def start_background_producer():
     """
     Start the background event producer.
-    
-    TODO: Add proper task management and monitoring.
-    This helps you learn background task patterns in FastAPI.
+
+    Kept for existing scripts: starts the managed load generator with its
+    defaults if it is not already running. Use /load/* for full control.
     """
-    # TODO: Implement proper background task management
-    # This is a simplified version - in production, use proper task queues
-    asyncio.create_task(background_event_producer())
+    if not load_generator.running:
+        load_generator.start(rate=LOADGEN_DEFAULT_RATE, workers=LOADGEN_DEFAULT_WORKERS)
     
     return {
         "status": "started",
@@ -360,5 +1026,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=False,  # Set to True for development
-        log_level="info"
+        log_level="info",
+        # Let uvicorn's loggers propagate to the queue-backed root handler
+        log_config=None
     ) 
\ No newline at end of file
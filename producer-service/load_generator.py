@@ -0,0 +1,294 @@
+"""
+KafkaTrace load generator
+
+Rate-targeted synthetic load for capacity testing the cluster straight from the
+producer deployment. A token bucket paces N concurrent workers towards a target
+events/sec, and the generator can be started, stopped and retargeted at runtime.
+
+Modes:
+- closed: each worker waits for the broker ack before taking its next token, so
+  the offered load backs off when the cluster slows down.
+- open: workers fire sends on the token schedule without waiting for acks (up to
+  max_in_flight outstanding), so the offered load is independent of latency.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from prometheus_client import Gauge, Histogram
+
+from structured_logging import EventLog
+
+logger = logging.getLogger(__name__)
+event_log = EventLog(logger)  # open-loop send errors, one line per error type per window
+
+LOADGEN_TARGET_RATE = Gauge(
+    'load_generator_target_rate',
+    'Target events per second of the load generator'
+)
+
+LOADGEN_ACHIEVED_RATE = Gauge(
+    'load_generator_achieved_rate',
+    'Acknowledged events per second over the last reporting interval'
+)
+
+LOADGEN_WORKERS = Gauge(
+    'load_generator_workers',
+    'Number of running load generator workers'
+)
+
+LOADGEN_IN_FLIGHT = Gauge(
+    'load_generator_in_flight',
+    'Load generator sends awaiting a broker ack'
+)
+
+LOADGEN_LATENCY = Histogram(
+    'load_generator_latency_seconds',
+    'Send-to-ack latency observed by the load generator',
+    ['mode']
+)
+
+MODES = ("closed", "open")
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket.
+
+    Tokens refill continuously at `rate` per second up to `burst`. acquire()
+    sleeps just long enough for the next token instead of polling.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        self._refill()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LoadGenerator:
+    """
+    Managed, rate-targeted event load.
+
+    produce(event) -> bool delivers one event (waiting for the ack);
+    generate(n) -> list of events supplies payloads in bulk. Events in a block
+    share a timestamp, so a block holds about one second's worth at the target
+    rate (at most block_size).
+    """
+
+    def __init__(
+        self,
+        produce: Callable[[Dict[str, Any]], Awaitable[bool]],
+        generate: Callable[[int], List[Dict[str, Any]]],
+        block_size: int = 1000,
+        max_in_flight: int = 10000,
+        report_interval: float = 1.0,
+        failure_backoff_max: float = 5.0
+    ):
+        self.produce = produce
+        self.generate = generate
+        self.block_size = block_size
+        self.max_in_flight = max_in_flight
+        self.report_interval = report_interval
+        self.failure_backoff_max = failure_backoff_max
+
+        self.mode = "closed"
+        self.bucket: Optional[TokenBucket] = None
+        self.workers: List[asyncio.Task] = []
+        self.reporter: Optional[asyncio.Task] = None
+        self.in_flight: Set[asyncio.Task] = set()
+        self.in_flight_slots: Optional[asyncio.Semaphore] = None
+        self.started_at: Optional[float] = None
+
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.shed = 0
+        self.achieved_rate = 0.0
+        self.latencies: Deque[float] = deque(maxlen=10000)
+        self._events: List[Dict[str, Any]] = []
+
+    @property
+    def running(self) -> bool:
+        return any(not w.done() for w in self.workers)
+
+    def start(self, rate: float, workers: int = 4, mode: str = "closed"):
+        """Start generating load. Raises RuntimeError if already running."""
+        if self.running:
+            raise RuntimeError("Load generator is already running")
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        if rate <= 0 or workers <= 0:
+            raise ValueError("rate and workers must be positive")
+
+        self.mode = mode
+        self.bucket = TokenBucket(rate)
+        self.in_flight_slots = asyncio.Semaphore(self.max_in_flight)
+        self.sent = self.acked = self.failed = self.shed = 0
+        self.achieved_rate = 0.0
+        self.latencies.clear()
+        self.started_at = time.monotonic()
+        self._events = []
+        self.workers = []
+        self._scale_workers(workers)
+        self.reporter = asyncio.create_task(self._report())
+        LOADGEN_TARGET_RATE.set(rate)
+        logger.info(f"Load generator started: rate={rate}/s, workers={workers}, mode={mode}")
+
+    def retarget(self, rate: Optional[float] = None, workers: Optional[int] = None):
+        """Change the target rate and/or worker count of a running generator."""
+        if not self.running:
+            raise RuntimeError("Load generator is not running")
+        if (rate is not None and rate <= 0) or (workers is not None and workers <= 0):
+            raise ValueError("rate and workers must be positive")
+        if rate is not None:
+            self.bucket.set_rate(rate)
+            self._events = []  # sized for the old rate
+            LOADGEN_TARGET_RATE.set(rate)
+        if workers is not None:
+            self._scale_workers(workers)
+        logger.info(f"Load generator retargeted: rate={self.bucket.rate}/s, workers={len(self.workers)}")
+
+    async def stop(self):
+        """Stop all workers and wait for outstanding open-loop sends to settle."""
+        tasks = self.workers + ([self.reporter] if self.reporter else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+        self.workers = []
+        self.reporter = None
+        LOADGEN_TARGET_RATE.set(0)
+        LOADGEN_ACHIEVED_RATE.set(0)
+        LOADGEN_WORKERS.set(0)
+        logger.info(f"Load generator stopped: sent={self.sent}, acked={self.acked}, failed={self.failed}")
+
+    def status(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "running": self.running,
+            "mode": self.mode,
+            "target_rate": self.bucket.rate if self.bucket else 0,
+            "achieved_rate": self.achieved_rate,
+            "workers": len(self.workers),
+            "in_flight": len(self.in_flight),
+            "sent": self.sent,
+            "acked": self.acked,
+            "failed": self.failed,
+            "shed": self.shed,
+            "latency_p50_seconds": percentile(0.50),
+            "latency_p99_seconds": percentile(0.99),
+            "uptime_seconds": time.monotonic() - self.started_at if self.started_at else 0
+        }
+
+    def _scale_workers(self, count: int):
+        self.workers = [w for w in self.workers if not w.done()]
+        while len(self.workers) < count:
+            self.workers.append(asyncio.create_task(self._worker()))
+        while len(self.workers) > count:
+            self.workers.pop().cancel()
+        LOADGEN_WORKERS.set(count)
+
+    def _next_event(self) -> Dict[str, Any]:
+        if not self._events:
+            self._events = self.generate(min(self.block_size, math.ceil(self.bucket.rate)))
+            self._events.reverse()
+        return self._events.pop()
+
+    async def _send(self, event: Dict[str, Any]) -> bool:
+        start_time = time.monotonic()
+        LOADGEN_IN_FLIGHT.inc()
+        try:
+            success = await self.produce(event)
+        finally:
+            LOADGEN_IN_FLIGHT.dec()
+        if success:
+            latency = time.monotonic() - start_time
+            self.acked += 1
+            self.latencies.append(latency)
+            LOADGEN_LATENCY.labels(mode=self.mode).observe(latency)
+        else:
+            self.failed += 1
+        return success
+
+    async def _send_open_loop(self, event: Dict[str, Any]):
+        try:
+            await self._send(event)
+        except BufferError:
+            self.shed += 1
+        except Exception as e:
+            self.failed += 1
+            event_log.error(type(e).__name__, "Error in load generator send: %s", e)
+        finally:
+            self.in_flight_slots.release()
+
+    async def _worker(self):
+        failures = 0
+        while True:
+            try:
+                await self.bucket.acquire()
+                event = self._next_event()
+                self.sent += 1
+
+                if self.mode == "open":
+                    await self.in_flight_slots.acquire()
+                    task = asyncio.create_task(self._send_open_loop(event))
+                    self.in_flight.add(task)
+                    task.add_done_callback(self.in_flight.discard)
+                    continue
+
+                if await self._send(event):
+                    failures = 0
+                else:
+                    # Exponential backoff so a failing cluster is not hammered
+                    failures += 1
+                    await asyncio.sleep(min(self.failure_backoff_max, 0.1 * 2 ** failures))
+            except asyncio.CancelledError:
+                raise
+            except BufferError:
+                # Send buffer is full: back off briefly instead of piling on
+                self.shed += 1
+                await asyncio.sleep(0.05)
+            except Exception as e:
+                logger.error(f"Error in load generator worker: {e}")
+                await asyncio.sleep(1)
+
+    async def _report(self):
+        last_acked = self.acked
+        last_time = time.monotonic()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.monotonic()
+            self.achieved_rate = (self.acked - last_acked) / (now - last_time)
+            LOADGEN_ACHIEVED_RATE.set(self.achieved_rate)
+            last_acked, last_time = self.acked, now
@@ -0,0 +1,131 @@
+"""
+KafkaTrace send buffer
+
+Admission control in front of the KafkaProducer. Every record handed to the
+producer holds a share of a fixed record and byte budget until the broker acks
+(or rejects) it. When the budget is exhausted new work is shed immediately
+instead of queueing, which keeps memory and tail latency bounded while the
+broker is degraded. Streaming ingestion waits for space instead, pushing the
+backpressure onto the client connection.
+
+The buffer is only touched from the event loop thread (delivery callbacks are
+marshalled there first), so it needs no locking.
+"""
+
+import asyncio
+import logging
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+SEND_BUFFER_RECORDS = Gauge(
+    'send_buffer_records',
+    'Records admitted to the send buffer and awaiting a broker ack'
+)
+
+SEND_BUFFER_BYTES = Gauge(
+    'send_buffer_bytes',
+    'Payload bytes admitted to the send buffer and awaiting a broker ack'
+)
+
+SEND_BUFFER_UTILIZATION = Gauge(
+    'send_buffer_utilization',
+    'Send buffer occupancy as a fraction of its tightest budget (0-1)'
+)
+
+EVENTS_SHED = Counter(
+    'events_shed_total',
+    'Records rejected because the send buffer was full'
+)
+
+
+class SendBufferFull(BufferError):
+    """Raised when records cannot be admitted without exceeding the budget."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SendBuffer:
+    """Record and byte budget for in-flight producer sends."""
+
+    def __init__(self, max_records: int, max_bytes: int):
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.records = 0
+        self.bytes = 0
+        self.shed = 0
+        self._space_freed = asyncio.Event()
+
+    def admit(self, records: int, size: int):
+        """
+        Reserve budget for `records` records totalling `size` bytes, all or nothing.
+
+        Raises SendBufferFull (retryable=False if the request could never fit).
+        """
+        if not self._fits(records, size):
+            self._shed(records)
+            raise self._full_error(records, size)
+        self._reserve(records, size)
+
+    async def admit_when_ready(self, records: int, size: int):
+        """
+        Reserve budget, waiting for in-flight sends to drain instead of shedding.
+
+        Used by streaming ingestion, where backpressure on the connection is the
+        right response to a full buffer. Still raises if the request can never fit.
+        """
+        while not self._fits(records, size):
+            error = self._full_error(records, size)
+            if not error.retryable:
+                raise error
+            self._space_freed.clear()
+            await self._space_freed.wait()
+        self._reserve(records, size)
+
+    def release(self, records: int, size: int):
+        """Return budget once records are acked or have failed."""
+        self.records -= records
+        self.bytes -= size
+        self._update_gauges()
+        self._space_freed.set()
+
+    def status(self):
+        return {
+            "records": self.records,
+            "bytes": self.bytes,
+            "max_records": self.max_records,
+            "max_bytes": self.max_bytes,
+            "shed": self.shed
+        }
+
+    def _fits(self, records: int, size: int) -> bool:
+        return self.records + records <= self.max_records and self.bytes + size <= self.max_bytes
+
+    def _full_error(self, records: int, size: int) -> SendBufferFull:
+        if records > self.max_records or size > self.max_bytes:
+            return SendBufferFull(
+                f"{records} records / {size} bytes exceeds the send buffer capacity "
+                f"({self.max_records} records / {self.max_bytes} bytes)",
+                retryable=False
+            )
+        return SendBufferFull("Send buffer is full")
+
+    def _reserve(self, records: int, size: int):
+        self.records += records
+        self.bytes += size
+        self._update_gauges()
+
+    def _shed(self, records: int):
+        self.shed += records
+        EVENTS_SHED.inc(records)
+
+    def _update_gauges(self):
+        SEND_BUFFER_RECORDS.set(self.records)
+        SEND_BUFFER_BYTES.set(self.bytes)
+        SEND_BUFFER_UTILIZATION.set(max(
+            self.records / self.max_records,
+            self.bytes / self.max_bytes
+        ))
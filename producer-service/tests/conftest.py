@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The service modules import each other as top-level modules, the way they run
+# in the image (WORKDIR /app); the in-memory Kafka stand-in lives with the benchmarks
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, ".."), os.path.join(HERE, "..", "..", "benchmarks")]
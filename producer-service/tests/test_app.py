@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+from kafka.errors import KafkaError, KafkaTimeoutError
+from kafka.structs import TopicPartition
+
+import app as producer_app
+from inmemory_kafka import InMemoryBroker
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = InMemoryBroker()
+    monkeypatch.setattr(producer_app, "KafkaProducer", broker.producer_class())
+    return broker
+
+
+@pytest.fixture
+def client(broker):
+    with TestClient(producer_app.app) as client:
+        yield client
+
+
+def test_batch_produces_the_posted_events(client, broker):
+    valid = producer_app.generate_sample_events(1)[0]
+    invalid = dict(producer_app.generate_sample_events(1)[0], event_type="no_such_type")
+
+    response = client.post("/events/batch", json=[valid, invalid])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_events"] == 2
+    assert body["successful_events"] == 1
+    first, second = body["results"]
+    assert first["event_id"] == valid["event_id"] and first["success"]
+    assert second["event_id"] == invalid["event_id"] and not second["success"]
+    assert second["error"].startswith("invalid event: $: no schema for event_type='no_such_type'")
+    produced = sum(broker.end_offset(tp) for tp in broker._logs if tp.topic == producer_app.KAFKA_TOPIC)
+    assert produced == 1
+
+
+def test_batch_without_body_produces_generated_events(client):
+    response = client.post("/events/batch?count=3")
+
+    assert response.status_code == 200
+    assert response.json()["successful_events"] == 3
+
+
+@pytest.fixture
+def rejecting_broker(broker, monkeypatch):
+    # The broker rejects every record for the main topic; the DLQ still accepts them
+    append = broker.append
+
+    def reject_main_topic(topic, *args, **kwargs):
+        if topic == producer_app.KAFKA_TOPIC:
+            raise KafkaError("NotLeaderForPartitionError")
+        return append(topic, *args, **kwargs)
+
+    monkeypatch.setattr(broker, "append", reject_main_topic)
+    return broker
+
+
+def dead_lettered(broker):
+    records = []
+    for p in broker.partitions_for(producer_app.DLQ_TOPIC):
+        records.extend(broker.fetch(TopicPartition(producer_app.DLQ_TOPIC, p), 0, 100))
+    return records
+
+
+@pytest.mark.parametrize("path", ["/events", "/events/batch"])
+def test_dead_lettered_records_keep_routing_and_trace_headers(client, rejecting_broker, path):
+    event = producer_app.generate_sample_events(1)[0]
+    traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    client.post(path, json=event if path == "/events" else [event],
+                headers={"X-Correlation-ID": "checkout-42", "traceparent": traceparent})
+
+    record, = dead_lettered(rejecting_broker)
+    headers = dict(record.headers)
+    assert headers["kt-correlation-id"] == b"checkout-42"
+    assert headers["traceparent"].startswith(b"00-4bf92f3577b34da6a3ce929d0e0e4736-")
+    assert "kt-produced-at" in headers
+    assert headers["kt-event-type"] == event["event_type"].encode()
+    assert headers["kt-event-id"] == event["event_id"].encode()
+    assert headers[producer_app.DLQ_ORIGINAL_TOPIC_HEADER] == producer_app.KAFKA_TOPIC.encode()
+    assert headers[producer_app.DLQ_ERROR_HEADER].startswith(b"KafkaError")
+
+
+@pytest.mark.parametrize("path", ["/events", "/events/batch"])
+def test_metadata_timeout_answers_503_without_dead_lettering(client, broker, monkeypatch, path):
+    def no_metadata(*args, **kwargs):
+        raise KafkaTimeoutError("Failed to update metadata after 0.5 secs.")
+
+    monkeypatch.setattr(producer_app.producer, "send", no_metadata)
+    events = producer_app.generate_sample_events(3)
+
+    response = client.post(path, json=events[0] if path == "/events" else events)
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert dead_lettered(broker) == []
+    assert producer_app.send_buffer.records == 0
@@ -0,0 +1,27 @@
+import asyncio
+
+from load_generator import LoadGenerator
+
+
+def test_blocks_hold_about_one_second_of_events_at_the_target_rate():
+    block_sizes = []
+
+    def generate(n):
+        block_sizes.append(n)
+        return [{"n": i} for i in range(n)]
+
+    async def produce(event):
+        return True
+
+    async def run():
+        generator = LoadGenerator(produce, generate, block_size=1000)
+        generator.start(rate=20, workers=1)
+        await asyncio.sleep(0.1)
+        generator.retarget(rate=2000)
+        await asyncio.sleep(0.1)
+        await generator.stop()
+
+    asyncio.run(run())
+
+    assert block_sizes[0] == 20
+    assert block_sizes[-1] == 1000
@@ -0,0 +1,317 @@
+"""
+KafkaTrace event validation
+
+Shared by the producer and consumer services so both sides enforce the same
+event contract. Schemas are written in a JSON-Schema subset and registered per
+(event_type, version); each one is compiled once into a plain Python function
+(generated source, exec'd once) and kept in a cache. Validating an event is
+then a dict lookup plus straight-line type checks, instead of walking the
+schema for every event the way an interpreted validator does.
+
+Supported keywords: type, properties, required, additionalProperties (bool),
+enum, minLength, maxLength, pattern, minimum, maximum, items.
+
+interpret() walks a schema directly; it is the reference the compiled
+validators are checked against and the baseline for the validation benchmark.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+EVENT_VALIDATION_FAILURES = Counter(
+    'event_validation_failures_total',
+    'Events that failed schema validation',
+    ['event_type']
+)
+
+# event -> None when valid, else a message naming the first failing field
+Validator = Callable[[Any], Optional[str]]
+
+SchemaKey = Tuple[str, str]
+
+_TYPE_CHECKS = {
+    "object": "type({v}) is dict",
+    "array": "type({v}) is list",
+    "string": "type({v}) is str",
+    "integer": "type({v}) is int",
+    "number": "type({v}) is int or type({v}) is float",
+    "boolean": "type({v}) is bool",
+    "null": "{v} is None",
+}
+
+_TYPE_PREDICATES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: type(v) is dict,
+    "array": lambda v: type(v) is list,
+    "string": lambda v: type(v) is str,
+    "integer": lambda v: type(v) is int,
+    "number": lambda v: type(v) is int or type(v) is float,
+    "boolean": lambda v: type(v) is bool,
+    "null": lambda v: v is None,
+}
+
+_MISSING = object()
+
+
+class _Compiler:
+    """Generates the source of one validator function from a schema."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.constants: Dict[str, Any] = {"_MISSING": _MISSING}
+        self._names = 0
+
+    def compile(self, schema: Dict[str, Any], name: str) -> Validator:
+        self.lines.append("def validate(v0):")
+        self._node(schema, "v0", "$", 1)
+        self.lines.append("    return None")
+        namespace = dict(self.constants)
+        exec(compile("\n".join(self.lines), f"<schema {name}>", "exec"), namespace)
+        return namespace["validate"]
+
+    def _var(self) -> str:
+        self._names += 1
+        return f"v{self._names}"
+
+    def _constant(self, value: Any) -> str:
+        name = f"_C{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def _emit(self, depth: int, line: str):
+        self.lines.append("    " * depth + line)
+
+    def _fail(self, depth: int, path: str, message: str):
+        self._emit(depth, f"return {(path + ': ' + message)!r}")
+
+    def _node(self, schema: Dict[str, Any], v: str, path: str, depth: int):
+        types = schema.get("type")
+        if types is not None:
+            types = [types] if isinstance(types, str) else list(types)
+            check = " or ".join(f"({_TYPE_CHECKS[t].format(v=v)})" for t in types)
+            self._emit(depth, f"if not ({check}):")
+            self._fail(depth + 1, path, f"expected {' or '.join(types)}")
+
+        if "enum" in schema:
+            self._emit(depth, f"if {v} not in {self._constant(frozenset(schema['enum']))}:")
+            self._fail(depth + 1, path, f"must be one of {sorted(map(str, schema['enum']))}")
+
+        if "minLength" in schema or "maxLength" in schema or "pattern" in schema:
+            self._emit(depth, f"if type({v}) is str:")
+            if "minLength" in schema:
+                self._emit(depth + 1, f"if len({v}) < {int(schema['minLength'])}:")
+                self._fail(depth + 2, path, f"shorter than {schema['minLength']}")
+            if "maxLength" in schema:
+                self._emit(depth + 1, f"if len({v}) > {int(schema['maxLength'])}:")
+                self._fail(depth + 2, path, f"longer than {schema['maxLength']}")
+            if "pattern" in schema:
+                regex = self._constant(re.compile(schema["pattern"]))
+                self._emit(depth + 1, f"if {regex}.search({v}) is None:")
+                self._fail(depth + 2, path, f"does not match {schema['pattern']}")
+
+        if "minimum" in schema or "maximum" in schema:
+            self._emit(depth, f"if type({v}) is int or type({v}) is float:")
+            if "minimum" in schema:
+                self._emit(depth + 1, f"if {v} < {schema['minimum']!r}:")
+                self._fail(depth + 2, path, f"less than {schema['minimum']}")
+            if "maximum" in schema:
+                self._emit(depth + 1, f"if {v} > {schema['maximum']!r}:")
+                self._fail(depth + 2, path, f"greater than {schema['maximum']}")
+
+        properties = schema.get("properties", {})
+        required = set(schema.get("required", ()))
+        additional = schema.get("additionalProperties", True)
+        if properties or required or additional is False:
+            self._emit(depth, f"if type({v}) is dict:")
+            for key in sorted(required - set(properties)):
+                self._emit(depth + 1, f"if {key!r} not in {v}:")
+                self._fail(depth + 2, f"{path}.{key}", "is required")
+            for key, sub in properties.items():
+                child = self._var()
+                self._emit(depth + 1, f"{child} = {v}.get({key!r}, _MISSING)")
+                if key in required:
+                    self._emit(depth + 1, f"if {child} is _MISSING:")
+                    self._fail(depth + 2, f"{path}.{key}", "is required")
+                    self._node(sub, child, f"{path}.{key}", depth + 1)
+                else:
+                    self._emit(depth + 1, f"if {child} is not _MISSING:")
+                    self._emit(depth + 2, "pass")
+                    self._node(sub, child, f"{path}.{key}", depth + 2)
+            if additional is False:
+                allowed = self._constant(frozenset(properties))
+                self._emit(depth + 1, f"for k in {v}:")
+                self._emit(depth + 2, f"if k not in {allowed}:")
+                self._emit(depth + 3, f"return {path + '.'!r} + str(k) + ': is not allowed'")
+
+        if "items" in schema:
+            item = self._var()
+            self._emit(depth, f"if type({v}) is list:")
+            self._emit(depth + 1, f"for {item} in {v}:")
+            self._emit(depth + 2, "pass")
+            self._node(schema["items"], item, f"{path}[]", depth + 2)
+
+
+def compile_schema(schema: Dict[str, Any], name: str = "schema") -> Validator:
+    """Compile a schema into a validator function."""
+    return _Compiler().compile(schema, name)
+
+
+def interpret(schema: Dict[str, Any], value: Any, path: str = "$") -> Optional[str]:
+    """Validate by walking the schema (reference implementation, not for the hot path)."""
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else list(types)
+        if not any(_TYPE_PREDICATES[t](value) for t in types):
+            return f"{path}: expected {' or '.join(types)}"
+    if "enum" in schema and value not in schema["enum"]:
+        return f"{path}: must be one of {sorted(map(str, schema['enum']))}"
+    if type(value) is str:
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            return f"{path}: shorter than {schema['minLength']}"
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            return f"{path}: longer than {schema['maxLength']}"
+        if "pattern" in schema and re.search(schema["pattern"], value) is None:
+            return f"{path}: does not match {schema['pattern']}"
+    if type(value) in (int, float):
+        if "minimum" in schema and value < schema["minimum"]:
+            return f"{path}: less than {schema['minimum']}"
+        if "maximum" in schema and value > schema["maximum"]:
+            return f"{path}: greater than {schema['maximum']}"
+    if type(value) is dict:
+        properties = schema.get("properties", {})
+        for key in schema.get("required", ()):
+            if key not in value:
+                return f"{path}.{key}: is required"
+        for key, sub in properties.items():
+            if key in value:
+                error = interpret(sub, value[key], f"{path}.{key}")
+                if error:
+                    return error
+        if schema.get("additionalProperties", True) is False:
+            for key in value:
+                if key not in properties:
+                    return f"{path}.{key}: is not allowed"
+    if type(value) is list and "items" in schema:
+        for item in value:
+            error = interpret(schema["items"], item, f"{path}[]")
+            if error:
+                return error
+    return None
+
+
+class ValidatorCache:
+    """
+    Compiled validators per (event_type, version).
+
+    compile_all() compiles every registered schema up front (at startup);
+    validate_batch() checks a whole batch in one call.
+    """
+
+    def __init__(self, schemas: Dict[SchemaKey, Dict[str, Any]]):
+        self.schemas = schemas
+        self._validators: Dict[SchemaKey, Validator] = {}
+
+    def compile_all(self) -> int:
+        for key, schema in self.schemas.items():
+            self._validators[key] = compile_schema(schema, "/".join(key))
+        return len(self._validators)
+
+    def validator(self, event_type: Any, version: Any) -> Optional[Validator]:
+        if type(event_type) is not str or type(version) is not str:
+            return None  # never a schema key, and may not even be hashable
+        key = (event_type, version)
+        validator = self._validators.get(key)
+        if validator is None and key in self.schemas:
+            validator = self._validators[key] = compile_schema(self.schemas[key], "/".join(key))
+        return validator
+
+    def validate(self, event: Any) -> Optional[str]:
+        """None when the event is valid, else the reason it is not."""
+        return self.validate_batch([event])[0]
+
+    def validate_batch(self, events: List[Any]) -> List[Optional[str]]:
+        """One result per event, in order: None, or the first validation error."""
+        validators = self._validators
+        results: List[Optional[str]] = []
+        failures: Dict[str, int] = {}
+        for event in events:
+            if type(event) is not dict:
+                error = "$: expected object"
+                event_type = "unknown"
+            else:
+                event_type = event.get("event_type")
+                version = event.get("version")
+                if type(event_type) is str and type(version) is str:
+                    validator = validators.get((event_type, version)) or self.validator(event_type, version)
+                else:
+                    validator = None  # a list or dict here would not even hash
+                if validator is not None:
+                    try:
+                        error = validator(event)
+                    except TypeError as e:  # e.g. an unhashable value checked against an enum
+                        error = f"$: {e}"
+                else:
+                    error = f"$: no schema for event_type={event_type!r} version={version!r}"
+                if error is not None and (
+                    type(event_type) is not str or not any(key[0] == event_type for key in self.schemas)
+                ):
+                    event_type = "unknown"  # keep label values bounded
+            results.append(error)
+            if error is not None:
+                failures[event_type] = failures.get(event_type, 0) + 1
+        for event_type, count in failures.items():
+            EVENT_VALIDATION_FAILURES.labels(event_type=event_type).inc(count)
+        return results
+
+
+def _event_schema(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Envelope every event shares, around a per-type data schema."""
+    return {
+        "type": "object",
+        "required": ["event_id", "timestamp", "event_type", "source", "version", "data"],
+        "properties": {
+            "event_id": {"type": "string", "minLength": 1, "maxLength": 128},
+            "timestamp": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}"},
+            "event_type": {"type": "string"},
+            "source": {"type": "string", "minLength": 1},
+            "version": {"type": "string"},
+            "correlation_id": {"type": ["string", "null"]},
+            "data": data,
+        },
+    }
+
+
+_METADATA = {
+    "type": "object",
+    "properties": {
+        "ip_address": {"type": "string", "maxLength": 45},
+        "user_agent": {"type": "string"},
+        "session_id": {"type": "string"},
+    },
+}
+
+_USER_DATA = {
+    "type": "object",
+    "required": ["user_id", "action"],
+    "properties": {
+        "user_id": {"type": "integer", "minimum": 0},
+        "action": {"type": "string", "minLength": 1},
+        "metadata": _METADATA,
+    },
+}
+
+EVENT_SCHEMAS: Dict[SchemaKey, Dict[str, Any]] = {
+    ("user_action", "1.0"): _event_schema({
+        **_USER_DATA,
+        "properties": {
+            **_USER_DATA["properties"],
+            "action": {"type": "string", "enum": ["login", "logout", "purchase", "view"]},
+        },
+    }),
+    ("system_metric", "1.0"): _event_schema(_USER_DATA),
+    ("business_event", "1.0"): _event_schema(_USER_DATA),
+    ("error_log", "1.0"): _event_schema(_USER_DATA),
+}
+
+validators = ValidatorCache(EVENT_SCHEMAS)
@@ -120,7 +120,7 @@ curl -s -X POST http://localhost:8000/start-background > /dev/null
 sleep 10
 
 # Check consumer logs for recent events
-RECENT_EVENTS=$(kubectl logs -l app.kubernetes.io/name=consumer --tail=20 2>/dev/null | grep -c "Event processed successfully" || echo "0")
+RECENT_EVENTS=$(kubectl logs -l app.kubernetes.io/name=consumer --tail=20 2>/dev/null | grep -c -E "Event processed successfully|Batch processed" || echo "0")
 
 if [ "$RECENT_EVENTS" -gt 0 ]; then
     print_success "Consumer is processing events ($RECENT_EVENTS recent events)"